@@ -0,0 +1,161 @@
+"""
+Shared async Web3 access to the L1X chain.
+
+One ``AsyncWeb3`` per process (per event loop) talks to ``L1X_RPC_URL``
+over a pooled keep-alive session, with concurrent requests coalesced
+into JSON-RPC batches (see ``app.rpc_batching``). The chain id is looked
+up once, the gas price is refreshed at most every ``CHAIN_GAS_PRICE_TTL``
+seconds, and contract objects are cached per (address, ABI), so on-chain code paths
+don't pay for setup or metadata round trips on every request.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from eth_account import Account
+from web3 import AsyncWeb3, Web3
+
+try:
+    from web3.middleware import ExtraDataToPOAMiddleware as poa_middleware
+except ImportError:
+    try:
+        from web3.middleware import async_geth_poa_middleware as poa_middleware
+    except ImportError:
+        poa_middleware = None
+
+from app.config import (
+    CHAIN_CONTRACT_CACHE_SIZE,
+    CHAIN_GAS_PRICE_TTL,
+    CHAIN_RPC_TIMEOUT,
+    L1X_RPC_URL,
+    PRIVATE_KEY,
+)
+from app.rpc_batching import BatchingHTTPProvider
+
+logger = logging.getLogger(__name__)
+
+MAX_GAS_LIMIT = 5_000_000       # upper bound for any transaction the service signs
+
+_web3: Optional[AsyncWeb3] = None
+_web3_loop: Optional[asyncio.AbstractEventLoop] = None
+_chain_id: Optional[int] = None
+_gas_price: Optional[Tuple[int, float]] = None     # (wei, fetched at)
+_gas_price_task: Optional[asyncio.Task] = None
+_contracts: "OrderedDict[Tuple[str, str], object]" = OrderedDict()
+_service_account = None
+chain_stats = {
+    "providers_created": 0,
+    "chain_id_lookups": 0,
+    "gas_price_refreshes": 0,
+    "gas_price_hits": 0,
+    "contract_cache_hits": 0,
+    "contract_cache_misses": 0,
+}
+
+
+def get_web3() -> AsyncWeb3:
+    """Process-wide AsyncWeb3, recreated if the event loop changed (e.g. scripts)."""
+    global _web3, _web3_loop, _gas_price_task
+    loop = asyncio.get_running_loop()
+    if _web3 is None or _web3_loop is not loop:
+        provider = BatchingHTTPProvider(L1X_RPC_URL, request_kwargs={"timeout": aiohttp.ClientTimeout(total=CHAIN_RPC_TIMEOUT)})
+        w3 = AsyncWeb3(provider)
+        if poa_middleware:
+            w3.middleware_onion.inject(poa_middleware, layer=0)
+        _web3, _web3_loop, _gas_price_task = w3, loop, None
+        _contracts.clear()      # contract objects hold a reference to the old provider
+        chain_stats["providers_created"] += 1
+    return _web3
+
+
+async def close_web3():
+    global _web3
+    if _web3 is not None:
+        disconnect = getattr(_web3.provider, "disconnect", None)
+        if disconnect is not None:
+            await disconnect()
+    _web3 = None
+    _contracts.clear()
+
+
+async def get_chain_id() -> int:
+    """Chain id of ``L1X_RPC_URL``, fetched once per process."""
+    global _chain_id
+    if _chain_id is None:
+        chain_stats["chain_id_lookups"] += 1
+        _chain_id = await get_web3().eth.chain_id
+    return _chain_id
+
+
+async def _refresh_gas_price() -> int:
+    global _gas_price
+    chain_stats["gas_price_refreshes"] += 1
+    price = await get_web3().eth.gas_price
+    _gas_price = (price, time.monotonic())
+    return price
+
+
+def _finish_gas_price(task: asyncio.Task):
+    global _gas_price_task
+    if _gas_price_task is task:
+        _gas_price_task = None
+    if not task.cancelled():
+        task.exception()
+
+
+async def get_gas_price() -> int:
+    """Current gas price, at most ``CHAIN_GAS_PRICE_TTL`` seconds old; concurrent refreshes are shared."""
+    global _gas_price_task
+    get_web3()
+    if _gas_price is not None and time.monotonic() - _gas_price[1] < CHAIN_GAS_PRICE_TTL:
+        chain_stats["gas_price_hits"] += 1
+        return _gas_price[0]
+    if _gas_price_task is None:
+        _gas_price_task = asyncio.ensure_future(_refresh_gas_price())
+        _gas_price_task.add_done_callback(_finish_gas_price)
+    return await asyncio.shield(_gas_price_task)
+
+
+def abi_digest(abi: List[Dict]) -> str:
+    return hashlib.sha256(json.dumps(abi, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def get_contract(address: str, abi: List[Dict]):
+    """Cached contract object for ``address`` on the shared provider."""
+    w3 = get_web3()
+    key = (Web3.to_checksum_address(address), abi_digest(abi))
+    contract = _contracts.get(key)
+    if contract is not None:
+        chain_stats["contract_cache_hits"] += 1
+        _contracts.move_to_end(key)
+        return contract
+    chain_stats["contract_cache_misses"] += 1
+    contract = _contracts[key] = w3.eth.contract(address=key[0], abi=abi)
+    while len(_contracts) > CHAIN_CONTRACT_CACHE_SIZE:
+        _contracts.popitem(last=False)
+    return contract
+
+
+def get_service_account():
+    """The service's signing account, from ``PRIVATE_KEY``."""
+    global _service_account
+    if _service_account is None:
+        if not PRIVATE_KEY:
+            raise ValueError("PRIVATE_KEY not set in environment variables")
+        _service_account = Account.from_key(PRIVATE_KEY)
+    return _service_account
+
+
+def get_chain_stats() -> Dict:
+    return {
+        **chain_stats,
+        "rpc_url": L1X_RPC_URL,
+        "chain_id": _chain_id,
+        "gas_price_wei": _gas_price[0] if _gas_price else None,
+        "cached_contracts": len(_contracts),
+    }
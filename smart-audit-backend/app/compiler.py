@@ -0,0 +1,229 @@
+"""
+Cached Solidity compiler service.
+
+Wraps py-solc-x so that each solc version is installed at most once per
+process, identical compilations (same source, version and settings) are
+served from an LRU cache, concurrent identical requests share a single solc
+run, and the number of solc processes running at once is bounded.
+Multi-file projects fetched from Etherscan compile through the same cache.
+Failed compilations are cached too: solc is deterministic.
+
+solc runs in an ``app.sandbox`` worker process under its memory and CPU
+limits; a compilation that takes longer than ``COMPILE_TIMEOUT`` is killed
+and raises a ``CompilationError`` (not cached, as it may be load-related).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Set
+
+from solcx import compile_standard, get_installed_solc_versions, install_solc
+from solcx.exceptions import SolcError
+
+from app.config import COMPILE_TIMEOUT, COMPILER_CACHE_SIZE, COMPILER_CONCURRENCY
+from app.etherscan import SourceProject
+from app.sandbox import SandboxCrash, SandboxTimeout, run_sandboxed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOLC_VERSION = "0.8.19"
+DEFAULT_OUTPUTS = ("abi", "evm.bytecode", "evm.gasEstimates")
+PRAGMA_VERSION_RE = re.compile(r'pragma solidity\s+[\^>=]*(\d+\.\d+\.?\d*)')
+
+
+class CompilationError(Exception):
+    """solc rejected the source; ``errors`` holds solc's error entries."""
+
+    def __init__(self, message: str, errors: Optional[List[Dict]] = None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+def resolve_solc_version(source: str, default: str = DEFAULT_SOLC_VERSION) -> str:
+    """Compiler version named by the source's pragma (``0.8`` becomes ``0.8.0``)."""
+    match = PRAGMA_VERSION_RE.search(source)
+    if not match:
+        return default
+    parts = [p for p in match.group(1).split(".") if p]
+    return ".".join(parts + ["0"] * (3 - len(parts)))
+
+
+_installed_versions: Optional[Set[str]] = None
+_install_locks: Dict[str, asyncio.Lock] = {}
+_results: "OrderedDict[str, Dict]" = OrderedDict()
+_in_flight: Dict[str, asyncio.Task] = {}
+_semaphore: Optional[asyncio.Semaphore] = None
+_semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+compiler_stats = {"compilations": 0, "cache_hits": 0, "joined_in_flight": 0, "installs": 0, "errors": 0,
+                  "timeouts": 0, "aborted": 0}
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore, _semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _semaphore is None or _semaphore_loop is not loop:
+        _semaphore, _semaphore_loop = asyncio.Semaphore(COMPILER_CONCURRENCY), loop
+    return _semaphore
+
+
+async def ensure_solc(version: str):
+    """Install ``version`` unless this process has already seen it installed."""
+    global _installed_versions
+    if _installed_versions is None:
+        _installed_versions = {str(v) for v in await asyncio.to_thread(get_installed_solc_versions)}
+    if version in _installed_versions:
+        return
+    lock = _install_locks.setdefault(version, asyncio.Lock())
+    async with lock:
+        if version not in _installed_versions:
+            logger.info(f"Installing solc {version}")
+            await asyncio.to_thread(install_solc, version)
+            compiler_stats["installs"] += 1
+            _installed_versions.add(version)
+
+
+def _cache_key(sources: Dict[str, str], version: str, settings: Dict) -> str:
+    payload = json.dumps([version, settings, sources], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _remember(key: str, entry: Dict):
+    _results[key] = entry
+    _results.move_to_end(key)
+    while len(_results) > COMPILER_CACHE_SIZE:
+        _results.popitem(last=False)
+
+
+def _unpack(entry: Dict) -> Dict:
+    if "error" in entry:
+        raise CompilationError(entry["error"], entry["errors"])
+    return entry["output"]
+
+
+def solc_job(sources: Dict[str, str], version: str, settings: Dict) -> Dict:
+    """One solc standard-JSON compilation; runs in a sandbox worker."""
+    try:
+        output = compile_standard({
+            "language": "Solidity",
+            "sources": {name: {"content": content} for name, content in sources.items()},
+            "settings": settings
+        }, solc_version=version)
+    except SolcError as e:
+        return {"error": str(e).split("\n\n")[0], "errors": getattr(e, "error_dict", None) or []}
+    return {"output": output}
+
+
+async def _run_solc(sources: Dict[str, str], version: str, settings: Dict) -> Dict:
+    await ensure_solc(version)
+    async with _get_semaphore():
+        compiler_stats["compilations"] += 1
+        try:
+            entry = await run_sandboxed(solc_job, sources, version, settings, timeout=COMPILE_TIMEOUT)
+        except SandboxTimeout:
+            compiler_stats["timeouts"] += 1
+            return {"error": f"Compilation timed out after {COMPILE_TIMEOUT:.0f}s", "errors": [], "transient": True}
+        except SandboxCrash as e:
+            compiler_stats["aborted"] += 1
+            return {"error": f"Compilation aborted: solc worker died ({e})", "errors": [], "transient": True}
+    if "error" in entry:
+        compiler_stats["errors"] += 1
+    return entry
+
+
+async def compile_standard_cached(source: str, file_name: str = "Contract.sol",
+                                  solc_version: Optional[str] = None,
+                                  outputs: Sequence[str] = DEFAULT_OUTPUTS,
+                                  optimize: bool = True) -> Dict:
+    """
+    Raw solc standard-JSON output for ``source``; raises ``CompilationError``
+    if solc reports errors.
+    """
+    version = solc_version or resolve_solc_version(source)
+    settings = {
+        "optimizer": {"enabled": optimize, "runs": 200},
+        "outputSelection": {"*": {"*": list(outputs)}}
+    }
+    return await _compile_cached({file_name: source}, version, settings)
+
+
+async def _compile_cached(sources: Dict[str, str], version: str, settings: Dict) -> Dict:
+    key = _cache_key(sources, version, settings)
+    if key in _results:
+        compiler_stats["cache_hits"] += 1
+        _results.move_to_end(key)
+        return _unpack(_results[key])
+
+    task = _in_flight.get(key)
+    if task is None:
+        # The solc run is not tied to the first caller, so cancelling one caller
+        # doesn't fail the others waiting on the same compilation
+        task = _in_flight[key] = asyncio.ensure_future(_compile_and_remember(key, sources, version, settings))
+        task.add_done_callback(lambda t: _finish_in_flight(key, t))
+    else:
+        compiler_stats["joined_in_flight"] += 1
+    return _unpack(await asyncio.shield(task))
+
+
+def _finish_in_flight(key: str, task: asyncio.Task):
+    _in_flight.pop(key, None)
+    if not task.cancelled():
+        task.exception()  # waiters re-raise it; don't warn when they were all cancelled
+
+
+async def _compile_and_remember(key: str, sources: Dict[str, str], version: str, settings: Dict) -> Dict:
+    entry = await _run_solc(sources, version, settings)
+    if not entry.get("transient"):
+        _remember(key, entry)
+    return entry
+
+
+async def compile_source(source: str, file_name: str = "Contract.sol",
+                         contract_name: Optional[str] = None,
+                         solc_version: Optional[str] = None) -> Dict:
+    """
+    Compile ``source`` and return the main contract's artifacts: the contract
+    named ``contract_name`` if given and present, else the first one.
+    """
+    version = solc_version or resolve_solc_version(source)
+    output = await compile_standard_cached(source, file_name, version)
+    return _artifacts(output.get("contracts", {}).get(file_name, {}), contract_name, version)
+
+
+async def compile_project(project: SourceProject, contract_name: Optional[str] = None,
+                          outputs: Sequence[str] = DEFAULT_OUTPUTS) -> Dict:
+    """
+    Compile a multi-file verified project with the settings it was verified
+    with and return the artifacts of ``contract_name`` (default: the
+    project's own contract) from its main file.
+    """
+    version = project.compiler_version or resolve_solc_version(project.sources[project.main_file])
+    settings = {k: v for k, v in project.settings.items() if k not in ("outputSelection", "compilationTarget")}
+    settings["outputSelection"] = {"*": {"*": list(outputs)}}
+    output = await _compile_cached(project.sources, version, settings)
+    contracts = output.get("contracts", {}).get(project.main_file, {})
+    return _artifacts(contracts, contract_name or project.contract_name, version)
+
+
+def _artifacts(contracts: Dict, contract_name: Optional[str], version: str) -> Dict:
+    if not contracts:
+        raise CompilationError("Compilation produced no contracts")
+    name = contract_name if contract_name in contracts else next(iter(contracts))
+    artifact = contracts[name]
+    return {
+        "contract_name": name,
+        "bytecode": artifact["evm"]["bytecode"]["object"],
+        "abi": artifact["abi"],
+        "gas_estimates": artifact["evm"].get("gasEstimates"),
+        "solc_version": version
+    }
+
+
+def get_compiler_stats() -> Dict:
+    return {
+        **compiler_stats,
+        "cached_results": len(_results),
+        "installed_versions": sorted(_installed_versions or ())
+    }
@@ -11,3 +11,126 @@ NFT_CONTRACT_ADDRESS = os.getenv("NFT_CONTRACT_ADDRESS")
 NFT_CONTRACT_ABI_CID = os.getenv("NFT_CONTRACT_ABI_CID")
 L1X_RPC_URL = os.getenv("L1X_RPC_URL", "https://v2-mainnet-rpc.l1x.foundation/")
 EXPLORER_URL = os.getenv("EXPLORER_URL", "https://explorer.l1x.foundation")
+
+# External service endpoints (overridable so the load-test harness can point at local fakes)
+OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+PINATA_API_URL = os.getenv("PINATA_API_URL", "https://api.pinata.cloud")
+PINATA_GATEWAY_URL = os.getenv("PINATA_GATEWAY_URL", "https://gateway.pinata.cloud")
+ETHERSCAN_API_URL = os.getenv("ETHERSCAN_API_URL", "https://api-sepolia.etherscan.io/api")
+# Per-request timeout (seconds) for Pinata uploads and gateway reads
+PINATA_TIMEOUT = float(os.getenv("PINATA_TIMEOUT", "30"))
+
+# LLM (OpenRouter) settings
+OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+LLM_DEFAULT_MODEL = os.getenv("LLM_DEFAULT_MODEL", "openai/gpt-4o-mini")
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "2048"))
+# Sources above these sizes (estimated tokens) are split by contract/function and analyzed in parallel
+LLM_ANALYSIS_CHUNK_TOKENS = int(os.getenv("LLM_ANALYSIS_CHUNK_TOKENS", "4000"))
+LLM_FIX_CHUNK_TOKENS = int(os.getenv("LLM_FIX_CHUNK_TOKENS", "1200"))
+LLM_CHUNK_CONCURRENCY = int(os.getenv("LLM_CHUNK_CONCURRENCY", "4"))
+# Comma-separated fallback targets for hedged requests ("model" or "model@provider"); empty disables hedging
+LLM_HEDGE_MODELS = [m.strip() for m in os.getenv("LLM_HEDGE_MODELS", "").split(",") if m.strip()]
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.9"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2"))
+LLM_HEDGE_MAX_DELAY = float(os.getenv("LLM_HEDGE_MAX_DELAY", "30"))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "10"))
+# Adaptive (AIMD) concurrency limit, retries and circuit breaker for OpenRouter
+LLM_CONCURRENCY_INITIAL = int(os.getenv("LLM_CONCURRENCY_INITIAL", "8"))
+LLM_CONCURRENCY_MIN = int(os.getenv("LLM_CONCURRENCY_MIN", "1"))
+LLM_CONCURRENCY_MAX = int(os.getenv("LLM_CONCURRENCY_MAX", "64"))
+LLM_LATENCY_TARGET = float(os.getenv("LLM_LATENCY_TARGET", "45"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_MAX_RETRY_AFTER = float(os.getenv("LLM_MAX_RETRY_AFTER", "30"))
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+LLM_BREAKER_RESET_TIMEOUT = float(os.getenv("LLM_BREAKER_RESET_TIMEOUT", "30"))
+# Prompt compaction (comments/whitespace stripped, flattened OpenZeppelin code summarized) and token accounting
+LLM_COMPACT_PROMPTS = os.getenv("LLM_COMPACT_PROMPTS", "true").lower() in ("1", "true", "yes")
+LLM_REPLACE_KNOWN_LIBRARIES = os.getenv("LLM_REPLACE_KNOWN_LIBRARIES", "true").lower() in ("1", "true", "yes")
+LLM_USAGE_LOG_SIZE = int(os.getenv("LLM_USAGE_LOG_SIZE", "100"))
+# Per-function finding cache: re-audits only send new or changed functions to the LLM
+FINDING_CACHE_ENABLED = os.getenv("FINDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+FINDING_CACHE_MAX_ENTRIES = int(os.getenv("FINDING_CACHE_MAX_ENTRIES", "5000"))
+# Start fix generation concurrently with detection; discarded when Slither and the LLM find nothing.
+# Saves one fix round trip, but the speculative prompt can't list the findings, so it is opt-in
+LLM_SPECULATIVE_FIX = os.getenv("LLM_SPECULATIVE_FIX", "false").lower() in ("1", "true", "yes")
+# Local toolchain: cached solc compilations and Slither runs
+COMPILER_CACHE_SIZE = int(os.getenv("COMPILER_CACHE_SIZE", "256"))
+COMPILER_CONCURRENCY = int(os.getenv("COMPILER_CONCURRENCY", str(os.cpu_count() or 2)))
+SLITHER_CACHE_SIZE = int(os.getenv("SLITHER_CACHE_SIZE", "256"))
+SLITHER_CONCURRENCY = int(os.getenv("SLITHER_CONCURRENCY", str(os.cpu_count() or 2)))
+# Slither detector profiles (quick: high-impact detectors only, standard: no informational or
+# optimization detectors, full: every detector); endpoints accept ?slither_profile= to override
+SLITHER_DEFAULT_PROFILE = os.getenv("SLITHER_DEFAULT_PROFILE", "standard")
+SLITHER_COMPREHENSIVE_PROFILE = os.getenv("SLITHER_COMPREHENSIVE_PROFILE", "full")
+# Analysis sandbox: Slither and solc run in worker processes with wall-clock timeouts (seconds),
+# an address-space cap and a CPU-time cap per job; timed-out or crashed workers are killed and replaced
+SANDBOX_ENABLED = os.getenv("SANDBOX_ENABLED", "true").lower() in ("1", "true", "yes")
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", str(SLITHER_CONCURRENCY + COMPILER_CONCURRENCY)))
+SANDBOX_MEMORY_LIMIT_MB = int(os.getenv("SANDBOX_MEMORY_LIMIT_MB", "4096"))
+SANDBOX_CPU_LIMIT = int(os.getenv("SANDBOX_CPU_LIMIT", "300"))
+SANDBOX_MAX_JOBS = int(os.getenv("SANDBOX_MAX_JOBS", "200"))
+SLITHER_TIMEOUT = float(os.getenv("SLITHER_TIMEOUT", "180"))
+COMPILE_TIMEOUT = float(os.getenv("COMPILE_TIMEOUT", "60"))
+# Best-of-N remediation: fix candidates requested in parallel, validated by solc and Slither
+REMEDIATION_CANDIDATES = int(os.getenv("REMEDIATION_CANDIDATES", "3"))
+REMEDIATION_TIME_BUDGET = float(os.getenv("REMEDIATION_TIME_BUDGET", "180"))
+# Batch audits: process-wide cap on contracts audited at once, and batch size limit
+BATCH_AUDIT_CONCURRENCY = int(os.getenv("BATCH_AUDIT_CONCURRENCY", "4"))
+BATCH_AUDIT_MAX_ITEMS = int(os.getenv("BATCH_AUDIT_MAX_ITEMS", "100"))
+# Etherscan verified-source lookups: requests per second allowed by the API key's plan
+# (5 on the free tier), and an optional directory where fetched sources are kept across restarts
+ETHERSCAN_API_KEY = os.getenv("ETHERSCAN_API_KEY")
+ETHERSCAN_CHAIN_ID = int(os.getenv("ETHERSCAN_CHAIN_ID", "11155111"))
+ETHERSCAN_RATE_LIMIT = float(os.getenv("ETHERSCAN_RATE_LIMIT", "5"))
+ETHERSCAN_TIMEOUT = float(os.getenv("ETHERSCAN_TIMEOUT", "20"))
+ETHERSCAN_MAX_RETRIES = int(os.getenv("ETHERSCAN_MAX_RETRIES", "3"))
+ETHERSCAN_CACHE_DIR = os.getenv("ETHERSCAN_CACHE_DIR", "")
+# Shared L1X RPC access: gas price refresh interval, request timeout and cached contract objects
+CHAIN_GAS_PRICE_TTL = float(os.getenv("CHAIN_GAS_PRICE_TTL", "5"))
+CHAIN_RPC_TIMEOUT = float(os.getenv("CHAIN_RPC_TIMEOUT", "30"))
+CHAIN_CONTRACT_CACHE_SIZE = int(os.getenv("CHAIN_CONTRACT_CACHE_SIZE", "128"))
+# Local nonce allocation: how often a transaction is rebuilt after the node rejects its nonce
+NONCE_MAX_RESYNC_RETRIES = int(os.getenv("NONCE_MAX_RESYNC_RETRIES", "3"))
+# A sent transaction not mined within this many seconds is presumed dropped and triggers a resync
+NONCE_PENDING_TIMEOUT = float(os.getenv("NONCE_PENDING_TIMEOUT", "600"))
+# Background receipt watcher: block polling interval and receipts per JSON-RPC batch
+RECEIPT_POLL_INTERVAL = float(os.getenv("RECEIPT_POLL_INTERVAL", "1"))
+RECEIPT_BATCH_SIZE = int(os.getenv("RECEIPT_BATCH_SIZE", "100"))
+# JSON-RPC batching: requests issued within this many seconds share one round trip (0 disables);
+# RPC_BATCH_MEASURE logs and returns calls vs. round trips for every deploy/mint
+RPC_BATCH_WINDOW = float(os.getenv("RPC_BATCH_WINDOW", "0.005"))
+RPC_BATCH_MAX_SIZE = int(os.getenv("RPC_BATCH_MAX_SIZE", "50"))
+RPC_BATCH_MEASURE = os.getenv("RPC_BATCH_MEASURE", "false").lower() in ("1", "true", "yes")
+# Certificate mint queue: mints to one contract are collected for this many seconds (or until
+# MINT_QUEUE_MAX_BATCH are waiting) and submitted together
+MINT_QUEUE_WINDOW = float(os.getenv("MINT_QUEUE_WINDOW", "0.5"))
+MINT_QUEUE_MAX_BATCH = int(os.getenv("MINT_QUEUE_MAX_BATCH", "20"))
+# Minting-report queries: threads running the synchronous MongoDB driver, and the largest page served
+REPORTS_DB_WORKERS = int(os.getenv("REPORTS_DB_WORKERS", "4"))
+REPORTS_MAX_PAGE_SIZE = int(os.getenv("REPORTS_MAX_PAGE_SIZE", "200"))
+# Bulk minting-report ingestion: records per unordered insert_many
+REPORTS_BULK_CHUNK_SIZE = int(os.getenv("REPORTS_BULK_CHUNK_SIZE", "1000"))
+# Cold start: time budget for importing app.main, checked by `python -m app.main --profile-startup`
+STARTUP_IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "1500"))
+# Cross-process state (wallet registry, nonce floor, rate limits) shared by all worker processes
+SHARED_STATE_DB = os.getenv("SHARED_STATE_DB", "state/shared_state.sqlite3")
+SHARED_STATE_BUSY_TIMEOUT = float(os.getenv("SHARED_STATE_BUSY_TIMEOUT", "10"))
+# Pre-fork serving (python -m app.serve): worker processes and solc versions installed before forking
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", str(os.cpu_count() or 1)))
+SOLC_PRELOAD_VERSIONS = [v.strip() for v in os.getenv("SOLC_PRELOAD_VERSIONS", "").split(",") if v.strip()]
+# NFT Transfer-event indexer: scans NFT_CONTRACT_ADDRESS from INDEXER_START_BLOCK in ranges of
+# INDEXER_BLOCK_RANGE blocks, stays INDEXER_CONFIRMATIONS blocks behind the head and feeds new mints
+# into the minting reports, INDEXER_REPORT_BATCH at a time
+INDEXER_ENABLED = os.getenv("INDEXER_ENABLED", "false").lower() in ("1", "true", "yes")
+INDEXER_START_BLOCK = int(os.getenv("INDEXER_START_BLOCK", "0"))
+INDEXER_CONFIRMATIONS = int(os.getenv("INDEXER_CONFIRMATIONS", "12"))
+INDEXER_BLOCK_RANGE = int(os.getenv("INDEXER_BLOCK_RANGE", "2000"))
+INDEXER_POLL_INTERVAL = float(os.getenv("INDEXER_POLL_INTERVAL", "5"))
+INDEXER_REPORT_BATCH = int(os.getenv("INDEXER_REPORT_BATCH", "200"))
+# Audit history: every audit result is stored (compressed) in MongoDB; finding text is trimmed to
+# AUDIT_HISTORY_TEXT_LIMIT characters in the searchable copy
+AUDIT_HISTORY_ENABLED = os.getenv("AUDIT_HISTORY_ENABLED", "true").lower() in ("1", "true", "yes")
+AUDIT_HISTORY_TEXT_LIMIT = int(os.getenv("AUDIT_HISTORY_TEXT_LIMIT", "1000"))
+# Finding normalization: same-category Slither/LLM findings this many lines apart are merged
+FINDINGS_MERGE_SLACK = int(os.getenv("FINDINGS_MERGE_SLACK", "2"))
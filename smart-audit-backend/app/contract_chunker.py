@@ -0,0 +1,379 @@
+"""
+Token-aware splitting of Solidity sources for LLM prompts.
+
+Sources are split along contract and function boundaries. Every chunk
+carries the file preamble (pragma, imports, top-level declarations), the
+contract header and the contract's state declarations, so each prompt is
+self-contained. Chunks keep a line map back to the original file.
+"""
+import re
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+CONTAINER_RE = re.compile(r'\b(abstract\s+contract|contract|library|interface)\s+(\w+)')
+CALLABLE_RE = re.compile(r'(function|modifier|constructor|fallback|receive)\b\s*(\w*)')
+BLOCK_DECL_RE = re.compile(r'(struct|enum)\b')
+NAMED_DECL_RE = re.compile(r'(struct|enum|event|error)\s+(\w+)')
+LINE_REF_RE = re.compile(r'\b(lines?\s*#?\s*)(\d+)(?:(\s*-\s*)(\d+))?', re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for code)."""
+    return (len(text) + 3) // 4
+
+
+@dataclass
+class SourceUnit:
+    kind: str           # "function", "modifier", "constructor", "fallback", "receive" or "state"
+    name: str
+    contract: str
+    start: int          # character offsets into the original source
+    end: int
+    start_line: int     # 1-based, inclusive
+    end_line: int
+    text: str
+
+    @property
+    def is_callable(self) -> bool:
+        return self.kind != "state"
+
+    @property
+    def key(self) -> Tuple[str, str, int]:
+        """Identity of a callable across rewrites: kind, name and parameter count."""
+        params = self.text[self.text.find("(") + 1:self.text.find(")")] if "(" in self.text else ""
+        arity = len([p for p in params.split(",") if p.strip()])
+        return self.kind, self.name, arity
+
+
+@dataclass
+class ContractBlock:
+    kind: str
+    name: str
+    header: str         # "contract X is Y {"
+    header_line: int
+    start: int
+    end: int            # offset just past the closing brace
+    body_start: int     # offset just past the opening brace
+    end_line: int
+    units: List[SourceUnit] = field(default_factory=list)
+
+    @property
+    def state_units(self) -> List[SourceUnit]:
+        return [u for u in self.units if not u.is_callable]
+
+    @property
+    def callable_units(self) -> List[SourceUnit]:
+        return [u for u in self.units if u.is_callable]
+
+
+@dataclass
+class ParsedSource:
+    source: str
+    preamble: List[Tuple[str, int]]     # (text, start_line) of top-level code outside contracts
+    contracts: List[ContractBlock]
+
+
+@dataclass
+class ContractChunk:
+    contract: str
+    text: str
+    line_map: List[int]                 # chunk line index -> original 1-based line number
+    units: List[SourceUnit]
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+
+def mask_comments_and_strings(source: str) -> str:
+    """
+    Return ``source`` with comment and string contents blanked out (newlines
+    kept), so offsets line up and braces inside them are ignored.
+    """
+    out = list(source)
+    i, n = 0, len(source)
+    while i < n:
+        c = source[i]
+        if source.startswith("//", i):
+            j = source.find("\n", i)
+            j = n if j == -1 else j
+        elif source.startswith("/*", i):
+            j = source.find("*/", i + 2)
+            j = n if j == -1 else j + 2
+        elif c in "\"'":
+            j = i + 1
+            while j < n and source[j] != c and source[j] != "\n":
+                j += 2 if source[j] == "\\" else 1
+            j = min(j + 1, n)
+            # keep the quotes so the masked text still tokenizes as a string
+            for k in range(i + 1, j - 1):
+                if out[k] != "\n":
+                    out[k] = " "
+            i = j
+            continue
+        else:
+            i += 1
+            continue
+        for k in range(i, j):
+            if out[k] != "\n":
+                out[k] = " "
+        i = j
+    return "".join(out)
+
+
+def _matching_brace(masked: str, open_index: int) -> int:
+    depth = 0
+    for i in range(open_index, len(masked)):
+        if masked[i] == "{":
+            depth += 1
+        elif masked[i] == "}":
+            depth -= 1
+            if depth == 0:
+                return i
+    return len(masked) - 1
+
+
+class LineIndex:
+    """Start offset of every line of a source, so offset-to-line lookups are a binary search."""
+
+    def __init__(self, source: str):
+        self.starts = [0] + [m.end() for m in re.finditer("\n", source)]
+
+    def line_of(self, offset: int) -> int:
+        """1-based line containing character ``offset``."""
+        return bisect_right(self.starts, offset)
+
+    def lines_of(self, start: int, length: int) -> Tuple[int, int]:
+        """First and last line of the span ``[start, start + length)``."""
+        return self.line_of(start), self.line_of(start + max(length, 1) - 1)
+
+    def offset_of(self, line: int) -> int:
+        return self.starts[min(max(line, 1), len(self.starts)) - 1]
+
+    @property
+    def line_count(self) -> int:
+        return len(self.starts)
+
+
+def declared_name(declaration: str) -> str:
+    """Identifier introduced by a state-level declaration ("" for ``using`` directives)."""
+    named = NAMED_DECL_RE.match(declaration.strip())
+    if named:
+        return named.group(2)
+    if declaration.strip().startswith("using "):
+        return ""
+    head = re.split(r'[=;]', declaration, maxsplit=1)[0]
+    identifiers = re.findall(r'\w+', head)
+    return identifiers[-1] if identifiers else ""
+
+
+def _parse_members(source: str, masked: str, block: ContractBlock, lines: LineIndex):
+    i, end = block.body_start, block.end - 1
+    while i < end:
+        while i < end and masked[i].isspace():
+            i += 1
+        if i >= end:
+            break
+        callable_match = CALLABLE_RE.match(masked, i)
+        if callable_match:
+            kind, name = callable_match.group(1), callable_match.group(2) or callable_match.group(1)
+            if kind in ("constructor", "fallback", "receive"):
+                name = kind
+            brace, semi = masked.find("{", i, end), masked.find(";", i, end)
+            if brace != -1 and (semi == -1 or brace < semi):
+                stop = _matching_brace(masked, brace) + 1
+            else:
+                # Declaration without a body (interfaces, abstract functions): treat as context
+                kind, stop = "state", (semi + 1 if semi != -1 else end)
+        else:
+            kind, name = "state", None
+            if BLOCK_DECL_RE.match(masked, i):
+                brace = masked.find("{", i, end)
+                stop = _matching_brace(masked, brace) + 1 if brace != -1 else end
+            else:
+                semi = masked.find(";", i, end)
+                stop = semi + 1 if semi != -1 else end
+        start = i
+        if name is None:
+            name = declared_name(masked[start:stop])
+        block.units.append(SourceUnit(
+            kind=kind, name=name, contract=block.name, start=start, end=stop,
+            start_line=lines.line_of(start), end_line=lines.line_of(stop - 1),
+            text=source[start:stop]
+        ))
+        i = stop
+
+
+def _add_preamble(source: str, masked: str, start: int, end: int, preamble: List[Tuple[str, int]],
+                  lines: LineIndex):
+    """Record top-level code between contracts; comment-only gaps are dropped."""
+    if not masked[start:end].strip():
+        return
+    segment = source[start:end]
+    leading = len(segment) - len(segment.lstrip("\n"))
+    preamble.append((segment.strip("\n"), lines.line_of(start + leading)))
+
+
+def parse_source(source: str) -> ParsedSource:
+    """Split a Solidity file into top-level preamble and contract blocks with their members."""
+    masked = mask_comments_and_strings(source)
+    lines = LineIndex(source)
+    contracts: List[ContractBlock] = []
+    preamble: List[Tuple[str, int]] = []
+    cursor = 0
+    for match in CONTAINER_RE.finditer(masked):
+        if match.start() < cursor:
+            continue
+        brace = masked.find("{", match.end())
+        if brace == -1:
+            break
+        close = _matching_brace(masked, brace)
+        _add_preamble(source, masked, cursor, match.start(), preamble, lines)
+        block = ContractBlock(
+            kind=re.sub(r'\s+', ' ', match.group(1)), name=match.group(2),
+            header=source[match.start():brace + 1], header_line=lines.line_of(match.start()),
+            start=match.start(), end=close + 1, body_start=brace + 1,
+            end_line=lines.line_of(close)
+        )
+        _parse_members(source, masked, block, lines)
+        contracts.append(block)
+        cursor = close + 1
+    _add_preamble(source, masked, cursor, len(source), preamble, lines)
+    return ParsedSource(source=source, preamble=preamble, contracts=contracts)
+
+
+def _segment_lines(text: str, start_line: int) -> Tuple[List[str], List[int]]:
+    lines = text.split("\n")
+    return lines, list(range(start_line, start_line + len(lines)))
+
+
+def build_chunk(parsed: ParsedSource, block: ContractBlock, functions: List[SourceUnit]) -> ContractChunk:
+    """Chunk with the shared context of ``block`` followed by ``functions`` in source order."""
+    lines: List[str] = []
+    line_map: List[int] = []
+
+    def add(text: str, start_line: int, indent: str = ""):
+        seg_lines, seg_map = _segment_lines(text, start_line)
+        lines.extend(line if k else indent + line for k, line in enumerate(seg_lines))
+        line_map.extend(seg_map)
+
+    for text, start_line in parsed.preamble:
+        add(text, start_line)
+    add(block.header, block.header_line)
+    for unit in block.state_units:
+        add(unit.text, unit.start_line, "    ")
+    for unit in functions:
+        lines.append("")
+        line_map.append(unit.start_line)
+        add(unit.text, unit.start_line, "    ")
+    lines.append("}")
+    line_map.append(block.end_line)
+    return ContractChunk(contract=block.name, text="\n".join(lines), line_map=line_map, units=list(functions))
+
+
+def pack_units(parsed: ParsedSource, block: ContractBlock, units: List[SourceUnit],
+               max_tokens: int) -> List[List[SourceUnit]]:
+    """
+    Group ``units`` so that each group plus the contract's shared context
+    fits in ``max_tokens``. A single unit larger than the budget gets a group
+    of its own.
+    """
+    context_tokens = build_chunk(parsed, block, []).tokens
+    budget = max(max_tokens - context_tokens, max_tokens // 4)
+    groups: List[List[SourceUnit]] = []
+    current: List[SourceUnit] = []
+    used = 0
+    for unit in units:
+        cost = estimate_tokens(unit.text) + 1
+        if current and used + cost > budget:
+            groups.append(current)
+            current, used = [], 0
+        current.append(unit)
+        used += cost
+    if current:
+        groups.append(current)
+    return groups
+
+
+def split_source(source: str, max_tokens: int) -> List[ContractChunk]:
+    """
+    Pack each contract's functions into chunks of at most ``max_tokens``
+    (including the shared context). A single function larger than the budget
+    gets a chunk of its own. Contracts without implemented functions
+    (interfaces) only appear as context.
+    """
+    parsed = parse_source(source)
+    chunks: List[ContractChunk] = []
+    for block in parsed.contracts:
+        functions = block.callable_units
+        if not functions:
+            continue
+        for group in pack_units(parsed, block, functions, max_tokens):
+            chunks.append(build_chunk(parsed, block, group))
+    if not chunks:
+        lines = source.split("\n")
+        chunks.append(ContractChunk(contract="", text=source, line_map=list(range(1, len(lines) + 1)), units=[]))
+    return chunks
+
+
+def remap_line_references(text: str, line_map: List[int]) -> str:
+    """Rewrite "line N" / "lines N-M" references from chunk lines to original lines."""
+    if not isinstance(text, str):
+        return text
+
+    def original(n: int) -> Optional[int]:
+        return line_map[n - 1] if 1 <= n <= len(line_map) else None
+
+    def replace(match: re.Match) -> str:
+        first = original(int(match.group(2)))
+        if first is None:
+            return match.group(0)
+        result = f"{match.group(1)}{first}"
+        if match.group(4):
+            last = original(int(match.group(4)))
+            result += f"{match.group(3)}{last if last is not None else match.group(4)}"
+        return result
+
+    return LINE_REF_RE.sub(replace, text)
+
+
+def shift_line_references(text: str, delta: int) -> str:
+    """Add ``delta`` to every "line N" / "lines N-M" reference in ``text``."""
+    if not isinstance(text, str) or not delta:
+        return text
+
+    def replace(match: re.Match) -> str:
+        result = f"{match.group(1)}{max(1, int(match.group(2)) + delta)}"
+        if match.group(4):
+            result += f"{match.group(3)}{max(1, int(match.group(4)) + delta)}"
+        return result
+
+    return LINE_REF_RE.sub(replace, text)
+
+
+def stitch_callables(source: str, replacements: Dict[Tuple[str, Tuple[str, str, int]], str],
+                     additions: Dict[str, List[str]]) -> str:
+    """
+    Rebuild ``source`` with callables replaced by their rewritten text.
+
+    ``replacements`` maps ``(contract, unit.key)`` to new text; ``additions``
+    maps a contract name to new member declarations (state variables,
+    modifiers, events) that are inserted after the contract's state block.
+    """
+    parsed = parse_source(source)
+    edits: List[Tuple[int, int, str]] = []
+    for block in parsed.contracts:
+        for unit in block.callable_units:
+            new_text = replacements.get((block.name, unit.key))
+            if new_text is not None:
+                edits.append((unit.start, unit.end, new_text.strip()))
+        new_members = additions.get(block.name)
+        if new_members:
+            state = block.state_units
+            anchor = state[-1].end if state else block.body_start
+            inserted = "".join(f"\n    {member.strip()}" for member in new_members)
+            edits.append((anchor, anchor, inserted))
+    for start, end, text in sorted(edits, key=lambda e: (e[0], e[1]), reverse=True):
+        source = source[:start] + text + source[end:]
+    return source
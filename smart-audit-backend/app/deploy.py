@@ -8,20 +8,16 @@ from typing import Dict, List
 
 from web3 import Web3
 
-try:
-    from web3.middleware.geth_poa import geth_poa_middleware
-except ImportError:
-    try:
-        from web3.middleware import geth_poa_middleware
-    except ImportError:
-        geth_poa_middleware = None
-
-from solcx import compile_standard, install_solc
+from app.chain import MAX_GAS_LIMIT, get_chain_id, get_contract, get_gas_price, get_service_account, get_web3
+from app.compiler import compile_source
+from app.nonce_manager import nonce_manager
+from app.mint_queue import mint_queue
+from app.receipt_watcher import receipt_watcher
+from app.rpc_batching import rpc_operation
 
 # ✅ Import centralized config
-from app.config import PRIVATE_KEY, L1X_RPC_URL, EXPLORER_URL
+from app.config import PRIVATE_KEY, EXPLORER_URL, RPC_BATCH_MEASURE
 
-MAX_GAS_LIMIT = 5_000_000
 MAX_CONTRACT_SIZE = 24_576  # bytes (EIP-170 limit)
 
 def get_private_key() -> str:
@@ -52,11 +48,13 @@ def save_contract_abi(contract_address: str, abi: List[Dict]) -> str:
         json.dump(abi, f)
     return abi_path
 
-async def is_nft_contract(w3: Web3, contract_address: str, abi: List[Dict]) -> bool:
+async def is_nft_contract(contract_address: str, abi: List[Dict]) -> bool:
     try:
-        contract = w3.eth.contract(address=contract_address, abi=abi)
-        is_erc721 = contract.functions.supportsInterface("0x80ac58cd").call()
-        is_erc1155 = contract.functions.supportsInterface("0xd9b67a26").call()
+        contract = get_contract(contract_address, abi)
+        is_erc721, is_erc1155 = await asyncio.gather(
+            contract.functions.supportsInterface("0x80ac58cd").call(),
+            contract.functions.supportsInterface("0xd9b67a26").call()
+        )
         return is_erc721 or is_erc1155
     except:
         return False
@@ -101,44 +99,63 @@ async def compile_contract(contract_path: str) -> Dict:
     contract_match = re.search(r'contract\s+(\w+)', contract_source)
     actual_contract_name = contract_match.group(1) if contract_match else file_name
 
-    solc_version = '0.8.19'
-    pragma_match = re.search(r'pragma solidity\s+[\^>=]*(\d+\.\d+\.\d*)', contract_source)
-    if pragma_match:
-        solc_version = pragma_match.group(1)
-        if len(solc_version.split('.')) == 2:
-            solc_version += ".19"
-
-    install_solc(solc_version)
-
-    compiled_sol = compile_standard({
-        "language": "Solidity",
-        "sources": {f"{file_name}.sol": {"content": contract_source}},
-        "settings": {
-            "outputSelection": {
-                "*": {"*": ["abi", "evm.bytecode", "evm.gasEstimates"]}
-            },
-            "optimizer": {
-                "enabled": True,
-                "runs": 200
-            }
-        }
-    }, solc_version=solc_version)
+    compilation = await compile_source(contract_source, f"{file_name}.sol", contract_name=actual_contract_name)
+    if not compilation["bytecode"]:
+        raise ValueError("Compilation failed: Bytecode is empty.")
+
+    return {**compilation, "file_name": file_name}
+
+async def _deploy_compiled(compilation: Dict, security_check: Dict) -> Dict:
+    w3 = get_web3()
+    account = get_service_account()
+    contract = w3.eth.contract(abi=compilation["abi"], bytecode=compilation["bytecode"])
+    constructor = contract.constructor()
+
+    # Independent preflight calls, issued together so they share one batched round trip
+    chain_id, _, estimated_gas, _ = await asyncio.gather(
+        get_chain_id(),
+        get_gas_price(),
+        constructor.estimate_gas({"from": account.address}),
+        nonce_manager.prepare(account.address)
+    )
+    if estimated_gas > MAX_GAS_LIMIT:
+        raise ValueError("Estimated gas exceeds limit")
+
+    async def build_tx(nonce: int) -> Dict:
+        return await constructor.build_transaction({
+            "chainId": chain_id,
+            "gas": estimated_gas + 10000,
+            "gasPrice": await get_gas_price(),
+            "from": account.address,
+            "nonce": nonce
+        })
 
-    compiled_contracts = compiled_sol["contracts"][f"{file_name}.sol"]
-    if actual_contract_name not in compiled_contracts:
-        actual_contract_name = list(compiled_contracts.keys())[0]
+    tx_hash = await nonce_manager.send_transaction(build_tx, account)
+    tx_receipt = await receipt_watcher.wait_for_receipt(tx_hash, timeout=180)
 
-    bytecode_obj = compiled_contracts[actual_contract_name]["evm"]["bytecode"]["object"]
-    if not bytecode_obj:
-        raise ValueError("Compilation failed: Bytecode is empty.")
+    if not tx_receipt.contractAddress:
+        raise ValueError("Deployment failed")
+
+    contract_hash = hash_contract_address(tx_receipt.contractAddress)
+    is_nft = await is_nft_contract(tx_receipt.contractAddress, compilation["abi"])
+    if is_nft:
+        save_contract_abi(tx_receipt.contractAddress, compilation["abi"])
 
     return {
-        "contract_name": actual_contract_name,
-        "file_name": file_name,
-        "bytecode": bytecode_obj,
-        "abi": compiled_contracts[actual_contract_name]["abi"],
-        "gas_estimates": compiled_contracts[actual_contract_name]["evm"]["gasEstimates"],
-        "solc_version": solc_version
+        "status": "success",
+        "contract_name": compilation["contract_name"],
+        "contract_address": tx_receipt.contractAddress,
+        "contract_hash": contract_hash,
+        "transaction_hash": tx_hash,
+        "gas_used": tx_receipt.gasUsed,
+        "gas_estimated": estimated_gas,
+        "block_number": tx_receipt.blockNumber,
+        "abi": compilation["abi"],
+        "solc_version": compilation["solc_version"],
+        "explorer_url": f"{EXPLORER_URL}/address/{tx_receipt.contractAddress}",
+        "security_analysis": security_check,
+        "is_nft_contract": is_nft,
+        "wallet_address": account.address
     }
 
 async def deploy_fixed_contract(contract_path: str, force_deploy: bool = False) -> Dict:
@@ -156,56 +173,10 @@ async def deploy_fixed_contract(contract_path: str, force_deploy: bool = False)
         if len(compilation["bytecode"]) // 2 > MAX_CONTRACT_SIZE:
             raise ValueError("Contract size exceeds EIP-170 limit")
 
-        w3 = Web3(Web3.HTTPProvider(L1X_RPC_URL))
-        if geth_poa_middleware:
-            w3.middleware_onion.inject(geth_poa_middleware, layer=0)
-
-        private_key = get_private_key()
-        account = w3.eth.account.from_key(private_key)
-        contract = w3.eth.contract(abi=compilation["abi"], bytecode=compilation["bytecode"])
-        nonce = w3.eth.get_transaction_count(account.address)
-        constructor = contract.constructor()
-
-        estimated_gas = constructor.estimate_gas({"from": account.address, "chainId": w3.eth.chain_id})
-        if estimated_gas > MAX_GAS_LIMIT:
-            raise ValueError("Estimated gas exceeds limit")
-
-        tx = constructor.build_transaction({
-            "chainId": w3.eth.chain_id,
-            "gas": estimated_gas + 10000,
-            "gasPrice": w3.eth.gas_price,
-            "from": account.address,
-            "nonce": nonce
-        })
-
-        signed_tx = account.sign_transaction(tx)
-        tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        tx_receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=180)
-
-        if not tx_receipt.contractAddress:
-            raise ValueError("Deployment failed")
-
-        contract_hash = hash_contract_address(tx_receipt.contractAddress)
-        is_nft = await is_nft_contract(w3, tx_receipt.contractAddress, compilation["abi"])
-        if is_nft:
-            save_contract_abi(tx_receipt.contractAddress, compilation["abi"])
-
-        result = {
-            "status": "success",
-            "contract_name": compilation["contract_name"],
-            "contract_address": tx_receipt.contractAddress,
-            "contract_hash": contract_hash,
-            "transaction_hash": tx_hash.hex(),
-            "gas_used": tx_receipt.gasUsed,
-            "gas_estimated": estimated_gas,
-            "block_number": tx_receipt.blockNumber,
-            "abi": compilation["abi"],
-            "solc_version": compilation["solc_version"],
-            "explorer_url": f"{EXPLORER_URL}/address/{tx_receipt.contractAddress}",
-            "security_analysis": security_check,
-            "is_nft_contract": is_nft,
-            "wallet_address": account.address
-        }
+        with rpc_operation("deploy") as rpc:
+            result = await _deploy_compiled(compilation, security_check)
+        if RPC_BATCH_MEASURE:
+            result["rpc"] = rpc.summary()
 
         if security_check["warnings"]:
             result["deployment_warnings"] = f"Deployed with warnings: {security_check['warnings']}"
@@ -220,42 +191,12 @@ async def deploy_fixed_contract(contract_path: str, force_deploy: bool = False)
             "security_analysis": security_check if 'security_check' in locals() else None
         }
 
-async def mint_nft(w3: Web3, nft_contract_address: str, nft_abi: List, recipient_address: str, token_uri: str) -> Dict:
+async def mint_nft(nft_contract_address: str, nft_abi: List, recipient_address: str, token_uri: str) -> Dict:
     try:
-        private_key = get_private_key()
         recipient_address = Web3.to_checksum_address(recipient_address)
         nft_contract_address = Web3.to_checksum_address(nft_contract_address)
-        contract = w3.eth.contract(address=nft_contract_address, abi=nft_abi)
-        account = w3.eth.account.from_key(private_key)
-        nonce = await asyncio.to_thread(w3.eth.get_transaction_count, account.address)
-
-        mint_fn = contract.functions.mintToUser(recipient_address, token_uri)
-        gas_estimate = await asyncio.to_thread(mint_fn.estimate_gas, {"from": account.address})
-
-        if gas_estimate > MAX_GAS_LIMIT:
-            raise ValueError("Estimated gas exceeds limit")
-
-        tx = mint_fn.build_transaction({
-            "chainId": w3.eth.chain_id,
-            "gas": gas_estimate + 10000,
-            "gasPrice": w3.eth.gas_price,
-            "from": account.address,
-            "nonce": nonce
-        })
-
-        signed_tx = account.sign_transaction(tx)
-        tx_hash = await asyncio.to_thread(w3.eth.send_raw_transaction, signed_tx.raw_transaction)
-        receipt = await asyncio.to_thread(w3.eth.wait_for_transaction_receipt, tx_hash, timeout=120)
-
-        return {
-            "status": "success",
-            "transaction_hash": tx_hash.hex(),
-            "block_number": receipt.blockNumber,
-            "gas_used": receipt.gasUsed,
-            "nft_contract": nft_contract_address,
-            "recipient": recipient_address,
-            "token_uri": token_uri
-        }
+        # Queued so concurrent certificate mints share a transaction (see app.mint_queue)
+        return await mint_queue.mint(nft_contract_address, nft_abi, recipient_address, token_uri)
     except Exception as e:
         return {
             "status": "error",
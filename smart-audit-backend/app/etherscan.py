@@ -0,0 +1,452 @@
+"""
+Async Etherscan client for verified contract sources.
+
+Requests go through one pooled ``httpx.AsyncClient`` and a client-side token
+bucket sized to Etherscan's per-key quota, so bursts of deployed-contract
+audits queue locally instead of being answered with "Max rate limit reached".
+Verified source never changes, so results are cached permanently per
+``(chain id, address)``: in memory and, if ``ETHERSCAN_CACHE_DIR`` is set, on
+disk across restarts. Concurrent lookups of the same address share one request.
+
+``SourceCode`` comes in three shapes: a single Solidity file, a JSON object of
+``{path: {"content": ...}}`` and solc standard-JSON input wrapped in an extra
+pair of braces (``{{...}}``). All three are parsed into a ``SourceProject``
+that the compiler service and Slither can use as-is, and that can be
+flattened into one file for the LLM stages.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import random
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from app.config import (
+    ETHERSCAN_API_KEY,
+    ETHERSCAN_API_URL,
+    ETHERSCAN_CACHE_DIR,
+    ETHERSCAN_CHAIN_ID,
+    ETHERSCAN_MAX_RETRIES,
+    ETHERSCAN_RATE_LIMIT,
+    ETHERSCAN_TIMEOUT,
+)
+from app import shared_state
+from app.contract_chunker import mask_comments_and_strings
+
+logger = logging.getLogger(__name__)
+
+ADDRESS_RE = re.compile(r'^0x[0-9a-fA-F]{40}$')
+IMPORT_RE = re.compile(r'\bimport\b[^;]*;')
+IMPORT_PATH_RE = re.compile(r'["\']([^"\']+)["\']')
+SPDX_RE = re.compile(r'^\s*//\s*SPDX-License-Identifier:.*$', re.MULTILINE)
+PRAGMA_RE = re.compile(r'^\s*pragma\s+[^;]+;\s*$', re.MULTILINE)
+COMPILER_VERSION_RE = re.compile(r'v?(\d+\.\d+\.\d+)')
+
+
+class EtherscanError(Exception):
+    """Etherscan could not be queried or returned an unusable answer."""
+
+
+class SourceNotVerifiedError(EtherscanError):
+    """The address has no verified source on this chain."""
+
+
+class UnsupportedSourceError(EtherscanError):
+    """Verified, but not something this service can audit (e.g. Vyper)."""
+
+
+@dataclass
+class SourceProject:
+    """A verified contract's sources, laid out as solc standard-JSON input expects."""
+    address: str
+    chain_id: int
+    contract_name: str
+    sources: Dict[str, str]             # source unit name -> content
+    main_file: str
+    compiler_version: Optional[str]     # e.g. "0.8.19", None if Etherscan didn't say
+    settings: Dict = field(default_factory=dict)
+
+    @property
+    def is_multi_file(self) -> bool:
+        return len(self.sources) > 1
+
+    @property
+    def remappings(self) -> List[str]:
+        return list(self.settings.get("remappings") or [])
+
+    def flatten(self) -> str:
+        """Single-file form for the LLM, report and single-file pipeline stages."""
+        if not self.is_multi_file:
+            return self.sources[self.main_file]
+        return flatten_sources(self.sources, self.main_file, self.remappings)
+
+
+def resolve_import(importer: str, path: str, remappings: List[str]) -> str:
+    """Source unit name an ``import`` in ``importer`` refers to."""
+    if path.startswith("./") or path.startswith("../"):
+        return posixpath.normpath(posixpath.join(posixpath.dirname(importer), path))
+    best: Optional[Tuple[str, str]] = None
+    for remapping in remappings:
+        context, _, mapping = remapping.rpartition(":")
+        prefix, _, target = mapping.partition("=")
+        if context and not importer.startswith(context):
+            continue
+        if path.startswith(prefix) and (best is None or len(prefix) > len(best[0])):
+            best = (prefix, target)
+    if best:
+        return best[1] + path[len(best[0]):]
+    return path
+
+
+def _imports(name: str, source: str, remappings: List[str]) -> List[Tuple[int, int, str]]:
+    """``(start, end, resolved path)`` of every import statement in ``source``."""
+    masked = mask_comments_and_strings(source)
+    found = []
+    for match in IMPORT_RE.finditer(masked):
+        path = IMPORT_PATH_RE.search(source, match.start(), match.end())
+        if path:
+            found.append((match.start(), match.end(), resolve_import(name, path.group(1), remappings)))
+    return found
+
+
+def flatten_sources(sources: Dict[str, str], main_file: str, remappings: List[str]) -> str:
+    """
+    Concatenate ``main_file`` and everything it imports, dependencies first,
+    with import statements removed and only the first SPDX licence line kept.
+    Aliased imports (``import {A as B}``) are not rewritten.
+    """
+    order: List[str] = []
+    seen = set()
+
+    def visit(name: str):
+        if name in seen or name not in sources:
+            return
+        seen.add(name)
+        for _, _, dependency in _imports(name, sources[name], remappings):
+            visit(dependency)
+        order.append(name)
+
+    visit(main_file)
+    # Files nothing reaches from the main file are still part of the verified build
+    for name in sources:
+        visit(name)
+
+    parts = []
+    licence_seen = False
+    pragmas = set()
+    for name in order:
+        source = sources[name]
+        for start, end, _ in reversed(_imports(name, source, remappings)):
+            source = source[:start] + source[end:]
+
+        def keep_first_licence(match: re.Match) -> str:
+            nonlocal licence_seen
+            if licence_seen:
+                return ""
+            licence_seen = True
+            return match.group(0)
+
+        def keep_new_pragma(match: re.Match) -> str:
+            pragma = " ".join(match.group(0).split())
+            if pragma in pragmas:
+                return ""
+            pragmas.add(pragma)
+            return match.group(0)
+
+        source = SPDX_RE.sub(keep_first_licence, source)
+        source = PRAGMA_RE.sub(keep_new_pragma, source)
+        parts.append(f"// File: {name}\n{source.strip()}\n")
+    return "\n".join(parts)
+
+
+def _main_file(sources: Dict[str, str], contract_name: str) -> str:
+    declaration = re.compile(rf'\b(?:abstract\s+)?(?:contract|library|interface)\s+{re.escape(contract_name)}\b')
+    matches = [name for name, source in sources.items()
+               if declaration.search(mask_comments_and_strings(source))]
+    if matches:
+        # Prefer the file named after the contract when several declare it
+        named = [name for name in matches if posixpath.basename(name) == f"{contract_name}.sol"]
+        return (named or matches)[0]
+    return next(reversed(list(sources)))
+
+
+def parse_source_code(entry: Dict, address: str, chain_id: int) -> SourceProject:
+    """Build a ``SourceProject`` from one ``getsourcecode`` result entry."""
+    raw = entry.get("SourceCode") or ""
+    if not raw.strip():
+        raise SourceNotVerifiedError(f"Verified source code not found for {address}.")
+    compiler = entry.get("CompilerVersion") or ""
+    if compiler.lower().startswith("vyper"):
+        raise UnsupportedSourceError("Only Solidity contracts can be audited; this contract is written in Vyper.")
+    version_match = COMPILER_VERSION_RE.search(compiler)
+    contract_name = entry.get("ContractName") or "Contract"
+
+    settings: Dict = {}
+    text = raw.strip()
+    if text.startswith("{"):
+        if text.startswith("{{") and text.endswith("}}"):
+            text = text[1:-1]
+        try:
+            document = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise EtherscanError(f"Could not parse multi-file source for {address}: {e}")
+        if "sources" in document:
+            if str(document.get("language", "Solidity")).lower() != "solidity":
+                raise UnsupportedSourceError(f"Only Solidity contracts can be audited, not {document['language']}.")
+            settings = document.get("settings") or {}
+            document = document["sources"]
+        sources = {name: spec.get("content", "") for name, spec in document.items()}
+    else:
+        sources = {f"{contract_name}.sol": raw}
+        settings = {"optimizer": {"enabled": entry.get("OptimizationUsed") == "1",
+                                  "runs": int(entry.get("Runs") or 200)}}
+        if entry.get("EVMVersion") and entry["EVMVersion"].lower() != "default":
+            settings["evmVersion"] = entry["EVMVersion"].lower()
+    if not sources:
+        raise SourceNotVerifiedError(f"Verified source code not found for {address}.")
+
+    return SourceProject(
+        address=address,
+        chain_id=chain_id,
+        contract_name=contract_name,
+        sources=sources,
+        main_file=_main_file(sources, contract_name),
+        compiler_version=version_match.group(1) if version_match else None,
+        settings=settings,
+    )
+
+
+class RateLimiter:
+    """
+    Token bucket: at most ``rate`` acquisitions per second, bursts up to
+    ``rate``. With a ``shared_name`` and several worker processes the bucket
+    lives in ``app.shared_state`` and the limit holds across them together.
+    """
+
+    def __init__(self, rate: float, shared_name: Optional[str] = None):
+        self.rate = rate
+        self.shared_name = shared_name
+        self.capacity = max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock, self._lock_loop = asyncio.Lock(), loop
+        return self._lock
+
+    async def acquire(self) -> float:
+        """Wait for a token; returns the time spent waiting."""
+        waited = 0.0
+        if self.shared_name and shared_state.multi_process():
+            while True:
+                delay = await asyncio.to_thread(shared_state.take_token, self.shared_name, self.rate, self.capacity)
+                if delay == 0:
+                    return waited
+                waited += delay
+                await asyncio.sleep(delay)
+        async with self._get_lock():
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+
+rate_limiter = RateLimiter(ETHERSCAN_RATE_LIMIT, shared_name="etherscan")    # the API key's limit, not per worker
+etherscan_stats = {
+    "requests": 0,
+    "cache_hits": 0,
+    "disk_hits": 0,
+    "joined_in_flight": 0,
+    "rate_limited": 0,
+    "throttled_s": 0.0,
+    "retries": 0,
+    "not_verified": 0,
+}
+_projects: Dict[Tuple[int, str], SourceProject] = {}
+_in_flight: Dict[Tuple[int, str], asyncio.Task] = {}
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Process-wide pooled client, recreated if the event loop changed (e.g. scripts)."""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=ETHERSCAN_TIMEOUT,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+        _client_loop = loop
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+
+def _cache_path(key: Tuple[int, str]) -> Optional[str]:
+    if not ETHERSCAN_CACHE_DIR:
+        return None
+    return os.path.join(ETHERSCAN_CACHE_DIR, str(key[0]), f"{key[1]}.json")
+
+
+def preload_cache() -> int:
+    """Load every project in ``ETHERSCAN_CACHE_DIR`` into memory (before forking workers)."""
+    if not ETHERSCAN_CACHE_DIR or not os.path.isdir(ETHERSCAN_CACHE_DIR):
+        return 0
+    loaded = 0
+    for chain_dir in os.listdir(ETHERSCAN_CACHE_DIR):
+        if not chain_dir.isdigit():
+            continue
+        for name in os.listdir(os.path.join(ETHERSCAN_CACHE_DIR, chain_dir)):
+            if name.endswith(".json"):
+                key = (int(chain_dir), name[:-len(".json")])
+                project = _projects.get(key) or _load_cached(key)
+                if project is not None:
+                    _projects[key] = project
+                    loaded += 1
+    return loaded
+
+
+def _load_cached(key: Tuple[int, str]) -> Optional[SourceProject]:
+    path = _cache_path(key)
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return SourceProject(**json.load(f))
+    except (OSError, ValueError, TypeError) as e:
+        logger.warning(f"Ignoring unreadable Etherscan cache entry {path}: {e}")
+        return None
+
+
+def _store_cached(key: Tuple[int, str], project: SourceProject):
+    path = _cache_path(key)
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(project), f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write Etherscan cache entry {path}: {e}")
+
+
+async def _get_source_entry(address: str, chain_id: int) -> Dict:
+    params = {
+        "chainid": chain_id,
+        "module": "contract",
+        "action": "getsourcecode",
+        "address": address,
+        "apikey": ETHERSCAN_API_KEY,
+    }
+    for attempt in range(ETHERSCAN_MAX_RETRIES + 1):
+        if attempt:
+            etherscan_stats["retries"] += 1
+            await asyncio.sleep(min(8.0, 0.5 * 2 ** attempt) * (0.5 + random.random()))
+        waited = await rate_limiter.acquire()
+        if waited:
+            etherscan_stats["rate_limited"] += 1
+            etherscan_stats["throttled_s"] += waited
+        etherscan_stats["requests"] += 1
+        try:
+            response = await get_client().get(ETHERSCAN_API_URL, params=params)
+        except httpx.HTTPError as e:
+            logger.warning(f"Etherscan request for {address} failed: {e}")
+            continue
+        if response.status_code == 429 or response.status_code >= 500:
+            continue
+        try:
+            data = response.json()
+        except ValueError:
+            raise EtherscanError(f"Etherscan returned a non-JSON response ({response.status_code})")
+        result = data.get("result")
+        if data.get("status") == "1" and isinstance(result, list) and result:
+            return result[0]
+        # Quota errors come back as HTTP 200 with status "0"
+        if isinstance(result, str) and "rate limit" in result.lower():
+            continue
+        raise EtherscanError(f"Etherscan error: {result or data.get('message')}")
+    raise EtherscanError(f"Etherscan did not answer for {address} after {ETHERSCAN_MAX_RETRIES + 1} attempts")
+
+
+async def _fetch_and_remember(key: Tuple[int, str], address: str) -> SourceProject:
+    project = await asyncio.to_thread(_load_cached, key)
+    if project is not None:
+        etherscan_stats["disk_hits"] += 1
+    else:
+        try:
+            project = parse_source_code(await _get_source_entry(address, key[0]), address, key[0])
+        except SourceNotVerifiedError:
+            # Not cached: the contract may be verified later
+            etherscan_stats["not_verified"] += 1
+            raise
+        await asyncio.to_thread(_store_cached, key, project)
+    _projects[key] = project
+    return project
+
+
+def _finish_in_flight(key: Tuple[int, str], task: asyncio.Task):
+    _in_flight.pop(key, None)
+    if not task.cancelled():
+        task.exception()
+
+
+async def fetch_verified_project(address: str, chain_id: int = ETHERSCAN_CHAIN_ID) -> SourceProject:
+    """
+    Verified sources of the contract at ``address``. Raises
+    ``SourceNotVerifiedError``, ``UnsupportedSourceError`` or ``EtherscanError``.
+    """
+    address = address.strip()
+    if not ADDRESS_RE.match(address):
+        raise ValueError(f"Invalid contract address: {address!r}")
+    key = (chain_id, address.lower())
+    project = _projects.get(key)
+    if project is not None:
+        etherscan_stats["cache_hits"] += 1
+        return project
+    task = _in_flight.get(key)
+    if task is None:
+        task = _in_flight[key] = asyncio.ensure_future(_fetch_and_remember(key, address))
+        task.add_done_callback(lambda t: _finish_in_flight(key, t))
+    else:
+        etherscan_stats["joined_in_flight"] += 1
+    return await asyncio.shield(task)
+
+
+def source_digest(project: SourceProject) -> str:
+    """Content hash of a project's sources, used as a cache key downstream."""
+    payload = json.dumps([project.main_file, project.sources, project.remappings], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_etherscan_stats() -> Dict:
+    return {
+        **etherscan_stats,
+        "throttled_s": round(etherscan_stats["throttled_s"], 3),
+        "cached_projects": len(_projects),
+        "rate_limit_per_s": rate_limiter.rate,
+    }
@@ -0,0 +1,188 @@
+"""
+Finding cache for incremental re-audits.
+
+LLM findings are stored per source unit (function, modifier, constructor,
+...) under a hash of the unit's normalized text, the normalized context of
+its contract (file preamble, contract header, state declarations) and the
+units it references. Findings that cannot be tied to a single unit are
+stored against the contract context. Line references are kept relative to
+the unit, so a function that only moved reuses its findings at its new
+position.
+"""
+import copy
+import hashlib
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from app.config import FINDING_CACHE_MAX_ENTRIES
+from app.contract_chunker import (
+    LINE_REF_RE,
+    ContractBlock,
+    ParsedSource,
+    SourceUnit,
+    shift_line_references,
+)
+from app.prompt_compactor import collapse_whitespace, strip_comments
+
+IDENTIFIER_RE = re.compile(r'\b[A-Za-z_]\w*\b')
+
+
+def normalize_code(text: str) -> str:
+    """Comment- and whitespace-insensitive form of a code fragment."""
+    lines = (collapse_whitespace(line) for line in strip_comments(text).split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class UnitFingerprint:
+    unit: SourceUnit
+    key: str
+    dependencies: List[SourceUnit] = field(default_factory=list)
+
+
+@dataclass
+class ContractFingerprint:
+    block: ContractBlock
+    context_key: str
+    units: List[UnitFingerprint]
+
+
+def fingerprint_source(parsed: ParsedSource) -> List[ContractFingerprint]:
+    """Cache keys for every contract with implemented functions in ``parsed``."""
+    preamble = normalize_code("\n".join(text for text, _ in parsed.preamble))
+    fingerprints = []
+    for block in parsed.contracts:
+        callables = block.callable_units
+        if not callables:
+            continue
+        context = _digest(
+            preamble, normalize_code(block.header),
+            *(normalize_code(unit.text) for unit in block.state_units)
+        )
+        unit_hashes = {id(unit): _digest(unit.kind, normalize_code(unit.text)) for unit in callables}
+        by_name: Dict[str, List[SourceUnit]] = {}
+        for unit in callables:
+            by_name.setdefault(unit.name, []).append(unit)
+
+        units = []
+        for unit in callables:
+            referenced = set(IDENTIFIER_RE.findall(strip_comments(unit.text))) - {unit.name}
+            dependencies = [dep for name in sorted(referenced) for dep in by_name.get(name, [])]
+            key = _digest(
+                block.name, context, unit_hashes[id(unit)],
+                *sorted(unit_hashes[id(dep)] for dep in dependencies)
+            )
+            units.append(UnitFingerprint(unit=unit, key=key, dependencies=dependencies))
+        fingerprints.append(ContractFingerprint(block=block, context_key=_digest(block.name, context), units=units))
+    return fingerprints
+
+
+def _first_line_reference(location: str) -> Optional[int]:
+    match = LINE_REF_RE.search(location or "")
+    return int(match.group(2)) if match else None
+
+
+def attribute_finding(finding: Dict, contracts: List[ContractFingerprint]) -> tuple:
+    """
+    Pick the unit a finding belongs to, by function name in its location,
+    then by line. Returns ``(contract, unit)``; ``unit`` is None for
+    contract-level findings and ``contract`` may be None if no contract matches.
+    """
+    location = str(finding.get("location", ""))
+    names = set(re.findall(r'(\w+)\s*\(', location)) or set(IDENTIFIER_RE.findall(location))
+    line = _first_line_reference(location)
+    candidates = [
+        (contract, fp) for contract in contracts for fp in contract.units if fp.unit.name in names
+    ]
+    if len(candidates) > 1:
+        mentioned = [c for c in candidates if c[0].block.name in names]
+        if line is not None:
+            mentioned = [c for c in (mentioned or candidates)
+                         if c[1].unit.start_line <= line <= c[1].unit.end_line] or mentioned
+        candidates = mentioned or candidates
+    if candidates:
+        return candidates[0][0], candidates[0][1]
+    if line is not None:
+        for contract in contracts:
+            for fp in contract.units:
+                if fp.unit.start_line <= line <= fp.unit.end_line:
+                    return contract, fp
+            if contract.block.header_line <= line <= contract.block.end_line:
+                return contract, None
+    named = [contract for contract in contracts if contract.block.name in names]
+    return (named[0] if named else None), None
+
+
+def _relocate(findings: List[Dict], delta: int, status: Optional[str] = None) -> List[Dict]:
+    relocated = []
+    for finding in findings:
+        finding = copy.deepcopy(finding)
+        finding["location"] = shift_line_references(finding.get("location", ""), delta)
+        if status:
+            finding["cache_status"] = status
+        else:
+            finding.pop("cache_status", None)
+        relocated.append(finding)
+    return relocated
+
+
+class FindingCache:
+    """Bounded LRU of findings per unit key and per contract context key."""
+
+    def __init__(self, max_entries: int = FINDING_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self.stats = {"unit_hits": 0, "unit_misses": 0, "context_hits": 0, "context_misses": 0}
+
+    def _get(self, key: str) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _put(self, key: str, entry: Dict):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_unit(self, fp: UnitFingerprint) -> Optional[List[Dict]]:
+        """Cached findings for an unchanged unit, located at its current lines."""
+        entry = self._get("unit:" + fp.key)
+        self.stats["unit_hits" if entry is not None else "unit_misses"] += 1
+        if entry is None:
+            return None
+        return _relocate(entry["findings"], fp.unit.start_line - 1, "reused")
+
+    def put_unit(self, fp: UnitFingerprint, findings: List[Dict]):
+        self._put("unit:" + fp.key, {"findings": _relocate(findings, 1 - fp.unit.start_line)})
+
+    def get_context(self, contract: ContractFingerprint) -> Optional[Dict]:
+        entry = self._get("context:" + contract.context_key)
+        self.stats["context_hits" if entry is not None else "context_misses"] += 1
+        if entry is None:
+            return None
+        return {
+            **entry,
+            "findings": _relocate(entry["findings"], contract.block.header_line - 1, "reused")
+        }
+
+    def put_context(self, contract: ContractFingerprint, findings: List[Dict],
+                    risk_score=None, summary: str = ""):
+        self._put("context:" + contract.context_key, {
+            "findings": _relocate(findings, 1 - contract.block.header_line),
+            "risk_score": risk_score,
+            "summary": summary
+        })
+
+    def snapshot(self) -> Dict:
+        return {"entries": len(self._entries), "max_entries": self.max_entries, **self.stats}
+
+
+finding_cache = FindingCache()
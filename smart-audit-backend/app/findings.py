@@ -0,0 +1,480 @@
+"""
+Normalization and de-duplication of Slither and LLM findings.
+
+Both sources describe the same issues in different words: Slither by
+detector name and source mapping, the LLM by free-text title and
+location. Each finding is mapped onto a common category taxonomy keyed by
+SWC id where one exists (``TAXONOMY``), and its location is resolved to a
+line range through the parsed source (a ``LineIndex`` for offsets, the
+contract's functions for names in LLM locations). Findings of the same
+category whose scopes overlap, within ``FINDINGS_MERGE_SLACK`` lines, are
+merged through a per-category interval index; the merged finding keeps the
+highest severity, every source and detector, and the LLM's wording where
+there is one.
+
+``normalize_findings`` returns the merged set in the same schema as
+``find_vulnerabilities``, so the report generator and the fix prompt can
+use it in place of the two overlapping lists.
+"""
+import re
+from bisect import bisect_left, insort
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from app.config import FINDINGS_MERGE_SLACK
+from app.contract_chunker import LINE_REF_RE, LineIndex, parse_source
+
+
+# category -> (SWC id or None, display title)
+TAXONOMY: Dict[str, Tuple[Optional[str], str]] = {
+    "integer-overflow": ("SWC-101", "Integer Overflow and Underflow"),
+    "outdated-compiler": ("SWC-102", "Outdated Compiler Version"),
+    "floating-pragma": ("SWC-103", "Floating Pragma"),
+    "unchecked-call": ("SWC-104", "Unchecked Call Return Value"),
+    "unprotected-withdrawal": ("SWC-105", "Unprotected Ether Withdrawal"),
+    "unprotected-selfdestruct": ("SWC-106", "Unprotected SELFDESTRUCT Instruction"),
+    "reentrancy": ("SWC-107", "Reentrancy"),
+    "default-visibility": ("SWC-108", "State Variable Default Visibility"),
+    "uninitialized-storage": ("SWC-109", "Uninitialized Storage Pointer"),
+    "assert-violation": ("SWC-110", "Assert Violation"),
+    "deprecated-functions": ("SWC-111", "Use of Deprecated Solidity Functions"),
+    "delegatecall": ("SWC-112", "Delegatecall to Untrusted Callee"),
+    "dos-failed-call": ("SWC-113", "DoS with Failed Call"),
+    "front-running": ("SWC-114", "Transaction Order Dependence"),
+    "tx-origin": ("SWC-115", "Authorization through tx.origin"),
+    "timestamp-dependence": ("SWC-116", "Block values as a proxy for time"),
+    "signature-malleability": ("SWC-117", "Signature Malleability"),
+    "shadowing": ("SWC-119", "Shadowing State Variables"),
+    "weak-randomness": ("SWC-120", "Weak Sources of Randomness from Chain Attributes"),
+    "signature-replay": ("SWC-121", "Missing Protection against Signature Replay Attacks"),
+    "arbitrary-storage-write": ("SWC-124", "Write to Arbitrary Storage Location"),
+    "dos-gas-limit": ("SWC-128", "DoS With Block Gas Limit"),
+    "rtlo": ("SWC-130", "Right-To-Left-Override control character"),
+    "unused-variable": ("SWC-131", "Presence of unused variables"),
+    "strict-balance-equality": ("SWC-132", "Unexpected Ether balance"),
+    "hash-collision": ("SWC-133", "Hash Collisions With Multiple Variable Length Arguments"),
+    # Common findings without an SWC entry
+    "access-control": (None, "Missing Access Control"),
+    "missing-zero-check": (None, "Missing Zero-Address Validation"),
+    "missing-events": (None, "Missing Event Emission"),
+    "locked-ether": (None, "Locked Ether"),
+    "centralization": (None, "Centralization Risk"),
+    "precision-loss": (None, "Precision Loss"),
+    "low-level-calls": (None, "Use of Low-Level Calls"),
+    "gas-optimization": (None, "Gas Optimization"),
+    "naming-convention": (None, "Naming Convention"),
+}
+
+SLITHER_CATEGORIES = {
+    "reentrancy-eth": "reentrancy", "reentrancy-no-eth": "reentrancy", "reentrancy-benign": "reentrancy",
+    "reentrancy-events": "reentrancy", "reentrancy-unlimited-gas": "reentrancy",
+    "unchecked-lowlevel": "unchecked-call", "unchecked-send": "unchecked-call",
+    "unchecked-transfer": "unchecked-call", "unused-return": "unchecked-call",
+    "arbitrary-send-eth": "unprotected-withdrawal", "arbitrary-send-erc20": "unprotected-withdrawal",
+    "arbitrary-send-erc20-permit": "unprotected-withdrawal",
+    "suicidal": "unprotected-selfdestruct",
+    "controlled-delegatecall": "delegatecall", "delegatecall-loop": "delegatecall",
+    "tx-origin": "tx-origin",
+    "timestamp": "timestamp-dependence",
+    "weak-prng": "weak-randomness",
+    "solc-version": "outdated-compiler", "pragma": "floating-pragma",
+    "uninitialized-state": "uninitialized-storage", "uninitialized-storage": "uninitialized-storage",
+    "uninitialized-local": "uninitialized-storage",
+    "shadowing-state": "shadowing", "shadowing-local": "shadowing", "shadowing-abstract": "shadowing",
+    "shadowing-builtin": "shadowing",
+    "calls-loop": "dos-failed-call", "msg-value-loop": "dos-failed-call",
+    "costly-loop": "dos-gas-limit",
+    "deprecated-standards": "deprecated-functions",
+    "controlled-array-length": "arbitrary-storage-write",
+    "rtlo": "rtlo",
+    "unused-state": "unused-variable",
+    "incorrect-equality": "strict-balance-equality",
+    "encode-packed-collision": "hash-collision",
+    "missing-zero-check": "missing-zero-check",
+    "events-access": "missing-events", "events-maths": "missing-events",
+    "locked-ether": "locked-ether",
+    "divide-before-multiply": "precision-loss",
+    "low-level-calls": "low-level-calls",
+    "protected-vars": "access-control", "unprotected-upgrade": "access-control",
+    "constable-states": "gas-optimization", "immutable-states": "gas-optimization",
+    "external-function": "gas-optimization", "cache-array-length": "gas-optimization",
+    "naming-convention": "naming-convention",
+}
+
+# First match wins, so specific patterns come before broad ones
+LLM_CATEGORY_PATTERNS = [
+    (re.compile(p, re.IGNORECASE), category) for p, category in [
+        (r"re-?entran", "reentrancy"),
+        (r"overflow|underflow", "integer-overflow"),
+        (r"selfdestruct|self-destruct|suicid", "unprotected-selfdestruct"),
+        (r"delegatecall", "delegatecall"),
+        (r"tx\.origin", "tx-origin"),
+        (r"signature.*replay|replay", "signature-replay"),
+        (r"malleab", "signature-malleability"),
+        (r"random|prng|entropy", "weak-randomness"),
+        (r"timestamp|block\.number|time manipulation", "timestamp-dependence"),
+        (r"front-?run|transaction order|race condition|sandwich", "front-running"),
+        (r"unchecked.*(call|return|send|transfer)|return value", "unchecked-call"),
+        (r"gas limit|unbounded (loop|array)|denial of service.*loop|dos.*loop", "dos-gas-limit"),
+        (r"denial of service|\bdos\b", "dos-failed-call"),
+        (r"floating pragma|pragma", "floating-pragma"),
+        (r"compiler version|outdated compiler", "outdated-compiler"),
+        (r"uninitiali[sz]ed", "uninitialized-storage"),
+        (r"shadow", "shadowing"),
+        (r"visibility", "default-visibility"),
+        (r"deprecated", "deprecated-functions"),
+        (r"encodepacked|hash collision", "hash-collision"),
+        (r"zero.?address", "missing-zero-check"),
+        (r"event", "missing-events"),
+        (r"locked ether|ether.*locked", "locked-ether"),
+        (r"centrali[sz]|single point of failure|owner privilege", "centralization"),
+        (r"precision|rounding|divide before multiply", "precision-loss"),
+        (r"withdraw|drain", "unprotected-withdrawal"),
+        (r"access control|unauthori[sz]ed|permission|only ?owner|privilege", "access-control"),
+        (r"low.?level call", "low-level-calls"),
+        (r"gas", "gas-optimization"),
+        (r"unused", "unused-variable"),
+        (r"assert", "assert-violation"),
+    ]
+]
+
+# Location suffix of a ``findings_prompt`` line
+PROMPT_LINES_RE = re.compile(r" at lines? (\d+)(?:-(\d+))?$")
+
+SEVERITY_RANK = {"critical": 5, "high": 4, "medium": 3, "low": 2, "informational": 1, "optimization": 0}
+
+
+@dataclass
+class NormalizedFinding:
+    category: str
+    severity: str                        # lowercase key of SEVERITY_RANK
+    title: str
+    lines: Optional[Tuple[int, int]]     # the finding's own lines
+    scope: Optional[Tuple[int, int]]     # lines used for merging: the enclosing function, else ``lines``
+    function: Optional[str] = None
+    description: str = ""
+    impact: str = ""
+    recommendation: str = ""
+    location: str = ""
+    confidence: Optional[str] = None
+    sources: List[str] = field(default_factory=list)
+    detectors: List[str] = field(default_factory=list)
+    merged: int = 1
+
+    def absorb(self, other: "NormalizedFinding"):
+        """Fold a duplicate into this finding; the LLM's wording wins over Slither's."""
+        prefer_other = "llm" in other.sources and "llm" not in self.sources
+        if SEVERITY_RANK[other.severity] > SEVERITY_RANK[self.severity]:
+            self.severity = other.severity
+        for attr in ("title", "description", "impact", "recommendation", "location", "function"):
+            if getattr(other, attr) and (prefer_other or not getattr(self, attr)):
+                setattr(self, attr, getattr(other, attr))
+        self.lines = _union(self.lines, other.lines)
+        self.scope = _union(self.scope, other.scope)
+        self.sources = sorted(set(self.sources) | set(other.sources))
+        self.detectors = sorted(set(self.detectors) | set(other.detectors))
+        self.confidence = self.confidence or other.confidence
+        self.merged += other.merged
+
+
+def _union(a: Optional[Tuple[int, int]], b: Optional[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+    if a is None or b is None:
+        return a or b
+    return min(a[0], b[0]), max(a[1], b[1])
+
+
+class IntervalIndex:
+    """
+    Line intervals sorted by start. An overlap query only scans intervals
+    starting in ``[start - longest, end]``, so merging stays near-linear.
+    """
+
+    def __init__(self):
+        self._items: List[Tuple[int, int, int]] = []     # (start, end, key)
+        self._longest = 0
+
+    def add(self, start: int, end: int, key: int):
+        insort(self._items, (start, end, key))
+        self._longest = max(self._longest, end - start)
+
+    def remove(self, start: int, end: int, key: int):
+        i = bisect_left(self._items, (start, end, key))
+        if i < len(self._items) and self._items[i] == (start, end, key):
+            del self._items[i]
+
+    def overlapping(self, start: int, end: int) -> List[int]:
+        i = bisect_left(self._items, (start - self._longest, -1, -1))
+        found = []
+        while i < len(self._items) and self._items[i][0] <= end:
+            s, e, key = self._items[i]
+            if e >= start:
+                found.append(key)
+            i += 1
+        return found
+
+
+class SourceLocator:
+    """Resolves finding locations to line ranges in one parsed source."""
+
+    def __init__(self, source: str):
+        self.lines = LineIndex(source)
+        parsed = parse_source(source)
+        self._functions: Dict[str, List[Tuple[int, int]]] = {}
+        self._callables: List[Tuple[int, int, str]] = []
+        for block in parsed.contracts:
+            for unit in block.callable_units:
+                self._functions.setdefault(unit.name.lower(), []).append((unit.start_line, unit.end_line))
+                self._callables.append((unit.start_line, unit.end_line, unit.name))
+        self._callables.sort()
+
+    def enclosing(self, lines: Tuple[int, int]) -> Optional[Tuple[int, int, str]]:
+        """Innermost function, modifier or constructor containing ``lines``."""
+        candidates = [c for c in self._callables if c[0] <= lines[0] and lines[1] <= c[1]]
+        return min(candidates, key=lambda c: c[1] - c[0]) if candidates else None
+
+    def function_lines(self, name: str) -> Optional[Tuple[int, int]]:
+        spans = self._functions.get(name.lower())
+        if not spans:
+            return None
+        return min(s for s, _ in spans), max(e for _, e in spans)
+
+    def resolve_text(self, location: str) -> Tuple[Optional[Tuple[int, int]], Optional[str]]:
+        """Line range and function named in a free-text location ("withdraw() line 42", "lines 10-20")."""
+        lines, function = None, None
+        match = LINE_REF_RE.search(location or "")
+        if match:
+            first = int(match.group(2))
+            last = int(match.group(4)) if match.group(4) else first
+            if 1 <= first <= self.lines.line_count:
+                lines = (first, max(first, min(last, self.lines.line_count)))
+        for name in re.findall(r'(\w+)\s*\(', location or "") + re.findall(r'\b\w+\b', location or ""):
+            if self.function_lines(name):
+                function = name
+                break
+        if lines is None and function:
+            lines = self.function_lines(function)
+        return lines, function
+
+
+def _severity(value) -> str:
+    value = str(value or "").strip().lower()
+    return value if value in SEVERITY_RANK else "medium"
+
+
+def _slug(text: str) -> str:
+    return re.sub(r'[^a-z0-9]+', '-', str(text).lower()).strip('-') or "unknown"
+
+
+def llm_category(title: str, description: str = "") -> str:
+    for pattern, category in LLM_CATEGORY_PATTERNS:
+        if pattern.search(title or ""):
+            return category
+    for pattern, category in LLM_CATEGORY_PATTERNS:
+        if pattern.search((description or "")[:200]):
+            return category
+    return "other:" + _slug(title)
+
+
+def slither_lines(issue: Dict, locator: SourceLocator) -> Optional[Tuple[int, int]]:
+    """Lines of a parsed Slither finding: its line ranges if kept, else its first line."""
+    ranges = issue.get("lines")
+    if ranges:
+        flat = [n for r in ranges for n in (r if isinstance(r, (list, tuple)) else (r,))]
+        return min(flat), max(flat)
+    if issue.get("offset") is not None:
+        return locator.lines.lines_of(issue["offset"], issue.get("length", 1))
+    line = issue.get("line")
+    return (line, line) if isinstance(line, int) else None
+
+
+def _scoped(finding: NormalizedFinding, locator: SourceLocator) -> NormalizedFinding:
+    if finding.lines is not None:
+        enclosing = locator.enclosing(finding.lines)
+        if enclosing:
+            finding.scope = (enclosing[0], enclosing[1])
+            finding.function = finding.function or enclosing[2]
+    return finding
+
+
+def from_slither(issue: Dict, locator: SourceLocator) -> NormalizedFinding:
+    check = issue.get("vulnerability") or issue.get("check") or ""
+    lines = slither_lines(issue, locator)
+    category = SLITHER_CATEGORIES.get(check, "other:" + _slug(check))
+    return _scoped(NormalizedFinding(
+        category=category,
+        severity=_severity(issue.get("severity") or issue.get("impact")),
+        title=TAXONOMY.get(category, (None, check))[1],
+        lines=lines,
+        scope=lines,
+        description=str(issue.get("description") or "").strip(),
+        recommendation=str(issue.get("recommendation") or ""),
+        location=f"lines {lines[0]}-{lines[1]}" if lines and lines[0] != lines[1] else (f"line {lines[0]}" if lines else ""),
+        confidence=issue.get("confidence"),
+        sources=["slither"],
+        detectors=[check] if check else [],
+    ), locator)
+
+
+def from_llm(vuln: Dict, locator: SourceLocator) -> NormalizedFinding:
+    title = str(vuln.get("title") or "Security Issue")
+    location = str(vuln.get("location") or "")
+    lines, function = locator.resolve_text(location)
+    return _scoped(NormalizedFinding(
+        category=llm_category(title, str(vuln.get("description") or "")),
+        severity=_severity(vuln.get("severity")),
+        title=title,
+        lines=lines,
+        scope=lines,
+        function=function,
+        description=str(vuln.get("description") or ""),
+        impact=str(vuln.get("impact") or ""),
+        recommendation=str(vuln.get("recommendation") or ""),
+        location=location,
+        sources=["llm"],
+    ), locator)
+
+
+def merge_findings(findings: List[NormalizedFinding], slack: int = FINDINGS_MERGE_SLACK) -> List[NormalizedFinding]:
+    """
+    Merge findings of the same category whose scopes overlap (within
+    ``slack`` lines). Findings without a location only merge with other
+    unlocated findings of the same category and title, or into a
+    category that is contract-wide by nature (pragma, compiler version).
+    """
+    merged: List[NormalizedFinding] = []
+    indexes: Dict[str, IntervalIndex] = {}
+    unlocated: Dict[Tuple[str, str], int] = {}
+    contract_wide: Dict[str, int] = {}
+    for finding in sorted(findings, key=lambda f: -SEVERITY_RANK[f.severity]):
+        if finding.category in ("floating-pragma", "outdated-compiler"):
+            target = contract_wide.get(finding.category)
+            if target is None:
+                contract_wide[finding.category] = len(merged)
+                merged.append(finding)
+            else:
+                merged[target].absorb(finding)
+            continue
+        if finding.scope is None:
+            key = (finding.category, _slug(finding.title))
+            if key in unlocated:
+                merged[unlocated[key]].absorb(finding)
+            else:
+                unlocated[key] = len(merged)
+                merged.append(finding)
+            continue
+        index = indexes.setdefault(finding.category, IntervalIndex())
+        start, end = finding.scope
+        hits = index.overlapping(start - slack, end + slack)
+        if not hits:
+            index.add(start, end, len(merged))
+            merged.append(finding)
+            continue
+        target = merged[hits[0]]
+        index.remove(target.scope[0], target.scope[1], hits[0])
+        target.absorb(finding)
+        index.add(target.scope[0], target.scope[1], hits[0])
+    return merged
+
+
+def _as_vulnerability(finding: NormalizedFinding, number: int) -> Dict:
+    swc, _ = TAXONOMY.get(finding.category, (None, ""))
+    return {
+        "id": f"F{number}",
+        "title": finding.title,
+        "severity": finding.severity.capitalize(),
+        "category": finding.category,
+        "swc": swc,
+        "location": finding.location or (f"{finding.function}()" if finding.function else ""),
+        "lines": list(finding.lines) if finding.lines else None,
+        "function": finding.function,
+        "description": finding.description,
+        "impact": finding.impact,
+        "recommendation": finding.recommendation,
+        "sources": finding.sources,
+        "detectors": finding.detectors,
+        "confidence": "High" if len(finding.sources) > 1 else finding.confidence,
+        "merged": finding.merged,
+    }
+
+
+def normalize_findings(source: str, slither_results, llm_vulnerabilities: Optional[Dict],
+                       contract_name: str = "") -> Dict:
+    """
+    One de-duplicated finding set from Slither's parsed findings (a list, or
+    an error dict, which is ignored) and the LLM analysis, in the
+    ``find_vulnerabilities`` schema plus per-source counts.
+    """
+    locator = SourceLocator(source)
+    raw: List[NormalizedFinding] = []
+    slither_count = llm_count = 0
+    for issue in slither_results if isinstance(slither_results, list) else []:
+        raw.append(from_slither(issue, locator))
+        slither_count += 1
+    llm = llm_vulnerabilities or {}
+    for vuln in llm.get("vulnerabilities") or []:
+        if isinstance(vuln, dict):
+            raw.append(from_llm(vuln, locator))
+            llm_count += 1
+
+    merged = merge_findings(raw)
+    merged.sort(key=lambda f: (-SEVERITY_RANK[f.severity], f.lines[0] if f.lines else 0))
+    vulnerabilities = [_as_vulnerability(f, i) for i, f in enumerate(merged, 1)]
+    breakdown = {level: 0 for level in ("critical", "high", "medium", "low", "informational")}
+    for f in merged:
+        breakdown[f.severity if f.severity in breakdown else "informational"] += 1
+    return {
+        "contract_name": contract_name or llm.get("contract_name", ""),
+        "total_vulnerabilities": len(vulnerabilities),
+        "severity_breakdown": breakdown,
+        "vulnerabilities": vulnerabilities,
+        "overall_risk_score": llm.get("overall_risk_score", 0),
+        "summary": llm.get("summary", ""),
+        "source_counts": {
+            "slither": slither_count,
+            "llm": llm_count,
+            "merged": len(raw) - len(merged),
+            "found_by_both": sum(1 for f in merged if len(f.sources) > 1),
+        },
+    }
+
+
+def findings_prompt(findings: Optional[Dict], limit: int = 30) -> str:
+    """Compact one-line-per-issue list of normalized findings for the fix prompt."""
+    lines = []
+    for vuln in (findings or {}).get("vulnerabilities", [])[:limit]:
+        if vuln["severity"].lower() in ("informational", "optimization"):
+            continue
+        tag = f"{vuln['swc']} " if vuln.get("swc") else ""
+        where = ""
+        if vuln.get("lines"):
+            first, last = vuln["lines"]
+            where = f" at line {first}" if first == last else f" at lines {first}-{last}"
+        lines.append(f"- [{tag}{vuln['severity']}] {vuln['title']}{where}")
+    return "\n".join(lines)
+
+
+def issues_within(known_issues: str, spans: List[Tuple[int, int]], line_map: Optional[List[int]] = None) -> str:
+    """
+    The lines of a ``findings_prompt`` list located within ``spans``
+    (``(first, last)`` original lines), plus the ones without a location.
+    With a chunk's ``line_map`` the locations are renumbered to chunk lines.
+    """
+    local = {original: n for n, original in enumerate(line_map or [], 1)}     # the last chunk line wins
+    kept = []
+    for line in (known_issues or "").splitlines():
+        match = PROMPT_LINES_RE.search(line)
+        if match is None:
+            kept.append(line)
+            continue
+        first = int(match.group(1))
+        last = int(match.group(2) or first)
+        if not any(first <= end and start <= last for start, end in spans):
+            continue
+        if line_map is not None:
+            first, last = local.get(first), local.get(last)
+            if first is None or last is None:
+                line = line[:match.start()]
+            else:
+                line = line[:match.start()] + (f" at line {first}" if first == last else f" at lines {first}-{last}")
+        kept.append(line)
+    return "\n".join(kept)
@@ -0,0 +1,443 @@
+"""
+Async OpenRouter client with hedged requests and overload protection.
+
+A request first goes to the primary model. If no valid answer has arrived
+once the hedge delay elapses, the identical request is sent to the next
+configured model (or provider); the first response that passes the
+caller's validator wins and every other in-flight attempt is cancelled.
+The hedge delay follows the observed latency of the primary model.
+
+Every attempt passes through the adaptive concurrency limiter and the
+target's circuit breaker (see ``app/llm_resilience.py``), both shared by
+all worker processes through ``app.shared_state`` when ``app.serve``
+runs several; 429 and 5xx
+responses are retried a bounded number of times, honoring Retry-After.
+
+Prompt and completion tokens are recorded for every answered call, per
+target and, through ``track_token_usage``, per audit.
+"""
+import asyncio
+import contextvars
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from app.config import (
+    OPENROUTER_API_KEY,
+    OPENROUTER_URL,
+    LLM_DEFAULT_MODEL,
+    LLM_HEDGE_MODELS,
+    LLM_HEDGE_QUANTILE,
+    LLM_HEDGE_MIN_DELAY,
+    LLM_HEDGE_MAX_DELAY,
+    LLM_HEDGE_DEFAULT_DELAY,
+    LLM_REQUEST_TIMEOUT,
+    LLM_CONCURRENCY_INITIAL,
+    LLM_CONCURRENCY_MIN,
+    LLM_CONCURRENCY_MAX,
+    LLM_LATENCY_TARGET,
+    LLM_MAX_RETRIES,
+    LLM_MAX_RETRY_AFTER,
+    LLM_BREAKER_FAILURE_THRESHOLD,
+    LLM_BREAKER_RESET_TIMEOUT,
+    LLM_USAGE_LOG_SIZE,
+)
+from app.contract_chunker import estimate_tokens
+from app.llm_resilience import AdaptiveConcurrencyLimiter, CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = "You are a helpful smart contract auditor."
+
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+OVERLOAD_STATUS = {429, 503}
+
+
+class LLMRequestError(Exception):
+    """Raised when every attempt for a completion failed."""
+
+
+class LLMUnavailableError(LLMRequestError):
+    """Raised when the provider is unhealthy: circuit open or retries exhausted."""
+
+
+class ModelLatencyTracker:
+    """Sliding window of successful response times per model."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self.requests: Dict[str, int] = {}
+        self.failures: Dict[str, int] = {}
+
+    def record(self, model: str, seconds: float):
+        self._samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def record_attempt(self, model: str, failed: bool = False):
+        self.requests[model] = self.requests.get(model, 0) + 1
+        if failed:
+            self.failures[model] = self.failures.get(model, 0) + 1
+
+    def sample_count(self, model: str) -> int:
+        return len(self._samples.get(model, ()))
+
+    def quantile(self, model: str, q: float) -> Optional[float]:
+        samples = self._samples.get(model)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+        return ordered[index]
+
+    def snapshot(self) -> Dict[str, Dict]:
+        models = set(self._samples) | set(self.requests)
+        return {
+            model: {
+                "requests": self.requests.get(model, 0),
+                "failures": self.failures.get(model, 0),
+                "samples": self.sample_count(model),
+                "p50_s": self.quantile(model, 0.5),
+                "p95_s": self.quantile(model, 0.95),
+                "p99_s": self.quantile(model, 0.99),
+            }
+            for model in sorted(models)
+        }
+
+
+@dataclass
+class HedgingPolicy:
+    """When, and to which targets, an in-flight request is duplicated."""
+    hedge_models: List[str] = field(default_factory=list)
+    quantile: float = 0.9
+    min_delay: float = 2.0
+    max_delay: float = 30.0
+    default_delay: float = 10.0
+    min_samples: int = 20
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.hedge_models)
+
+    def hedge_delay(self, model: str, tracker: ModelLatencyTracker) -> float:
+        """Seconds to wait on ``model`` before hedging, from its latency quantile."""
+        if tracker.sample_count(model) < self.min_samples:
+            return self.default_delay
+        observed = tracker.quantile(model, self.quantile)
+        return min(self.max_delay, max(self.min_delay, observed))
+
+
+latency_tracker = ModelLatencyTracker()
+hedging_policy = HedgingPolicy(
+    hedge_models=LLM_HEDGE_MODELS,
+    quantile=LLM_HEDGE_QUANTILE,
+    min_delay=LLM_HEDGE_MIN_DELAY,
+    max_delay=LLM_HEDGE_MAX_DELAY,
+    default_delay=LLM_HEDGE_DEFAULT_DELAY,
+)
+hedge_stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "invalid_responses": 0}
+
+concurrency_limiter = AdaptiveConcurrencyLimiter(
+    initial=LLM_CONCURRENCY_INITIAL,
+    min_limit=LLM_CONCURRENCY_MIN,
+    max_limit=LLM_CONCURRENCY_MAX,
+    latency_target=LLM_LATENCY_TARGET,
+    shared_name="openrouter_concurrency",    # one ceiling for the API key, not one per worker
+    slot_ttl=LLM_REQUEST_TIMEOUT + 30,
+)
+circuit_breakers: Dict[str, CircuitBreaker] = {}
+retry_stats = {"retries": 0, "retry_after_honored": 0, "gave_up": 0}
+
+
+token_usage: Dict[str, Dict[str, int]] = {}
+recent_calls: Deque[Dict] = deque(maxlen=LLM_USAGE_LOG_SIZE)
+_usage_scopes: contextvars.ContextVar[Tuple[Dict, ...]] = contextvars.ContextVar("llm_usage_scopes", default=())
+
+
+@contextmanager
+def track_token_usage() -> Iterator[Dict]:
+    """
+    Collect token usage of every LLM call made inside the block, including
+    calls from tasks it spawns (they inherit the context). Scopes nest.
+    """
+    usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    token = _usage_scopes.set(_usage_scopes.get() + (usage,))
+    try:
+        yield usage
+    finally:
+        _usage_scopes.reset(token)
+
+
+def record_usage(target: str, messages: List[Dict], content: str, usage: Optional[Dict], latency: float):
+    """Account one answered call; providers that omit ``usage`` are estimated."""
+    estimated = not (isinstance(usage, dict) and isinstance(usage.get("prompt_tokens"), int))
+    if estimated:
+        usage = {
+            "prompt_tokens": sum(estimate_tokens(m["content"]) for m in messages),
+            "completion_tokens": estimate_tokens(content),
+        }
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+
+    totals = token_usage.setdefault(target, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "estimated_calls": 0})
+    totals["calls"] += 1
+    totals["prompt_tokens"] += prompt_tokens
+    totals["completion_tokens"] += completion_tokens
+    totals["estimated_calls"] += int(estimated)
+    for scope in _usage_scopes.get():
+        scope["calls"] += 1
+        scope["prompt_tokens"] += prompt_tokens
+        scope["completion_tokens"] += completion_tokens
+    recent_calls.append({
+        "at": datetime.now(timezone.utc).isoformat(),
+        "target": target,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "estimated": estimated,
+        "latency_s": round(latency, 3),
+    })
+
+
+def get_breaker(target: str) -> CircuitBreaker:
+    breaker = circuit_breakers.get(target)
+    if breaker is None:
+        breaker = circuit_breakers[target] = CircuitBreaker(
+            failure_threshold=LLM_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=LLM_BREAKER_RESET_TIMEOUT,
+            shared_name=f"openrouter_breaker:{target}",
+            probe_timeout=LLM_REQUEST_TIMEOUT,
+        )
+    return breaker
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Process-wide pooled client, recreated if the event loop changed (e.g. scripts)."""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=LLM_REQUEST_TIMEOUT,
+            headers={
+                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+                "Content-Type": "application/json"
+            },
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+        _client_loop = loop
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+
+def parse_target(target: str) -> Tuple[str, Optional[str]]:
+    """``"model@provider"`` pins an OpenRouter provider; a bare model lets OpenRouter route."""
+    model, _, provider = target.partition("@")
+    return model, provider or None
+
+
+def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt: int) -> float:
+    return min(LLM_MAX_RETRY_AFTER, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+async def _request_completion(target: str, messages: List[Dict], max_tokens: int, temperature: float) -> str:
+    model, provider = parse_target(target)
+    data = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens
+    }
+    if provider:
+        data["provider"] = {"order": [provider], "allow_fallbacks": False}
+
+    breaker = get_breaker(target)
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            await breaker.before_request()
+        except CircuitOpenError as e:
+            raise LLMUnavailableError(f"{target}: {e}") from e
+
+        slot = await concurrency_limiter.acquire()
+        started = time.monotonic()
+        try:
+            response = await get_client().post(OPENROUTER_URL, json=data)
+        except asyncio.CancelledError:
+            await concurrency_limiter.release(slot)
+            await breaker.record_cancelled()
+            raise
+        except httpx.TransportError as e:
+            await concurrency_limiter.release(slot, overloaded=isinstance(e, httpx.TimeoutException))
+            await breaker.record_failure()
+            latency_tracker.record_attempt(target, failed=True)
+            error, delay = f"{type(e).__name__}: {e}", _backoff(attempt)
+        else:
+            latency = time.monotonic() - started
+            if response.status_code in RETRYABLE_STATUS:
+                await concurrency_limiter.release(slot, overloaded=response.status_code in OVERLOAD_STATUS)
+                await breaker.record_failure()
+                latency_tracker.record_attempt(target, failed=True)
+                retry_after = _retry_after_seconds(response)
+                if retry_after is not None:
+                    retry_stats["retry_after_honored"] += 1
+                error = f"HTTP {response.status_code} from OpenRouter"
+                delay = retry_after if retry_after is not None else _backoff(attempt)
+            else:
+                await concurrency_limiter.release(slot, latency=latency)
+                # Any other answer means the provider is up, even if the request was bad
+                await breaker.record_success()
+                try:
+                    response.raise_for_status()
+                    body = response.json()
+                    content = body["choices"][0]["message"]["content"].strip()
+                except Exception:
+                    latency_tracker.record_attempt(target, failed=True)
+                    raise
+                record_usage(target, messages, content, body.get("usage"), latency)
+                latency_tracker.record_attempt(target)
+                latency_tracker.record(target, latency)
+                return content
+
+        if attempt == LLM_MAX_RETRIES or delay > LLM_MAX_RETRY_AFTER:
+            break
+        retry_stats["retries"] += 1
+        logger.warning(f"OpenRouter request to {target} failed ({error}), retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+    retry_stats["gave_up"] += 1
+    raise LLMUnavailableError(f"{target}: {error}")
+
+
+async def chat_completion(prompt: str, model: Optional[str] = None,
+                          validator: Optional[Callable[[str], bool]] = None,
+                          max_tokens: int = 2048, temperature: float = 0.7,
+                          policy: Optional[HedgingPolicy] = None) -> str:
+    """
+    Return the first valid completion for ``prompt``, hedging across models.
+
+    ``validator`` decides whether a response is usable (e.g. parses against the
+    expected schema). If no attempt produces a valid answer, the last invalid
+    one is returned so callers keep their own fallback handling; if every
+    attempt errored, ``LLMRequestError`` is raised.
+    """
+    if not OPENROUTER_API_KEY:
+        raise LLMUnavailableError("OPENROUTER_API_KEY is not configured")
+    policy = policy or hedging_policy
+    primary = model or LLM_DEFAULT_MODEL
+    candidates = [primary] + ([m for m in policy.hedge_models if m != primary] if policy.enabled else [])
+    # Fail fast instead of queueing behind providers known to be down
+    targets = [target for target in candidates if not get_breaker(target).is_open]
+    if not targets:
+        raise LLMUnavailableError(f"All LLM targets are unavailable: {', '.join(candidates)}")
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+    hedge_stats["requests"] += 1
+
+    attempts: Dict[asyncio.Task, str] = {}
+    errors: List[Exception] = []
+    last_invalid: Optional[str] = None
+
+    def launch_next():
+        target = targets[len(attempts)]
+        logger.info(f"Sending request to OpenRouter API ({target})...")
+        task = asyncio.create_task(_request_completion(target, messages, max_tokens, temperature))
+        attempts[task] = target
+        if len(attempts) > 1:
+            hedge_stats["hedged"] += 1
+
+    launch_next()
+    try:
+        while True:
+            pending = [task for task in attempts if not task.done()]
+            can_hedge = len(attempts) < len(targets)
+            if not pending:
+                if not can_hedge:
+                    break
+                launch_next()
+                continue
+
+            delay = policy.hedge_delay(primary, latency_tracker) if can_hedge else None
+            done, _ = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                logger.info(f"No response from {attempts[pending[0]]} after {delay:.1f}s, hedging")
+                launch_next()
+                continue
+
+            for task in done:
+                target = attempts[task]
+                if task.exception() is not None:
+                    logger.error(f"OpenRouter query to {target} failed: {task.exception()}")
+                    errors.append(task.exception())
+                    continue
+                content = task.result()
+                if validator is None or validator(content):
+                    if target != primary:
+                        hedge_stats["hedge_wins"] += 1
+                    return content
+                logger.warning(f"Response from {target} failed validation")
+                hedge_stats["invalid_responses"] += 1
+                last_invalid = content
+    finally:
+        for task in attempts:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()  # mark as retrieved
+
+    if last_invalid is not None:
+        return last_invalid
+    message = "; ".join(str(e) for e in errors) or "No completion attempts succeeded"
+    if errors and all(isinstance(e, LLMUnavailableError) for e in errors):
+        raise LLMUnavailableError(message)
+    raise LLMRequestError(message)
+
+
+def get_llm_metrics() -> Dict:
+    return {
+        "hedging": {
+            "enabled": hedging_policy.enabled,
+            "primary_model": LLM_DEFAULT_MODEL,
+            "hedge_models": hedging_policy.hedge_models,
+            "current_delay_s": hedging_policy.hedge_delay(LLM_DEFAULT_MODEL, latency_tracker),
+            **hedge_stats
+        },
+        "models": latency_tracker.snapshot(),
+        "concurrency": concurrency_limiter.snapshot(),
+        "circuit_breakers": {target: breaker.snapshot() for target, breaker in circuit_breakers.items()},
+        "retries": dict(retry_stats),
+        "token_usage": {
+            "by_target": {target: dict(totals) for target, totals in token_usage.items()},
+            "recent_calls": list(recent_calls)
+        }
+    }
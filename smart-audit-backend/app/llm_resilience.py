@@ -0,0 +1,247 @@
+"""
+Overload protection for the OpenRouter integration.
+
+``AdaptiveConcurrencyLimiter`` caps in-flight LLM requests with an AIMD
+rule: the limit grows by roughly one per round of successful, fast
+responses and is cut multiplicatively on 429s, 503s or slow responses.
+``CircuitBreaker`` stops sending requests to a target after repeated
+provider failures and lets a single probe through once the reset timeout
+has passed.
+
+Both take a ``shared_name``: when ``app.serve`` runs several workers, the
+slots, the limit and the breaker state then live in ``app.shared_state``,
+so the ceiling and the breaker hold for all worker processes together
+instead of once per worker. A single process keeps them in memory.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from app import shared_state
+
+
+class CircuitOpenError(Exception):
+    """Raised when a request is rejected because the provider is marked unhealthy."""
+
+
+class AdaptiveConcurrencyLimiter:
+    """Additive-increase / multiplicative-decrease concurrency limit."""
+
+    def __init__(self, initial: int = 8, min_limit: int = 1, max_limit: int = 64,
+                 decrease_factor: float = 0.5, latency_target: float = 30.0,
+                 decrease_cooldown: float = 1.0, shared_name: Optional[str] = None,
+                 slot_ttl: float = 300.0):
+        self.initial = initial
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_target = latency_target
+        self.decrease_cooldown = decrease_cooldown
+        self.shared_name = shared_name
+        self.in_flight = 0
+        self.stats = {"acquired": 0, "queued": 0, "increases": 0, "decreases": 0}
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        # slot_ttl only reclaims slots of a hung worker; slots of exited workers are reclaimed at once
+        self._slots = (shared_state.SharedSemaphore(shared_name, self._shared_limit, ttl=slot_ttl)
+                       if shared_name else None)
+
+    async def acquire(self) -> Optional[str]:
+        """Wait for a slot; returns the token to pass to ``release``."""
+        self.stats["acquired"] += 1
+        if self._shared:
+            queued = self._slots.stats["queued"]
+            slot = await self._slots.acquire()
+            self.stats["queued"] += self._slots.stats["queued"] - queued
+            self.in_flight += 1
+            return slot
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return None
+        self.stats["queued"] += 1
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we were cancelled
+                self._release_slot()
+            else:
+                self._waiters.remove(waiter)
+            raise
+        return None
+
+    async def release(self, slot: Optional[str] = None, latency: Optional[float] = None, overloaded: bool = False):
+        """Return a slot and adapt the limit to the request's outcome."""
+        if not self._shared:
+            self.limit, self._last_decrease = self._adapt(self.limit, self._last_decrease, time.monotonic(),
+                                                          latency, overloaded)
+            self._release_slot()
+            return
+        self.in_flight -= 1
+        await self._slots.release(slot)
+        if overloaded or latency is not None:
+            value = await asyncio.to_thread(shared_state.update_value, self.shared_name,
+                                            lambda current: self._shared_step(current, latency, overloaded))
+            self.limit = value["limit"]
+
+    @property
+    def _shared(self) -> bool:
+        return self._slots is not None and shared_state.multi_process()
+
+    def _adapt(self, limit: float, last_decrease: float, now: float,
+               latency: Optional[float], overloaded: bool) -> Tuple[float, float]:
+        if overloaded or (latency is not None and latency > self.latency_target):
+            # Requests that were in flight together count as one congestion event
+            if now - last_decrease >= self.decrease_cooldown:
+                self.stats["decreases"] += 1
+                return max(self.min_limit, limit * self.decrease_factor), now
+        elif latency is not None:
+            self.stats["increases"] += 1
+            return min(self.max_limit, limit + 1.0 / max(limit, 1.0)), last_decrease
+        return limit, last_decrease
+
+    def _shared_step(self, current: Optional[Dict], latency: Optional[float], overloaded: bool) -> Dict:
+        current = current or {"limit": float(self.initial), "last_decrease": 0.0}
+        limit, last_decrease = self._adapt(current["limit"], current["last_decrease"], time.time(),
+                                           latency, overloaded)
+        return {"limit": limit, "last_decrease": last_decrease}
+
+    def _shared_limit(self) -> int:
+        """Current shared limit; runs in a worker thread before each slot attempt."""
+        value = shared_state.read_value(self.shared_name)
+        self.limit = value["limit"] if value else float(self.initial)
+        return int(self.limit)
+
+    def _release_slot(self):
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def snapshot(self) -> Dict:
+        snapshot = {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued_now": len(self._waiters),
+            **self.stats
+        }
+        if self._shared:
+            # in_flight and the counters are this worker's; the limit is shared
+            del snapshot["queued_now"]
+            snapshot["shared"] = self.shared_name
+        return snapshot
+
+
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` consecutive failures -> half-open probe."""
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+    _STATE_FIELDS = ("state", "consecutive_failures", "opened_at", "probe_in_flight", "probe_started")
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 shared_name: Optional[str] = None, probe_timeout: float = 120.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.shared_name = shared_name
+        # A probe whose worker died never reports back; after this long another one is let through
+        self.probe_timeout = probe_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+        self.probe_started: Optional[float] = None
+        self.stats = {"successes": 0, "failures": 0, "rejected": 0, "times_opened": 0}
+
+    @property
+    def _shared(self) -> bool:
+        return bool(self.shared_name) and shared_state.multi_process()
+
+    def _clock(self) -> float:
+        # Shared state is compared across processes, so it needs wall-clock time
+        return time.time() if self._shared else time.monotonic()
+
+    async def _apply(self, transition):
+        """Run ``transition`` on this breaker's state, atomically against the shared copy if there is one."""
+        if not self._shared:
+            transition()
+            return
+
+        def step(current: Optional[Dict]) -> Dict:
+            if current:
+                for name in self._STATE_FIELDS:
+                    setattr(self, name, current[name])
+            transition()
+            return {name: getattr(self, name) for name in self._STATE_FIELDS}
+
+        await asyncio.to_thread(shared_state.update_value, self.shared_name, step)
+
+    async def before_request(self):
+        """Raise ``CircuitOpenError`` unless a request may be sent now."""
+        await self._apply(self._before_request)
+
+    def _before_request(self):
+        now = self._clock()
+        if self.state == self.OPEN and now - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self.probe_in_flight = False
+        if self.state == self.HALF_OPEN and self.probe_in_flight and now - self.probe_started >= self.probe_timeout:
+            self.probe_in_flight = False
+        if self.state == self.OPEN or (self.state == self.HALF_OPEN and self.probe_in_flight):
+            self.stats["rejected"] += 1
+            raise CircuitOpenError("LLM provider circuit is open")
+        if self.state == self.HALF_OPEN:
+            self.probe_in_flight = True
+            self.probe_started = now
+
+    @property
+    def is_open(self) -> bool:
+        """As last seen by this worker; ``before_request`` checks the shared state."""
+        return self.state == self.OPEN and self._clock() - self.opened_at < self.reset_timeout
+
+    async def record_success(self):
+        self.stats["successes"] += 1
+        await self._apply(self._record_success)
+
+    def _record_success(self):
+        self.consecutive_failures = 0
+        self.state = self.CLOSED
+        self.probe_in_flight = False
+
+    async def record_failure(self):
+        self.stats["failures"] += 1
+        await self._apply(self._record_failure)
+
+    def _record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.stats["times_opened"] += 1
+            self.state = self.OPEN
+            self.opened_at = self._clock()
+            self.probe_in_flight = False
+
+    async def record_cancelled(self):
+        """A probe that was cancelled (e.g. lost a hedge) proves nothing either way."""
+        if self.state != self.HALF_OPEN:
+            return
+        await self._apply(self._record_cancelled)
+
+    def _record_cancelled(self):
+        if self.state == self.HALF_OPEN:
+            self.probe_in_flight = False
+
+    def snapshot(self) -> Dict:
+        return {
+            "state": self.HALF_OPEN if self.state == self.OPEN and not self.is_open else self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "seconds_until_probe": (
+                round(max(0.0, self.reset_timeout - (self._clock() - self.opened_at)), 1)
+                if self.state == self.OPEN else 0.0
+            ),
+            **self.stats
+        }
@@ -1,10 +1,38 @@
 import os
 import json
+import asyncio
 import logging
 import re
-import requests
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 from dotenv import load_dotenv
 
+from app.config import (
+    OPENROUTER_API_KEY,
+    LLM_DEFAULT_MODEL,
+    LLM_MAX_OUTPUT_TOKENS,
+    LLM_ANALYSIS_CHUNK_TOKENS,
+    LLM_FIX_CHUNK_TOKENS,
+    LLM_CHUNK_CONCURRENCY,
+    LLM_COMPACT_PROMPTS,
+    LLM_REPLACE_KNOWN_LIBRARIES,
+    FINDING_CACHE_ENABLED,
+)
+from app.llm_client import LLMUnavailableError, chat_completion, track_token_usage
+from app.prompt_compactor import CompactedSource, compact_source
+from app.contract_chunker import (
+    ContractChunk,
+    build_chunk,
+    estimate_tokens,
+    pack_units,
+    parse_source,
+    remap_line_references,
+    split_source,
+    stitch_callables,
+)
+from app.finding_cache import attribute_finding, finding_cache, fingerprint_source
+from app.findings import issues_within
+
 # Load environment variables from .env
 load_dotenv()
 
@@ -12,41 +40,29 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# OpenRouter API key from environment variable
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+# OpenRouter API key from environment variable; without it the service still starts and
+# LLM analysis degrades (llm_client raises LLMUnavailableError per request)
 if not OPENROUTER_API_KEY:
-    raise ValueError("OPENROUTER_API_KEY not found in .env file")
-
-# OpenRouter endpoint and headers
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
-HEADERS = {
-    "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-    "Content-Type": "application/json"
-}
+    logger.warning("OPENROUTER_API_KEY not found in .env file; LLM analysis is unavailable")
 
 # Default model name
-DEFAULT_MODEL = "openai/gpt-4o-mini"
+DEFAULT_MODEL = LLM_DEFAULT_MODEL
+
+SEVERITY_RANK = {"critical": 4, "high": 3, "medium": 2, "low": 1}
+# Lower bound for the risk score implied by a reused finding of each severity
+SEVERITY_RISK_FLOOR = {4: 9, 3: 7, 2: 5, 1: 3}
 
 
-def query_openrouter(prompt: str, model: str = DEFAULT_MODEL) -> str:
+async def query_openrouter(prompt: str, model: str = DEFAULT_MODEL,
+                           validator: Optional[Callable[[str], bool]] = None,
+                           max_tokens: int = LLM_MAX_OUTPUT_TOKENS) -> str:
     """
     Query the OpenRouter API with the given prompt and return the generated text.
+    Slow requests are hedged to the configured fallback models; ``validator``
+    decides which response is acceptable.
     """
     try:
-        data = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": "You are a helpful smart contract auditor."},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 2048
-        }
-        logger.info("Sending request to OpenRouter API...")
-        response = requests.post(OPENROUTER_URL, headers=HEADERS, json=data)
-        response.raise_for_status()
-        result = response.json()
-        return result["choices"][0]["message"]["content"].strip()
+        return await chat_completion(prompt, model=model, validator=validator, max_tokens=max_tokens)
     except Exception as e:
         logger.error(f"OpenRouter query failed: {e}")
         raise
@@ -57,14 +73,40 @@ def extract_contract_name(solidity_code: str) -> str:
     return contract_name_match.group(1) if contract_name_match else "Contract"
 
 
-def find_vulnerabilities(solidity_code: str) -> dict:
-    """
-    Analyze the smart contract and identify potential vulnerabilities.
-    Returns a structured dictionary with vulnerability details.
-    """
-    contract_name = extract_contract_name(solidity_code)
-    
-    prompt = f"""Analyze the following Solidity smart contract and identify ALL potential security vulnerabilities. 
+def prepare_prompt_source(solidity_code: str) -> CompactedSource:
+    """Source as it is sent to the LLM for analysis (compacted unless disabled)."""
+    if LLM_COMPACT_PROMPTS:
+        return compact_source(solidity_code, replace_libraries=LLM_REPLACE_KNOWN_LIBRARIES)
+    tokens = estimate_tokens(solidity_code)
+    return CompactedSource(
+        text=solidity_code, line_map=list(range(1, solidity_code.count("\n") + 2)),
+        original_tokens=tokens, compacted_tokens=tokens
+    )
+
+
+def remap_vulnerability_locations(vulnerability_data: dict, line_map: List[int]):
+    """Point line references in findings back at the original source."""
+    for vulnerability in vulnerability_data.get("vulnerabilities", []):
+        if isinstance(vulnerability, dict):
+            vulnerability["location"] = remap_line_references(vulnerability.get("location", ""), line_map)
+
+
+def parse_vulnerability_json(response: str) -> Optional[dict]:
+    """Extract the vulnerability JSON object from an LLM response, or None."""
+    try:
+        # Extract JSON if wrapped in code blocks
+        json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', response, re.DOTALL)
+        data = json.loads(json_match.group(1) if json_match else response)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("vulnerabilities"), list):
+        return None
+    return data
+
+
+async def _analyze_vulnerabilities(solidity_code: str, contract_name: str, scope_note: str = "") -> dict:
+    """Run one vulnerability-analysis prompt and parse the JSON answer."""
+    prompt = f"""Analyze the following Solidity smart contract and identify ALL potential security vulnerabilities. {scope_note}
 
 Please structure your response as a JSON object with the following format:
 {{
@@ -109,51 +151,341 @@ Contract code:
 
 Please return ONLY the JSON object, no additional text."""
 
-    try:
-        vulnerability_response = query_openrouter(prompt)
-        
-        # Try to parse JSON response
+    vulnerability_response = await query_openrouter(
+        prompt, validator=lambda response: parse_vulnerability_json(response) is not None
+    )
+
+    # Try to parse JSON response
+    vulnerability_data = parse_vulnerability_json(vulnerability_response)
+    if vulnerability_data is not None:
+        return vulnerability_data
+
+    logger.warning("Failed to parse JSON response, returning raw text")
+    # Fallback: return structured data with raw response
+    return {
+        "contract_name": contract_name,
+        "total_vulnerabilities": "Unknown",
+        "severity_breakdown": {"critical": 0, "high": 0, "medium": 0, "low": 0},
+        "vulnerabilities": [],
+        "overall_risk_score": "Unknown",
+        "summary": vulnerability_response,
+        "raw_response": vulnerability_response
+    }
+
+
+def _severity_rank(vulnerability: dict) -> int:
+    return SEVERITY_RANK.get(str(vulnerability.get("severity", "")).strip().lower(), 0)
+
+
+def _finding_key(vulnerability: dict) -> tuple:
+    """Findings with the same title in the same function are duplicates."""
+    title = re.sub(r'[^a-z0-9]', '', str(vulnerability.get("title", "")).lower())
+    location = str(vulnerability.get("location", ""))
+    function_match = re.search(r'(\w+)\s*\(', location)
+    place = function_match.group(1).lower() if function_match else re.sub(r'[^a-z0-9]', '', location.lower())
+    return title, place
+
+
+def merge_vulnerability_reports(contract_name: str, reports: List[dict]) -> dict:
+    """
+    Merge per-chunk analyses into one report in the ``find_vulnerabilities``
+    schema, dropping duplicate findings (the most severe copy is kept).
+    """
+    merged: Dict[tuple, dict] = {}
+    for report in reports:
+        for vulnerability in report.get("vulnerabilities", []):
+            key = _finding_key(vulnerability)
+            if key not in merged or _severity_rank(vulnerability) > _severity_rank(merged[key]):
+                merged[key] = vulnerability
+
+    vulnerabilities = sorted(merged.values(), key=_severity_rank, reverse=True)
+    severity_breakdown = {
+        level: sum(1 for v in vulnerabilities if _severity_rank(v) == rank)
+        for level, rank in SEVERITY_RANK.items()
+    }
+    scores = [r.get("overall_risk_score") for r in reports if isinstance(r.get("overall_risk_score"), (int, float))]
+    summaries = []
+    for report in reports:
+        summary = str(report.get("summary", "")).strip()
+        if summary and summary not in summaries:
+            summaries.append(summary)
+
+    return {
+        "contract_name": contract_name,
+        "total_vulnerabilities": len(vulnerabilities),
+        "severity_breakdown": severity_breakdown,
+        "vulnerabilities": vulnerabilities,
+        "overall_risk_score": max(scores, default=0),
+        "summary": " ".join(summaries)
+    }
+
+
+async def _find_vulnerabilities_chunked(solidity_code: str, contract_name: str) -> dict:
+    """Analyze a large source chunk by chunk, concurrently, and merge the findings."""
+    chunks = split_source(solidity_code, LLM_ANALYSIS_CHUNK_TOKENS)
+    semaphore = asyncio.Semaphore(LLM_CHUNK_CONCURRENCY)
+    logger.info(f"Analyzing {contract_name} in {len(chunks)} chunks")
+
+    async def analyze(index: int, chunk: ContractChunk) -> dict:
+        scope_note = (
+            f"This is part {index} of {len(chunks)} of a larger file. Only the functions of "
+            f"contract {chunk.contract} shown below are in scope; the other declarations are "
+            f"included for context."
+        )
+        async with semaphore:
+            result = await _analyze_vulnerabilities(chunk.text, contract_name, scope_note)
+        remap_vulnerability_locations(result, chunk.line_map)
+        return result
+
+    results = await asyncio.gather(
+        *(analyze(i, chunk) for i, chunk in enumerate(chunks, 1)), return_exceptions=True
+    )
+    usable = [r for r in results if isinstance(r, dict) and "raw_response" not in r]
+    if not usable:
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            raise errors[0]
+        return results[0]
+
+    report = merge_vulnerability_reports(contract_name, usable)
+    report["analysis_chunks"] = len(chunks)
+    if len(usable) < len(chunks):
+        report["failed_chunks"] = len(chunks) - len(usable)
+        report["analysis_status"] = "partial"
+    return report
+
+
+async def _analyze_source(solidity_code: str, contract_name: str) -> dict:
+    if estimate_tokens(solidity_code) <= LLM_ANALYSIS_CHUNK_TOKENS:
+        return await _analyze_vulnerabilities(solidity_code, contract_name)
+    return await _find_vulnerabilities_chunked(solidity_code, contract_name)
+
+
+def _store_findings(contracts: list, analyzed_units: list, vulnerabilities: List[dict],
+                    default_contract=None) -> tuple:
+    """
+    Cache ``vulnerabilities`` per unit for every unit in ``analyzed_units``
+    (units without findings are cached as clean). Findings that belong to no
+    unit are grouped by contract for the caller to cache; findings on units
+    outside ``analyzed_units`` (context) are dropped. Returns ``(kept,
+    contract_level)``.
+    """
+    analyzed = {id(fp) for fp in analyzed_units}
+    per_unit: Dict[int, List[dict]] = {id(fp): [] for fp in analyzed_units}
+    contract_level: Dict[int, List[dict]] = {}
+    kept = []
+    for vulnerability in vulnerabilities:
+        contract, fp = attribute_finding(vulnerability, contracts)
+        if fp is not None:
+            if id(fp) in analyzed:
+                per_unit[id(fp)].append(vulnerability)
+                kept.append(vulnerability)
+            continue
+        contract = contract or default_contract
+        if contract is not None:
+            contract_level.setdefault(id(contract), []).append(vulnerability)
+        kept.append(vulnerability)
+
+    for contract in contracts:
+        for fp in contract.units:
+            if id(fp) in analyzed:
+                finding_cache.put_unit(fp, per_unit[id(fp)])
+    return kept, contract_level
+
+
+async def _find_vulnerabilities_incremental(solidity_code: str, contract_name: str) -> dict:
+    """
+    Analyze only the units that are not in the finding cache (plus the units
+    they reference, as context) and merge in cached findings for the rest.
+    """
+    parsed = parse_source(solidity_code)
+    contracts = fingerprint_source(parsed)
+    default_contract = next((c for c in contracts if c.block.name == contract_name), contracts[-1] if contracts else None)
+
+    contexts = {id(c): finding_cache.get_context(c) for c in contracts}
+    cached_units = {
+        id(fp): (finding_cache.get_unit(fp) if contexts[id(c)] is not None else None)
+        for c in contracts for fp in c.units
+    }
+    units_total = len(cached_units)
+    units_reused = sum(1 for findings in cached_units.values() if findings is not None)
+
+    if not units_reused:
+        result = await _analyze_source(solidity_code, contract_name)
+        cacheable = "raw_response" not in result and result.get("analysis_status") != "partial"
+        for vulnerability in result.get("vulnerabilities", []):
+            vulnerability["cache_status"] = "fresh"
+        if cacheable and contracts:
+            _, contract_level = _store_findings(
+                contracts, [fp for c in contracts for fp in c.units], result.get("vulnerabilities", []),
+                default_contract
+            )
+            for contract in contracts:
+                finding_cache.put_context(contract, contract_level.get(id(contract), []),
+                                          result.get("overall_risk_score"), result.get("summary", ""))
+        result["incremental_analysis"] = {
+            "units_total": units_total, "units_reused": 0, "units_analyzed": units_total,
+            "findings_reused": 0, "findings_fresh": len(result.get("vulnerabilities", []))
+        }
+        return result
+
+    reused: List[dict] = []
+    cached_summaries: List[str] = []
+    cached_scores = []
+    jobs = []
+    for contract in contracts:
+        context = contexts[id(contract)]
+        # No context (new contract, or its state/layout changed): every unit is re-analyzed
+        # and nothing contract-level is reused
+        if context is not None:
+            reused.extend(context["findings"])
+            cached_summaries.append(context.get("summary") or "")
+            cached_scores.append(context.get("risk_score"))
+        changed = []
+        for fp in contract.units:
+            if cached_units[id(fp)] is None:
+                changed.append(fp)
+            else:
+                reused.extend(cached_units[id(fp)])
+        changed_by_unit = {id(fp.unit): fp for fp in changed}
+        for group in pack_units(parsed, contract.block, [fp.unit for fp in changed], LLM_ANALYSIS_CHUNK_TOKENS):
+            group_fps = [changed_by_unit[id(unit)] for unit in group]
+            shown = {id(unit): unit for unit in group}
+            for fp in group_fps:
+                for dependency in fp.dependencies:
+                    shown.setdefault(id(dependency), dependency)
+            chunk = build_chunk(parsed, contract.block, sorted(shown.values(), key=lambda unit: unit.start))
+            jobs.append((contract, group_fps, chunk))
+
+    semaphore = asyncio.Semaphore(LLM_CHUNK_CONCURRENCY)
+    logger.info(f"Re-auditing {contract_name}: {units_reused}/{units_total} units reused, "
+                f"{units_total - units_reused} analyzed in {len(jobs)} prompts")
+
+    async def analyze(contract, group_fps, chunk: ContractChunk) -> dict:
+        names = ", ".join(fp.unit.name for fp in group_fps)
+        scope_note = (
+            f"The contract was edited. Only these members of contract {contract.block.name} are new or "
+            f"changed and in scope: {names}. The rest is included for context; do not report findings in it."
+        )
+        async with semaphore:
+            result = await _analyze_vulnerabilities(chunk.text, contract_name, scope_note)
+        remap_vulnerability_locations(result, chunk.line_map)
+        return result
+
+    results = await asyncio.gather(*(analyze(*job) for job in jobs), return_exceptions=True)
+
+    fresh_reports = []
+    failed = 0
+    failed_contracts = set()
+    new_contexts: Dict[int, List[dict]] = {}
+    fresh_results: Dict[int, List[dict]] = {}
+    for (contract, group_fps, _), result in zip(jobs, results):
+        if not isinstance(result, dict) or "raw_response" in result:
+            logger.warning(f"Incremental analysis of {', '.join(fp.unit.name for fp in group_fps)} failed: {result}")
+            failed += 1
+            failed_contracts.add(id(contract))
+            continue
+        kept, contract_level = _store_findings(
+            [contract], group_fps, result.get("vulnerabilities", []), contract
+        )
+        new_contexts.setdefault(id(contract), []).extend(contract_level.get(id(contract), []))
+        fresh_results.setdefault(id(contract), []).append(result)
+        for vulnerability in kept:
+            vulnerability["cache_status"] = "fresh"
+        fresh_reports.append({**result, "vulnerabilities": kept})
+
+    for contract in contracts:
+        context = contexts[id(contract)]
+        new_context = new_contexts.get(id(contract), [])
+        if context is not None:
+            if new_context:
+                finding_cache.put_context(contract, context["findings"] + new_context,
+                                          context.get("risk_score"), context.get("summary", ""))
+        elif id(contract) in fresh_results and id(contract) not in failed_contracts:
+            # Fully re-analyzed, so its contract-level findings and score can be cached afresh
+            results_of = fresh_results[id(contract)]
+            finding_cache.put_context(
+                contract, new_context,
+                max((r.get("overall_risk_score") or 0 for r in results_of), default=0),
+                " ".join(dict.fromkeys(r.get("summary") or "" for r in results_of if r.get("summary"))))
+
+    if jobs:
+        # The cached score covered code that has since changed; only the reused findings still count
+        reused_score = max((SEVERITY_RISK_FLOOR.get(_severity_rank(v), 0) for v in reused), default=0)
+    else:
+        reused_score = max((s for s in cached_scores if isinstance(s, (int, float))), default=0)
+    summary = " ".join(dict.fromkeys(s for s in cached_summaries if s))
+    report = merge_vulnerability_reports(
+        contract_name,
+        [{"vulnerabilities": reused, "overall_risk_score": reused_score, "summary": summary}] + fresh_reports
+    )
+    statuses = [v.get("cache_status") for v in report["vulnerabilities"]]
+    report["incremental_analysis"] = {
+        "units_total": units_total, "units_reused": units_reused,
+        "units_analyzed": units_total - units_reused,
+        "findings_reused": statuses.count("reused"), "findings_fresh": statuses.count("fresh")
+    }
+    if failed:
+        report["failed_chunks"] = failed
+        report["analysis_status"] = "partial"
+    return report
+
+
+async def find_vulnerabilities(solidity_code: str) -> dict:
+    """
+    Analyze the smart contract and identify potential vulnerabilities.
+    Returns a structured dictionary with vulnerability details.
+    The source is compacted first; if it is still large it is split along
+    contract/function boundaries and the chunks are analyzed concurrently.
+    With the finding cache enabled, a re-upload only sends new or changed
+    functions to the LLM; each finding's ``cache_status`` says whether it
+    was reused or is fresh. Line references point at the original source.
+    """
+    contract_name = extract_contract_name(solidity_code)
+    compacted = prepare_prompt_source(solidity_code)
+
+    with track_token_usage() as usage:
         try:
-            # Extract JSON if wrapped in code blocks
-            json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', vulnerability_response, re.DOTALL)
-            if json_match:
-                vulnerability_data = json.loads(json_match.group(1))
+            if FINDING_CACHE_ENABLED:
+                result = await _find_vulnerabilities_incremental(compacted.text, contract_name)
             else:
-                vulnerability_data = json.loads(vulnerability_response)
-            
-            return vulnerability_data
-            
-        except json.JSONDecodeError:
-            logger.warning("Failed to parse JSON response, returning raw text")
-            # Fallback: return structured data with raw response
-            return {
-                "contract_name": contract_name,
-                "total_vulnerabilities": "Unknown",
-                "severity_breakdown": {"critical": 0, "high": 0, "medium": 0, "low": 0},
-                "vulnerabilities": [],
-                "overall_risk_score": "Unknown",
-                "summary": vulnerability_response,
-                "raw_response": vulnerability_response
-            }
-            
-    except Exception as e:
-        logger.error(f"Failed to analyze vulnerabilities: {e}")
-        return {
-            "contract_name": contract_name,
-            "total_vulnerabilities": 0,
-            "severity_breakdown": {"critical": 0, "high": 0, "medium": 0, "low": 0},
-            "vulnerabilities": [],
-            "overall_risk_score": 0,
-            "summary": f"Vulnerability analysis failed: {str(e)}",
-            "error": str(e)
-        }
+                result = await _analyze_source(compacted.text, contract_name)
+            remap_vulnerability_locations(result, compacted.line_map)
+        except Exception as e:
+            logger.error(f"Failed to analyze vulnerabilities: {e}")
+            result = degraded_vulnerability_result(contract_name, e)
+    result["prompt_compaction"] = compacted.summary()
+    result["token_usage"] = usage
+    return result
+
+
+def degraded_vulnerability_result(contract_name: str, error: Exception) -> dict:
+    """
+    Result used when the LLM analysis could not run. Counts are unknown
+    (None), never zero, so an outage is not reported as a clean audit.
+    """
+    unavailable = isinstance(error, LLMUnavailableError)
+    return {
+        "contract_name": contract_name,
+        "analysis_status": "degraded",
+        "total_vulnerabilities": None,
+        "severity_breakdown": {},
+        "vulnerabilities": [],
+        "overall_risk_score": None,
+        "summary": (
+            "AI vulnerability analysis is temporarily unavailable; these results are incomplete."
+            if unavailable else f"Vulnerability analysis failed: {str(error)}"
+        ),
+        "error": str(error)
+    }
 
 
-def get_contract_description(solidity_code: str) -> str:
+async def get_contract_description(solidity_code: str) -> str:
     """
     Analyze the smart contract and provide a detailed description of what it does.
     """
     contract_name = extract_contract_name(solidity_code)
+    solidity_code = prepare_prompt_source(solidity_code).text
     
     prompt = f"""Analyze the following Solidity smart contract and provide a clear, comprehensive description of what it does. Focus on:
 
@@ -173,17 +505,117 @@ Contract code:
 Provide the description in a clear, concise paragraph format."""
 
     try:
-        description = query_openrouter(prompt)
+        description = await query_openrouter(prompt, validator=bool)
         return description
     except Exception as e:
         logger.error(f"Failed to get contract description: {e}")
         return f"Unable to generate description for {contract_name} contract due to analysis error."
 
 
-def generate_fixed_contract(original_code: str, slither_results: str) -> str:
+def extract_solidity_code(llm_response: str) -> str:
+    """Pull the Solidity code block out of an LLM response."""
+    code_blocks = re.findall(r'```solidity(.*?)```', llm_response, re.DOTALL)
+    if not code_blocks:
+        code_blocks = re.findall(r'```(.*?)```', llm_response, re.DOTALL)
+    return code_blocks[0].strip() if code_blocks else llm_response.strip()
+
+
+def looks_like_solidity(code: str) -> bool:
+    return "pragma solidity" in code and "contract" in code
+
+
+def _parse_fixed_chunk(llm_response: str, chunk: ContractChunk, existing_names: set) -> Optional[tuple]:
+    """
+    Extract rewritten members from a chunk fix. Returns ``(replacements,
+    additions)`` for ``stitch_callables`` or None if nothing usable came back.
+    Declarations whose names already exist in the contract are not added again.
+    """
+    parsed = parse_source(extract_solidity_code(llm_response))
+    block = next((b for b in parsed.contracts if b.name == chunk.contract), None)
+    if block is None and len(parsed.contracts) == 1:
+        block = parsed.contracts[0]
+    if block is None:
+        return None
+
+    wanted = {unit.key for unit in chunk.units}
+    replacements = {
+        (chunk.contract, unit.key): unit.text
+        for unit in block.callable_units if unit.key in wanted
+    }
+    if not replacements:
+        return None
+    additions = [
+        unit for unit in block.units
+        if unit.key not in wanted and unit.name and unit.name not in existing_names
+    ]
+    return replacements, additions
+
+
+async def _generate_fixed_contract_chunked(original_code: str, known_issues: str = "") -> str:
+    """
+    Fix a large contract chunk by chunk and stitch the corrected functions
+    back into the original source. Chunks whose fix fails keep their
+    original code. Each chunk's prompt lists the ``known_issues`` located in
+    its members (renumbered to the chunk's lines) and the unlocated ones.
+    """
+    chunks = split_source(original_code, LLM_FIX_CHUNK_TOKENS)
+    declared = {
+        block.name: {unit.name for unit in block.units if unit.name}
+        for block in parse_source(original_code).contracts
+    }
+    semaphore = asyncio.Semaphore(LLM_CHUNK_CONCURRENCY)
+    logger.info(f"Generating fixes in {len(chunks)} chunks")
+
+    async def fix(chunk: ContractChunk) -> Optional[tuple]:
+        existing = declared.get(chunk.contract, set())
+        members = ", ".join(unit.name for unit in chunk.units)
+        chunk_issues = issues_within(known_issues, [(u.start_line, u.end_line) for u in chunk.units], chunk.line_map)
+        issues_section = f"\nIssues found by the analysis in this excerpt (fix at least these):\n{chunk_issues}\n" if chunk_issues else ""
+        prompt = f"""Please audit the following excerpt of the Solidity contract "{chunk.contract}" and provide corrected versions of these members: {members}.
+1. Address any vulnerabilities or issues found in them
+2. Maintain all original functionality and keep their signatures
+3. If a fix needs new state variables, events or modifiers, declare them inside the contract
+4. Do not add imports or change the contract declaration
+
+IMPORTANT: Return ONLY a `contract {chunk.contract} {{ ... }}` block containing the corrected members and any new declarations, wrapped inside triple backticks with `solidity` syntax highlighting, without any additional explanation or comments.
+{issues_section}
+Contract excerpt:
+```solidity
+{chunk.text}
+```"""
+        async with semaphore:
+            response = await query_openrouter(
+                prompt, validator=lambda r: _parse_fixed_chunk(r, chunk, existing) is not None
+            )
+        return _parse_fixed_chunk(response, chunk, existing)
+
+    results = await asyncio.gather(*(fix(chunk) for chunk in chunks), return_exceptions=True)
+
+    replacements: Dict = {}
+    additions: Dict[str, List[str]] = {}
+    added_names = set()
+    for chunk, result in zip(chunks, results):
+        if isinstance(result, Exception) or result is None:
+            logger.warning(f"Fix for chunk of {chunk.contract} ({', '.join(u.name for u in chunk.units)}) failed: {result}")
+            continue
+        chunk_replacements, chunk_additions = result
+        replacements.update(chunk_replacements)
+        for unit in chunk_additions:
+            if (chunk.contract, unit.name) not in added_names:
+                added_names.add((chunk.contract, unit.name))
+                additions.setdefault(chunk.contract, []).append(unit.text)
+
+    if not replacements:
+        raise ValueError("LLM response does not contain valid Solidity code")
+    return stitch_callables(original_code, replacements, additions)
+
+
+async def generate_fixed_contract(original_code: str, known_issues: str = "") -> str:
     """
     Send the contract to the LLM for a basic audit and return a corrected version.
-    Preserves the original contract name and pragma directive.
+    Preserves the original contract name and pragma directive. ``known_issues``
+    (one line per de-duplicated finding, see ``app.findings.findings_prompt``)
+    points the fix at what the analysis already found.
     """
     if not original_code.strip():
         raise ValueError("Original Solidity code cannot be empty")
@@ -192,6 +624,7 @@ def generate_fixed_contract(original_code: str, slither_results: str) -> str:
     original_contract_name = extract_contract_name(original_code)
     pragma_match = re.search(r'pragma\s+solidity\s+([^;]+);', original_code)
     pragma_directive = pragma_match.group(0) if pragma_match else "pragma solidity ^0.8.0;"
+    issues_section = f"\nIssues found by the analysis (fix at least these):\n{known_issues}\n" if known_issues else ""
 
     prompt = f"""Please audit the following Solidity smart contract and provide a corrected version that:
 1. Addresses any vulnerabilities or issues found
@@ -200,25 +633,26 @@ def generate_fixed_contract(original_code: str, slither_results: str) -> str:
 4. Uses the same or compatible Solidity version
 
 IMPORTANT: Return ONLY the corrected Solidity code, wrapped inside triple backticks with `solidity` syntax highlighting, without any additional explanation or comments.
-
+{issues_section}
 Original contract:
 ```solidity
 {original_code}
 ```"""
 
-    llm_response = query_openrouter(prompt)
-    # logger.info(f"LLM raw response:\n{llm_response[:2000]}")
-
-    # Extract Solidity code block if present
-    code_blocks = re.findall(r'```solidity(.*?)```', llm_response, re.DOTALL)
-    if not code_blocks:
-        code_blocks = re.findall(r'```(.*?)```', llm_response, re.DOTALL)
+    if estimate_tokens(original_code) > LLM_FIX_CHUNK_TOKENS:
+        fixed_code = await _generate_fixed_contract_chunked(original_code, known_issues)
+    else:
+        llm_response = await query_openrouter(
+            prompt, validator=lambda response: looks_like_solidity(extract_solidity_code(response))
+        )
+        # logger.info(f"LLM raw response:\n{llm_response[:2000]}")
 
-    fixed_code = code_blocks[0].strip() if code_blocks else llm_response.strip()
+        # Extract Solidity code block if present
+        fixed_code = extract_solidity_code(llm_response)
 
     # Validate presence of pragma and contract keywords
-    if not ("pragma solidity" in fixed_code and "contract" in fixed_code):
-        logger.warning("Extracted fixed code does not appear to be valid Solidity. Response was:\n" + llm_response)
+    if not looks_like_solidity(fixed_code):
+        logger.warning("Extracted fixed code does not appear to be valid Solidity:\n" + fixed_code[:2000])
         raise ValueError("LLM response does not contain valid Solidity code")
 
     # Enforce original contract name
@@ -236,11 +670,103 @@ Original contract:
     return fixed_code
 
 
-def get_code_change_summary(original_code: str, fixed_code: str) -> str:
+speculation_stats = {
+    "started": 0,
+    "hits": 0,
+    "misses": 0,
+    "rejected": 0,
+    "cancelled": 0,
+    "critical_path_saved_s": 0.0,
+    "wasted_prompt_tokens": 0,
+    "wasted_completion_tokens": 0,
+}
+
+
+class SpeculativeFix:
+    """
+    Fix generation (a coroutine such as ``remediate(code)``) started before
+    detection has finished. The caller either ``take()``s the result once
+    findings confirm a fix is needed, or ``discard()``s it when both
+    detectors come back clean. Only a result that is actually used counts
+    as a hit; one that failed or that ``take`` rejected is wasted work.
+    """
+
+    def __init__(self, fix: Awaitable):
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self.usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self.task = asyncio.create_task(self._run(fix))
+        self._closed = False
+        speculation_stats["started"] += 1
+
+    async def _run(self, fix: Awaitable):
+        with track_token_usage() as usage:
+            self.usage = usage
+            try:
+                # Slither output is not part of the fix prompt, so nothing is lost by not waiting for it
+                return await fix
+            finally:
+                self.finished_at = time.monotonic()
+
+    async def take(self, usable: Optional[Callable[[Any], bool]] = None):
+        """
+        Use the speculative fix if it succeeded and ``usable`` (if given)
+        accepts it; otherwise return None and count it as rejected.
+        """
+        needed_at = time.monotonic()
+        try:
+            result = await self.task
+        except Exception as e:
+            logger.warning(f"Speculative fix failed: {e}")
+            result = None
+        if result is None or (usable is not None and not usable(result)):
+            self._closed = True
+            speculation_stats["rejected"] += 1
+            self._count_wasted()
+            return None
+        speculation_stats["hits"] += 1
+        # Time the fix had already been running when it was needed, i.e. taken off the critical path
+        speculation_stats["critical_path_saved_s"] += min(self.finished_at or needed_at, needed_at) - self.started_at
+        return result
+
+    def discard(self):
+        """Drop the fix: no detector found anything to fix."""
+        speculation_stats["misses"] += 1
+        self.cancel()
+        self._count_wasted()
+
+    def _count_wasted(self):
+        speculation_stats["wasted_prompt_tokens"] += self.usage["prompt_tokens"]
+        speculation_stats["wasted_completion_tokens"] += self.usage["completion_tokens"]
+
+    def cancel(self):
+        """Stop the fix if it is still running; safe to call more than once."""
+        if self._closed:
+            return
+        self._closed = True
+        if not self.task.done():
+            speculation_stats["cancelled"] += 1
+            self.task.cancel()
+        elif not self.task.cancelled():
+            self.task.exception()  # mark as retrieved
+
+
+def get_speculation_stats() -> Dict:
+    decided = speculation_stats["hits"] + speculation_stats["misses"] + speculation_stats["rejected"]
+    return {
+        **speculation_stats,
+        "critical_path_saved_s": round(speculation_stats["critical_path_saved_s"], 3),
+        "hit_rate": round(speculation_stats["hits"] / decided, 3) if decided else None,
+    }
+
+
+async def get_code_change_summary(original_code: str, fixed_code: str) -> str:
     """
     Ask the LLM to explain the changes made when rewriting the contract.
     """
     original_contract_name = extract_contract_name(original_code)
+    original_code = prepare_prompt_source(original_code).text
+    fixed_code = prepare_prompt_source(fixed_code).text
 
     prompt = f"""You previously fixed the {original_contract_name} contract. Please summarize:
 1. What vulnerabilities were addressed
@@ -253,7 +779,7 @@ Original contract:
 
 {fixed_code}
 ```"""
-    return query_openrouter(prompt)
+    return await query_openrouter(prompt, validator=bool)
 
 def save_solidity_code(solidity_code: str, filename: str):
     os.makedirs("contracts", exist_ok=True)
@@ -274,11 +800,12 @@ def save_vulnerability_report(vulnerability_data: dict, filename: str):
     logger.info(f"Saved vulnerability report to {filepath}")
 
 
-def get_security_summary(code: str) -> str:
+async def get_security_summary(code: str) -> str:
     """
     Analyze and summarize security risks for a given Solidity code.
     """
     contract_name = extract_contract_name(code)
+    code = prepare_prompt_source(code).text
     prompt = f"""Analyze the security of the {contract_name} contract below and:
 1. List potential vulnerabilities
 2. Rate overall security (1-10)
@@ -288,7 +815,7 @@ Contract code:
 ```solidity
 {code}
 ```"""
-    return query_openrouter(prompt)
+    return await query_openrouter(prompt, validator=bool)
 
 
 def get_optimization_suggestions(solidity_code: str) -> list:
@@ -319,7 +846,7 @@ def get_best_practice_checklist(solidity_code: str) -> list:
     return checklist
 
 
-if __name__ == "__main__":
+async def _main():
     # Example vulnerable Solidity contract
     original_solidity_code = """
     // SPDX-License-Identifier: MIT
@@ -344,7 +871,7 @@ if __name__ == "__main__":
 
     try:
         # Get contract description
-        description = get_contract_description(original_solidity_code)
+        description = await get_contract_description(original_solidity_code)
         print(f"\nContract Description:\n{description}")
 
         # Find vulnerabilities - NEW FUNCTION
@@ -352,7 +879,7 @@ if __name__ == "__main__":
         print("VULNERABILITY ANALYSIS")
         print("="*50)
         
-        vulnerability_results = find_vulnerabilities(original_solidity_code)
+        vulnerability_results = await find_vulnerabilities(original_solidity_code)
         
         # Display vulnerability summary
         print(f"\nContract: {vulnerability_results.get('contract_name', 'Unknown')}")
@@ -391,17 +918,17 @@ if __name__ == "__main__":
         print("GENERATING FIXED CONTRACT")
         print("="*50)
         
-        fixed_code = generate_fixed_contract(original_solidity_code, "")
+        fixed_code = await generate_fixed_contract(original_solidity_code, "")
 
         # Save the fixed contract to file
         save_solidity_code(fixed_code, contract_name)
 
         # Get and print change summary
-        change_summary = get_code_change_summary(original_solidity_code, fixed_code)
+        change_summary = await get_code_change_summary(original_solidity_code, fixed_code)
         print("\nChange Summary:\n", change_summary)
 
         # Get and print security summary
-        security_summary = get_security_summary(fixed_code)
+        security_summary = await get_security_summary(fixed_code)
         print("\nSecurity Summary:\n", security_summary)
 
         # Get optimization suggestions
@@ -421,3 +948,7 @@ if __name__ == "__main__":
     except Exception as e:
         logger.error(f"Error in main execution: {e}")
         raise
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -7,7 +7,15 @@ import logging
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 from fastapi import FastAPI
-from app.routers import nft
+from app.routers import nft, batch
+from app.llm_client import close_client
+from app import etherscan
+from reports.minting_reports import prepare_indexes
+from reports import audit_history
+from utils.connect_db import close_db
+from app.config import INDEXER_ENABLED
+import asyncio
+import sys
 
 API_BASE_URL = os.getenv("VITE_API_BASE_URL", "http://localhost:8000")
 
@@ -55,6 +63,7 @@ app.include_router(nft.router, prefix="/api/v1/nft")
 
 # Include your API router
 app.include_router(router, prefix="/api/v1")
+app.include_router(batch.router, prefix="/api/v1")
 
 # Create required directories
 required_dirs = ["reports", "contracts", "logs", "artifacts"]
@@ -80,7 +89,29 @@ async def health_check():
 @app.on_event("startup")
 async def startup_event():
     logger.info("Audit Smart API service starting up")
+    app.state.report_indexes = asyncio.ensure_future(prepare_indexes())
+    app.state.audit_indexes = asyncio.ensure_future(audit_history.prepare_indexes())
+    if INDEXER_ENABLED:
+        from app.transfer_indexer import start_indexer     # imports web3
+        start_indexer()
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    logger.info("Audit Smart API service shutting down")
\ No newline at end of file
+    logger.info("Audit Smart API service shutting down")
+    await close_client()
+    await etherscan.close_client()
+    if "app.transfer_indexer" in sys.modules:
+        await sys.modules["app.transfer_indexer"].stop_indexer()
+    if "app.sandbox" in sys.modules:
+        sys.modules["app.sandbox"].shutdown_sandbox()
+    if "app.chain" in sys.modules:     # web3 is only imported once something used the chain
+        await sys.modules["app.chain"].close_web3()
+    close_db()
+
+if __name__ == "__main__":
+    # python -m app.main --profile-startup: per-module import times against STARTUP_IMPORT_BUDGET_MS
+    if "--profile-startup" in sys.argv:
+        from app.startup_profile import main as profile_startup
+        sys.exit(profile_startup(sys.argv[1:]))
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", "8000")))
@@ -0,0 +1,249 @@
+"""
+Coalesced certificate minting.
+
+Mint requests for the same contract are collected for
+``MINT_QUEUE_WINDOW`` seconds or until ``MINT_QUEUE_MAX_BATCH`` are
+waiting, then submitted together. If the contract's ABI has a batch-mint
+entry point taking ``(address[], string[])`` (see ``BATCH_MINT_FUNCTIONS``)
+the whole batch is one transaction; otherwise each mint is its own
+transaction, but they are estimated together (one batched RPC round trip),
+sent back to back on consecutive nonces and confirmed by the same receipt
+poll. Either way every caller gets its own token id, decoded from the
+ERC-721 ``Transfer`` logs of the receipt.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from web3 import Web3
+
+from app.chain import MAX_GAS_LIMIT, abi_digest, get_chain_id, get_contract, get_gas_price, get_service_account
+from app.config import MINT_QUEUE_MAX_BATCH, MINT_QUEUE_WINDOW, RPC_BATCH_MEASURE
+from app.nonce_manager import nonce_manager
+from app.receipt_watcher import receipt_watcher
+from app.rpc_batching import rpc_operation
+
+logger = logging.getLogger(__name__)
+
+# Batch entry points recognised in an NFT ABI, all taking (address[] recipients, string[] tokenURIs)
+BATCH_MINT_FUNCTIONS = ("batchMintToUser", "mintBatch", "batchMint")
+TRANSFER_TOPIC = Web3.keccak(text="Transfer(address,address,uint256)")
+ZERO_TOPIC = b"\x00" * 32
+MINT_RECEIPT_TIMEOUT = 120
+
+
+@dataclass
+class MintRequest:
+    recipient: str
+    token_uri: str
+    future: asyncio.Future
+
+
+@dataclass
+class MintBatch:
+    contract_address: str
+    abi: List[Dict]
+    function_name: str
+    loop: asyncio.AbstractEventLoop
+    requests: List[MintRequest] = field(default_factory=list)
+    flush_handle: Optional[asyncio.TimerHandle] = None
+
+
+def batch_mint_function(abi: List[Dict]) -> Optional[str]:
+    """Name of the batch-mint entry point in ``abi``, if it has one."""
+    for name in BATCH_MINT_FUNCTIONS:
+        for item in abi:
+            if item.get("type") == "function" and item.get("name") == name:
+                if [i.get("type") for i in item.get("inputs", [])] == ["address[]", "string[]"]:
+                    return name
+    return None
+
+
+def minted_tokens(receipt, contract_address: str) -> List[Tuple[str, int]]:
+    """(recipient, token id) of every ERC-721 mint logged by ``contract_address``, in log order."""
+    minted = []
+    for log in receipt.logs:
+        topics = [bytes(t) for t in log.topics]
+        if (Web3.to_checksum_address(log.address) != contract_address or len(topics) != 4
+                or topics[0] != TRANSFER_TOPIC or topics[1] != ZERO_TOPIC):
+            continue
+        minted.append((Web3.to_checksum_address(topics[2][-20:]), int.from_bytes(topics[3], "big")))
+    return minted
+
+
+def _assign_token_ids(requests: List[MintRequest], minted: List[Tuple[str, int]]) -> List[Optional[int]]:
+    """Match mints to requests in order, each request taking the next mint to its recipient."""
+    remaining = list(minted)
+    token_ids = []
+    for request in requests:
+        index = next((i for i, (recipient, _) in enumerate(remaining) if recipient == request.recipient), None)
+        token_ids.append(remaining.pop(index)[1] if index is not None else None)
+    return token_ids
+
+
+class MintQueue:
+    """Per-contract mint batches; see the module docstring."""
+
+    def __init__(self, window: float = MINT_QUEUE_WINDOW, max_batch: int = MINT_QUEUE_MAX_BATCH):
+        self.window = window
+        self.max_batch = max_batch
+        self._batches: Dict[Tuple[str, str, str], MintBatch] = {}
+        self.stats = {"requests": 0, "batches": 0, "batch_transactions": 0, "single_transactions": 0,
+                      "fallbacks": 0, "failed": 0, "largest_batch": 0}
+
+    async def mint(self, contract_address: str, abi: List[Dict], recipient: str, token_uri: str,
+                   function_name: str = "mintToUser") -> Dict:
+        """
+        Queue a mint of ``token_uri`` to ``recipient``; resolves with the
+        transaction details and the minted ``token_id`` once it is mined.
+        ``function_name`` is the single-mint function, called as
+        ``(recipient, token_uri)`` when the contract has no batch entry point.
+        """
+        contract_address = Web3.to_checksum_address(contract_address)
+        recipient = Web3.to_checksum_address(recipient)
+        loop = asyncio.get_running_loop()
+        key = (contract_address, abi_digest(abi), function_name)
+        batch = self._batches.get(key)
+        if batch is None or batch.loop is not loop:
+            batch = self._batches[key] = MintBatch(contract_address, abi, function_name, loop)
+        request = MintRequest(recipient, token_uri, loop.create_future())
+        batch.requests.append(request)
+        self.stats["requests"] += 1
+        if len(batch.requests) >= self.max_batch:
+            self._flush(key)
+        elif batch.flush_handle is None:
+            batch.flush_handle = loop.call_later(self.window, self._flush, key)
+        return await request.future
+
+    def _flush(self, key: Tuple[str, str, str]):
+        batch = self._batches.pop(key, None)
+        if batch is None:
+            return
+        if batch.flush_handle is not None:
+            batch.flush_handle.cancel()
+        # Callers that gave up before submission are not minted
+        batch.requests = [r for r in batch.requests if not r.future.done()]
+        if batch.requests:
+            asyncio.ensure_future(self._submit(batch))
+
+    async def _submit(self, batch: MintBatch):
+        self.stats["batches"] += 1
+        self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch.requests))
+        try:
+            with rpc_operation("mint_batch") as rpc:
+                contract = get_contract(batch.contract_address, batch.abi)
+                batch_function = batch_mint_function(batch.abi) if len(batch.requests) > 1 else None
+                results = None
+                if batch_function:
+                    results = await self._submit_batched(contract, batch_function, batch.requests)
+                if results is None:
+                    results = await self._submit_pipelined(contract, batch.function_name, batch.requests)
+        except Exception as e:
+            results = [e] * len(batch.requests)
+        for request, result in zip(batch.requests, results):
+            if request.future.done():
+                continue
+            if isinstance(result, Exception):
+                self.stats["failed"] += 1
+                request.future.set_exception(result)
+            else:
+                if RPC_BATCH_MEASURE:
+                    result["rpc"] = rpc.summary()
+                request.future.set_result(result)
+
+    async def _submit_batched(self, contract, function_name: str, requests: List[MintRequest]) -> Optional[List]:
+        """One transaction for all of ``requests``; None if the batch can't go through as one."""
+        account = get_service_account()
+        mint_fn = getattr(contract.functions, function_name)(
+            [r.recipient for r in requests], [r.token_uri for r in requests])
+        try:
+            chain_id, _, gas_estimate, _ = await asyncio.gather(
+                get_chain_id(),
+                get_gas_price(),
+                mint_fn.estimate_gas({"from": account.address}),
+                nonce_manager.prepare(account.address)
+            )
+        except Exception as e:
+            # Usually a single bad request; minting one by one isolates it
+            self.stats["fallbacks"] += 1
+            logger.warning(f"Batch mint of {len(requests)} on {contract.address} not possible ({e}); minting singly")
+            return None
+        if gas_estimate > MAX_GAS_LIMIT:
+            self.stats["fallbacks"] += 1
+            return None
+
+        async def build_tx(nonce: int) -> Dict:
+            return await mint_fn.build_transaction({
+                "chainId": chain_id,
+                "gas": gas_estimate + 10000 * len(requests),
+                "gasPrice": await get_gas_price(),
+                "from": account.address,
+                "nonce": nonce
+            })
+
+        tx_hash = await nonce_manager.send_transaction(build_tx, account)
+        self.stats["batch_transactions"] += 1
+        receipt = await receipt_watcher.wait_for_receipt(tx_hash, timeout=MINT_RECEIPT_TIMEOUT)
+        if receipt.status != 1:
+            return [ValueError(f"Batch mint transaction {tx_hash} reverted")] * len(requests)
+        token_ids = _assign_token_ids(requests, minted_tokens(receipt, contract.address))
+        return [self._result(contract.address, request, tx_hash, receipt, token_id, len(requests))
+                for request, token_id in zip(requests, token_ids)]
+
+    async def _submit_pipelined(self, contract, function_name: str, requests: List[MintRequest]) -> List:
+        """One transaction per request, estimated together and sent on consecutive nonces."""
+        account = get_service_account()
+        mint_fns = [getattr(contract.functions, function_name)(r.recipient, r.token_uri) for r in requests]
+        chain_id, _, _ = await asyncio.gather(
+            get_chain_id(), get_gas_price(), nonce_manager.prepare(account.address))
+        estimates = await asyncio.gather(
+            *[fn.estimate_gas({"from": account.address}) for fn in mint_fns], return_exceptions=True)
+
+        async def send_and_wait(request: MintRequest, mint_fn, gas_estimate) -> Dict:
+            if isinstance(gas_estimate, Exception):
+                raise gas_estimate
+            if gas_estimate > MAX_GAS_LIMIT:
+                raise ValueError("Estimated gas exceeds limit")
+
+            async def build_tx(nonce: int) -> Dict:
+                return await mint_fn.build_transaction({
+                    "chainId": chain_id,
+                    "gas": gas_estimate + 10000,
+                    "gasPrice": await get_gas_price(),
+                    "from": account.address,
+                    "nonce": nonce
+                })
+
+            tx_hash = await nonce_manager.send_transaction(build_tx, account)
+            self.stats["single_transactions"] += 1
+            receipt = await receipt_watcher.wait_for_receipt(tx_hash, timeout=MINT_RECEIPT_TIMEOUT)
+            if receipt.status != 1:
+                raise ValueError(f"Mint transaction {tx_hash} reverted")
+            token_id = _assign_token_ids([request], minted_tokens(receipt, contract.address))[0]
+            return self._result(contract.address, request, tx_hash, receipt, token_id, 1)
+
+        return await asyncio.gather(
+            *[send_and_wait(r, fn, gas) for r, fn, gas in zip(requests, mint_fns, estimates)],
+            return_exceptions=True)
+
+    @staticmethod
+    def _result(contract_address: str, request: MintRequest, tx_hash: str, receipt, token_id: Optional[int],
+                batch_size: int) -> Dict:
+        return {
+            "status": "success",
+            "transaction_hash": tx_hash,
+            "block_number": receipt.blockNumber,
+            "gas_used": receipt.gasUsed,
+            "batch_size": batch_size,
+            "nft_contract": contract_address,
+            "recipient": request.recipient,
+            "token_uri": request.token_uri,
+            "token_id": token_id,
+        }
+
+    def snapshot(self) -> Dict:
+        return {**self.stats, "queued": sum(len(b.requests) for b in self._batches.values())}
+
+
+mint_queue = MintQueue()
@@ -1,29 +1,121 @@
-from web3 import Web3
+"""
+Long-lived NFT minting service behind ``/api/v1/nft/mint``.
+
+ABIs are read only from ``ABI_DIR`` and parsed once per (contract address,
+ABI path), and mints go through the shared provider, service account, nonce
+manager and mint queue, so a request only pays for the transaction itself. File reads,
+Pinata uploads and transaction signing run in worker threads.
+"""
+import asyncio
 import json
+import logging
 import os
-from dotenv import load_dotenv
+from typing import Any, Dict, List, Optional, Tuple
+
+from web3 import Web3
+
+from app.deploy import validate_nft_metadata
+from app.mint_queue import mint_queue
+from app.pinata_utils import pin_json_to_pinata
+
+logger = logging.getLogger(__name__)
+
+ABI_DIR = "abis"        # where deploy.save_contract_abi stores the ABIs of deployed NFT contracts
+
+
+class AbiNotAvailable(ValueError):
+    """No usable ABI for the contract. The message is safe to return to clients; details are logged."""
+
+    def __init__(self):
+        super().__init__("ABI not available for this contract")
+
+
+def resolve_abi_path(contract_address: str, abi_path: Optional[str] = None) -> str:
+    """Real path of the ABI file; paths outside ``ABI_DIR`` (client-supplied ones included) are refused."""
+    root = os.path.realpath(ABI_DIR)
+    path = os.path.realpath(abi_path or os.path.join(ABI_DIR, f"{contract_address}.json"))
+    if os.path.commonpath([root, path]) != root:
+        logger.warning(f"Refused ABI path outside {ABI_DIR}: {abi_path}")
+        raise AbiNotAvailable()
+    return path
+
+
+def _read_abi(abi_path: str) -> List[Dict]:
+    try:
+        with open(abi_path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read ABI {abi_path}: {e}")
+        raise AbiNotAvailable()
+    # Accept both a bare ABI and a compiler/Hardhat artifact
+    abi = data.get("abi") if isinstance(data, dict) else data
+    if not isinstance(abi, list):
+        logger.warning(f"No ABI found in {abi_path}")
+        raise AbiNotAvailable()
+    return abi
 
-load_dotenv()
 
 class NFTMinter:
-    def __init__(self, contract_address, abi_path):
-        self.web3 = Web3(Web3.HTTPProvider(os.getenv("L1X_RPC_URL")))
-        self.account = self.web3.eth.account.from_key(os.getenv("PRIVATE_KEY"))
-        self.contract_address = Web3.to_checksum_address(contract_address)
-
-        with open(abi_path, 'r') as f:
-            abi = json.load(f)
-
-        self.contract = self.web3.eth.contract(address=self.contract_address, abi=abi)
-
-    def mint(self, to_address, token_uri):
-        tx = self.contract.functions.mint(to_address, token_uri).build_transaction({
-            'from': self.account.address,
-            'nonce': self.web3.eth.get_transaction_count(self.account.address),
-            'gas': 500000,
-            'gasPrice': self.web3.eth.gas_price,
-        })
-
-        signed_tx = self.account.sign_transaction(tx)
-        tx_hash = self.web3.eth.send_raw_transaction(signed_tx.rawTransaction)
-        return self.web3.to_hex(tx_hash)
+    def __init__(self):
+        self._abis: Dict[Tuple[str, str], List[Dict]] = {}
+        self._loading: Dict[Tuple[str, str], asyncio.Task] = {}
+        self.stats = {"mints": 0, "abi_loads": 0, "abi_cache_hits": 0, "metadata_pins": 0}
+
+    def _finish_loading(self, key: Tuple[str, str], task: asyncio.Task):
+        self._loading.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            self._abis[key] = task.result()
+
+    async def get_abi(self, contract_address: str, abi_path: Optional[str] = None) -> List[Dict]:
+        """Parsed ABI of ``contract_address``, read from ``ABI_DIR`` once per (address, path)."""
+        abi_path = resolve_abi_path(contract_address, abi_path)
+        key = (contract_address, abi_path)
+        abi = self._abis.get(key)
+        if abi is not None:
+            self.stats["abi_cache_hits"] += 1
+            return abi
+        task = self._loading.get(key)
+        if task is None:
+            self.stats["abi_loads"] += 1
+            task = self._loading[key] = asyncio.ensure_future(asyncio.to_thread(_read_abi, abi_path))
+            task.add_done_callback(lambda t: self._finish_loading(key, t))
+        return await asyncio.shield(task)
+
+    async def mint(self, contract_address: str, recipient: str, metadata: Dict[str, Any],
+                   token_uri: Optional[str] = None, abi_path: Optional[str] = None) -> Dict:
+        """
+        Mint a token to ``recipient``. Without a ``token_uri`` the metadata
+        is pinned to IPFS first. Uses the contract's ``mintToUser`` if it
+        has one, else ``mint``, both called as ``(recipient, token_uri)``.
+        """
+        contract_address = Web3.to_checksum_address(contract_address)
+        recipient = Web3.to_checksum_address(recipient)
+        abi = await self.get_abi(contract_address, abi_path)
+        function_names = {item.get("name") for item in abi if item.get("type") == "function"}
+        function_name = "mintToUser" if "mintToUser" in function_names else "mint"
+        if function_name not in function_names:
+            raise ValueError("Contract ABI has no mintToUser or mint function")
+
+        if not token_uri:
+            if not validate_nft_metadata(metadata):
+                raise ValueError("Invalid NFT metadata: name and description are required")
+            self.stats["metadata_pins"] += 1
+            token_uri = f"ipfs://{await asyncio.to_thread(pin_json_to_pinata, metadata)}"
+
+        result = await mint_queue.mint(contract_address, abi, recipient, token_uri, function_name)
+        self.stats["mints"] += 1
+        return {**result, "tx_hash": result["transaction_hash"]}
+
+    def snapshot(self) -> Dict:
+        return {**self.stats, "cached_abis": len(self._abis)}
+
+
+_minter: Optional[NFTMinter] = None
+
+
+def get_minter() -> NFTMinter:
+    """The process-wide minting service."""
+    global _minter
+    if _minter is None:
+        _minter = NFTMinter()
+    return _minter
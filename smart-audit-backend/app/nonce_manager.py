@@ -0,0 +1,193 @@
+"""
+Local nonce allocation for the service account.
+
+Nonces are handed out from a local counter, so any number of deploys and
+mints can be signed and sent concurrently without two of them reading the
+same ``get_transaction_count``. The counter is synced from the chain's
+pending count when an account is first used, when it has no transactions
+in flight and hasn't synced since its last reservation, and after the
+node rejects a nonce (too low, already known, underpriced replacement);
+the rejected transaction is then rebuilt with a fresh nonce. A nonce whose
+transaction was never sent is released, or, if later nonces are already
+out, leaves a gap that the next resync closes. Sent transactions stay in flight until the receipt watcher
+sees them mined.
+
+When several worker processes sign with the same account, every
+reservation is also claimed against a floor in ``app.shared_state``, so
+two workers never hand out the same nonce; a resync after an error resets
+that floor to the chain's count.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional
+
+from web3 import Web3
+
+from app import shared_state
+from app.chain import get_service_account, get_web3
+from app.config import NONCE_MAX_RESYNC_RETRIES, NONCE_PENDING_TIMEOUT
+from app.receipt_watcher import receipt_watcher
+
+logger = logging.getLogger(__name__)
+
+# Substrings of node errors that mean the nonce, not the transaction, was the problem
+NONCE_ERROR_MARKERS = (
+    "nonce too low",
+    "nonce too high",
+    "already known",
+    "known transaction",
+    "replacement transaction underpriced",
+    "invalid nonce",
+    "invalid transaction nonce",
+)
+
+
+def is_nonce_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in NONCE_ERROR_MARKERS)
+
+
+@dataclass
+class AccountNonces:
+    next_nonce: Optional[int] = None            # None until synced with the chain
+    pending: Dict[int, Optional[str]] = field(default_factory=dict)   # reserved/sent nonce -> tx hash
+    needs_resync: bool = True
+    fresh: bool = False     # synced since the last reservation, so an idle account needn't sync again
+    lock: Optional[asyncio.Lock] = None
+    lock_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self.lock is None or self.lock_loop is not loop:
+            self.lock, self.lock_loop = asyncio.Lock(), loop
+        return self.lock
+
+
+class NonceManager:
+    """Per-address nonce counters; see the module docstring."""
+
+    def __init__(self):
+        self._accounts: Dict[str, AccountNonces] = {}
+        self.stats = {"reserved": 0, "released": 0, "gaps": 0, "resyncs": 0, "nonce_errors": 0, "confirmed": 0}
+
+    def _state(self, address: str) -> AccountNonces:
+        return self._accounts.setdefault(address.lower(), AccountNonces())
+
+    async def _resync(self, address: str, state: AccountNonces):
+        self.stats["resyncs"] += 1
+        chain_nonce = await get_web3().eth.get_transaction_count(address, "pending")
+        # Only an error-triggered resync may lower the shared floor; a routine one must not
+        # hand out nonces other workers have reserved but not yet sent
+        reset = state.needs_resync and state.next_nonce is not None
+        await asyncio.to_thread(shared_state.sync_nonce, address, chain_nonce, reset)
+        # Below the chain's count everything is mined or in the node's pool. Ours above it
+        # stay reserved (a gap below them is filled first); unsent reservations belong to
+        # callers still building their transaction.
+        state.pending = {n: tx_hash for n, tx_hash in state.pending.items() if n >= chain_nonce or tx_hash is None}
+        state.next_nonce = chain_nonce
+        state.needs_resync = False
+        state.fresh = True
+
+    async def prepare(self, address: str):
+        """Resync now if the counter is unknown or invalid, so it can overlap other preflight calls."""
+        state = self._state(address)
+        async with state.get_lock():
+            # Checked under the lock: concurrent preflights share the resync the first one did
+            if state.needs_resync or state.next_nonce is None:
+                await self._resync(address, state)
+
+    async def reserve(self, address: str) -> int:
+        state = self._state(address)
+        async with state.get_lock():
+            if state.needs_resync or state.next_nonce is None or not (state.pending or state.fresh):
+                await self._resync(address, state)
+            nonce = state.next_nonce
+            while True:
+                nonce = await asyncio.to_thread(shared_state.claim_nonce, address, nonce)
+                if nonce not in state.pending:
+                    break
+                nonce += 1
+            state.pending[nonce] = None
+            state.next_nonce = nonce + 1
+            state.fresh = False
+            self.stats["reserved"] += 1
+            return nonce
+
+    def mark_sent(self, address: str, nonce: int, tx_hash: str):
+        self._state(address).pending[nonce] = tx_hash
+
+    async def release(self, address: str, nonce: int, resync: bool = False):
+        """Give back a nonce whose transaction was not accepted by the node."""
+        state = self._state(address)
+        state.pending.pop(nonce, None)
+        self.stats["released"] += 1
+        if resync:
+            state.needs_resync = True
+            return
+        # Under the lock, so no reservation claims the next nonce between the two steps
+        async with state.get_lock():
+            if state.next_nonce == nonce + 1:
+                state.next_nonce = nonce
+                await asyncio.to_thread(shared_state.release_nonce, address, nonce)
+            elif state.next_nonce is not None and nonce < state.next_nonce:
+                self.stats["gaps"] += 1
+                state.needs_resync = True
+
+    def _settle(self, address: str, tx_hash: str, outcome):
+        if isinstance(outcome, Exception):
+            # Not mined in time: it may have been dropped, so let the chain decide the next nonce
+            self._state(address).needs_resync = True
+        self.confirm(address, tx_hash)
+
+    def confirm(self, address: str, tx_hash: str):
+        """The transaction ``tx_hash`` was mined; its nonce is no longer in flight."""
+        pending = self._state(address).pending
+        for nonce, sent_hash in list(pending.items()):
+            if sent_hash == tx_hash:
+                del pending[nonce]
+                self.stats["confirmed"] += 1
+
+    async def send_transaction(self, build_tx: Callable[[int], Awaitable[Dict]], account=None) -> str:
+        """
+        Build (with the reserved nonce), sign and send a transaction from
+        ``account`` (default: the service account); returns the tx hash.
+        Nonce rejections are retried with a resynced nonce.
+        """
+        account = account or get_service_account()
+        address = account.address
+        w3 = get_web3()
+        for attempt in range(NONCE_MAX_RESYNC_RETRIES + 1):
+            nonce = await self.reserve(address)
+            try:
+                tx = await build_tx(nonce)
+                signed = await asyncio.to_thread(account.sign_transaction, tx)    # CPU-bound; keep it off the loop
+                tx_hash = Web3.to_hex(await w3.eth.send_raw_transaction(signed.raw_transaction))
+            except asyncio.CancelledError:
+                await self.release(address, nonce, resync=True)   # may or may not have reached the node
+                raise
+            except Exception as e:
+                if is_nonce_error(e) and attempt < NONCE_MAX_RESYNC_RETRIES:
+                    self.stats["nonce_errors"] += 1
+                    logger.warning(f"Nonce {nonce} rejected for {address} ({e}); resyncing")
+                    await self.release(address, nonce, resync=True)
+                    continue
+                await self.release(address, nonce, resync=is_nonce_error(e))
+                raise
+            self.mark_sent(address, nonce, tx_hash)
+            receipt_watcher.watch(tx_hash, timeout=NONCE_PENDING_TIMEOUT,
+                                  callback=lambda h, outcome: self._settle(address, h, outcome))
+            return tx_hash
+        raise RuntimeError("unreachable")
+
+    def snapshot(self) -> Dict:
+        return {
+            **self.stats,
+            "accounts": {
+                address: {"next_nonce": state.next_nonce, "in_flight": len(state.pending)}
+                for address, state in self._accounts.items()
+            },
+        }
+
+
+nonce_manager = NonceManager()
@@ -3,6 +3,8 @@ import requests
 import json
 from dotenv import load_dotenv
 
+from app.config import PINATA_API_URL, PINATA_GATEWAY_URL, PINATA_TIMEOUT
+
 load_dotenv()
 
 PINATA_API_KEY = os.getenv("PINATA_API_KEY")
@@ -10,7 +12,7 @@ PINATA_API_SECRET = os.getenv("PINATA_API_SECRET")
 
 def pin_json_to_pinata(json_data: dict) -> str:
     """Pin JSON data to IPFS via Pinata"""
-    url = "https://api.pinata.cloud/pinning/pinJSONToIPFS"
+    url = f"{PINATA_API_URL}/pinning/pinJSONToIPFS"
     
     headers = {
         "pinata_api_key": PINATA_API_KEY,
@@ -18,7 +20,7 @@ def pin_json_to_pinata(json_data: dict) -> str:
         "Content-Type": "application/json"
     }
     
-    response = requests.post(url, headers=headers, data=json.dumps(json_data))
+    response = requests.post(url, headers=headers, data=json.dumps(json_data), timeout=PINATA_TIMEOUT)
     
     if response.status_code == 200:
         ipfs_hash = response.json()["IpfsHash"]
@@ -28,7 +30,7 @@ def pin_json_to_pinata(json_data: dict) -> str:
 
 def pin_file_to_pinata(file_path: str, filename: str) -> str:
     """Pin a file to IPFS via Pinata"""
-    url = "https://api.pinata.cloud/pinning/pinFileToIPFS"
+    url = f"{PINATA_API_URL}/pinning/pinFileToIPFS"
     
     headers = {
         "pinata_api_key": PINATA_API_KEY,
@@ -59,7 +61,7 @@ def pin_file_to_pinata(file_path: str, filename: str) -> str:
             'pinataMetadata': json.dumps(pinata_metadata)
         }
         
-        response = requests.post(url, headers=headers, files=files, data=data)
+        response = requests.post(url, headers=headers, files=files, data=data, timeout=PINATA_TIMEOUT)
     
     if response.status_code == 200:
         ipfs_hash = response.json()["IpfsHash"]
@@ -69,14 +71,14 @@ def pin_file_to_pinata(file_path: str, filename: str) -> str:
 
 def get_pinned_content(ipfs_hash: str) -> dict:
     """Get information about pinned content from Pinata"""
-    url = f"https://api.pinata.cloud/data/pinList?hashContains={ipfs_hash}"
+    url = f"{PINATA_API_URL}/data/pinList?hashContains={ipfs_hash}"
     
     headers = {
         "pinata_api_key": PINATA_API_KEY,
         "pinata_secret_api_key": PINATA_API_SECRET
     }
     
-    response = requests.get(url, headers=headers)
+    response = requests.get(url, headers=headers, timeout=PINATA_TIMEOUT)
     
     if response.status_code == 200:
         return response.json()
@@ -85,14 +87,14 @@ def get_pinned_content(ipfs_hash: str) -> dict:
 
 def unpin_content(ipfs_hash: str) -> bool:
     """Unpin content from Pinata (optional cleanup function)"""
-    url = f"https://api.pinata.cloud/pinning/unpin/{ipfs_hash}"
+    url = f"{PINATA_API_URL}/pinning/unpin/{ipfs_hash}"
     
     headers = {
         "pinata_api_key": PINATA_API_KEY,
         "pinata_secret_api_key": PINATA_API_SECRET
     }
     
-    response = requests.delete(url, headers=headers)
+    response = requests.delete(url, headers=headers, timeout=PINATA_TIMEOUT)
     
     if response.status_code == 200:
         return True
@@ -101,9 +103,9 @@ def unpin_content(ipfs_hash: str) -> bool:
 
 def retrieve_json_from_ipfs(ipfs_hash: str) -> dict:
     """Retrieve JSON content from IPFS via Pinata gateway"""
-    url = f"https://gateway.pinata.cloud/ipfs/{ipfs_hash}"
+    url = f"{PINATA_GATEWAY_URL}/ipfs/{ipfs_hash}"
     
-    response = requests.get(url)
+    response = requests.get(url, timeout=PINATA_TIMEOUT)
     
     if response.status_code == 200:
         return response.json()
@@ -112,9 +114,9 @@ def retrieve_json_from_ipfs(ipfs_hash: str) -> dict:
 
 def retrieve_file_from_ipfs(ipfs_hash: str) -> str:
     """Retrieve file content from IPFS via Pinata gateway"""
-    url = f"https://gateway.pinata.cloud/ipfs/{ipfs_hash}"
+    url = f"{PINATA_GATEWAY_URL}/ipfs/{ipfs_hash}"
     
-    response = requests.get(url)
+    response = requests.get(url, timeout=PINATA_TIMEOUT)
     
     if response.status_code == 200:
         return response.text
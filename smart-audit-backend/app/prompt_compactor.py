@@ -0,0 +1,210 @@
+"""
+Prompt preparation for Solidity sources.
+
+``compact_source`` removes what costs tokens without telling the model
+anything about the contract's behaviour: comments (licence headers, NatSpec),
+blank lines, indentation and repeated whitespace. String literals are left
+untouched. Flattened copies of well-known OpenZeppelin files are replaced by
+their declaration plus a one-line summary of their API. The result keeps a
+line map so findings can be pointed back at the original source.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from app.contract_chunker import estimate_tokens, mask_comments_and_strings, parse_source
+
+# Header comment that OpenZeppelin puts at the top of every file, kept when sources are flattened
+OPENZEPPELIN_MARKER_RE = re.compile(
+    r'OpenZeppelin Contracts(?:\s*\(last updated\s*(v[\w.\-]+)\))?(?:\s*(v[\w.\-]+))?\s*\(([\w/.\-]+\.sol)\)'
+)
+
+# Public surface of the OpenZeppelin libraries and base contracts that show up in flattened sources
+KNOWN_LIBRARIES: Dict[str, str] = {
+    "Context": "_msgSender(), _msgData()",
+    "Ownable": "owner(), onlyOwner, transferOwnership(), renounceOwnership(), _transferOwnership()",
+    "Ownable2Step": "pendingOwner(), transferOwnership() starts a two-step transfer, acceptOwnership()",
+    "AccessControl": "hasRole(), onlyRole, grantRole(), revokeRole(), renounceRole(), _grantRole(), DEFAULT_ADMIN_ROLE",
+    "ReentrancyGuard": "nonReentrant modifier",
+    "Pausable": "paused(), whenNotPaused, whenPaused, _pause(), _unpause()",
+    "SafeMath": "add/sub/mul/div/mod that revert on overflow, try* variants",
+    "SignedSafeMath": "signed add/sub/mul/div that revert on overflow",
+    "SafeCast": "toUintN()/toIntN() downcasts that revert on overflow",
+    "Math": "max(), min(), average(), ceilDiv(), mulDiv(), sqrt(), log2/log10/log256()",
+    "SignedMath": "max(), min(), average(), abs()",
+    "Address": "isContract(), sendValue(), functionCall*(), functionStaticCall(), functionDelegateCall(), verifyCallResult()",
+    "Strings": "toString(), toHexString(), equal()",
+    "Counters": "current(), increment(), decrement(), reset()",
+    "ECDSA": "recover(), tryRecover(), toEthSignedMessageHash(), toTypedDataHash()",
+    "MerkleProof": "verify(), processProof(), multiProofVerify()",
+    "EnumerableSet": "add(), remove(), contains(), length(), at(), values() for Bytes32Set/AddressSet/UintSet",
+    "EnumerableMap": "set(), remove(), contains(), length(), at(), get(), tryGet()",
+    "StorageSlot": "getAddressSlot(), getBooleanSlot(), getBytes32Slot(), getUint256Slot()",
+    "SafeERC20": "safeTransfer(), safeTransferFrom(), safeApprove(), safeIncreaseAllowance(), safeDecreaseAllowance()",
+    "IERC20": "ERC-20 interface",
+    "IERC20Metadata": "ERC-20 name(), symbol(), decimals()",
+    "IERC20Permit": "EIP-2612 permit(), nonces(), DOMAIN_SEPARATOR()",
+    "ERC20": "standard ERC-20; internal _transfer(), _mint(), _burn(), _approve(), _spendAllowance(), "
+             "_beforeTokenTransfer()/_afterTokenTransfer() hooks",
+    "ERC20Burnable": "burn(), burnFrom()",
+    "IERC165": "supportsInterface()",
+    "ERC165": "supportsInterface()",
+    "IERC721": "ERC-721 interface",
+    "IERC721Metadata": "ERC-721 name(), symbol(), tokenURI()",
+    "IERC721Enumerable": "totalSupply(), tokenOfOwnerByIndex(), tokenByIndex()",
+    "IERC721Receiver": "onERC721Received()",
+    "ERC721": "standard ERC-721; internal _safeMint(), _mint(), _burn(), _transfer(), _approve(), _exists(), "
+              "_isApprovedOrOwner(), _beforeTokenTransfer()/_afterTokenTransfer() hooks",
+    "ERC721Enumerable": "ERC-721 enumeration extension",
+    "ERC721URIStorage": "tokenURI() from _setTokenURI() storage",
+    "IERC1155": "ERC-1155 interface",
+    "IERC1155Receiver": "onERC1155Received(), onERC1155BatchReceived()",
+    "ERC1155": "standard ERC-1155; internal _mint(), _mintBatch(), _burn(), _burnBatch(), _setURI()",
+    "Initializable": "initializer, reinitializer, onlyInitializing, _disableInitializers()",
+}
+
+
+@dataclass
+class CompactedSource:
+    text: str
+    line_map: List[int]                 # compacted line index -> original 1-based line number
+    original_tokens: int
+    compacted_tokens: int
+    replaced_libraries: List[str] = field(default_factory=list)
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.compacted_tokens
+
+    def summary(self) -> Dict:
+        return {
+            "original_tokens": self.original_tokens,
+            "compacted_tokens": self.compacted_tokens,
+            "saved_pct": round(100.0 * self.saved_tokens / self.original_tokens, 1) if self.original_tokens else 0.0,
+            "replaced_libraries": self.replaced_libraries,
+        }
+
+
+compaction_stats = {"sources": 0, "original_tokens": 0, "compacted_tokens": 0, "libraries_replaced": 0}
+
+
+def strip_comments(source: str) -> str:
+    """Blank out comments (newlines kept) without touching string literals."""
+    masked = mask_comments_and_strings(source)
+    out = list(source)
+    in_string: Optional[str] = None
+    for i, c in enumerate(source):
+        if c == "\n":
+            in_string = None
+            continue
+        # Strings are kept verbatim in ``masked`` apart from their contents, so a
+        # position is inside a comment when it differs from the source outside a string
+        if in_string:
+            if c == in_string and masked[i] == c:
+                in_string = None
+            continue
+        if c in "\"'" and masked[i] == c:
+            in_string = c
+        elif masked[i] != c:
+            out[i] = " "
+    return "".join(out)
+
+
+def collapse_whitespace(line: str) -> str:
+    """Trim a line and squeeze whitespace runs outside string literals to one space."""
+    parts: List[str] = []
+    i, n = 0, len(line)
+    while i < n:
+        c = line[i]
+        if c in "\"'":
+            j = i + 1
+            while j < n and line[j] != c:
+                j += 2 if line[j] == "\\" else 1
+            parts.append(line[i:j + 1])
+            i = j + 1
+        elif c.isspace():
+            while i < n and line[i].isspace():
+                i += 1
+            parts.append(" ")
+        else:
+            parts.append(c)
+            i += 1
+    return "".join(parts).strip()
+
+
+def _library_reference(block, marker: re.Match) -> str:
+    version = marker.group(1) or marker.group(2) or ""
+    origin = f"OpenZeppelin {marker.group(3)}" + (f" {version}" if version else "")
+    header = collapse_whitespace(strip_comments(block.header).replace("\n", " "))
+    return f"{header} /* {origin}, body omitted: {KNOWN_LIBRARIES[block.name]} */ }}"
+
+
+def _known_library_blocks(source: str) -> Dict[int, tuple]:
+    """
+    Contracts that are flattened, unmodified-looking copies of OpenZeppelin
+    files: the name is known and the file's own OpenZeppelin header comment
+    sits directly above the declaration. Returns ``{header_line: (block, marker)}``.
+    """
+    parsed = parse_source(source)
+    masked = mask_comments_and_strings(source)
+    found = {}
+    previous_end = 0
+    for block in parsed.contracts:
+        gap_start, previous_end = previous_end, block.end
+        if block.name not in KNOWN_LIBRARIES:
+            continue
+        markers = list(OPENZEPPELIN_MARKER_RE.finditer(source, gap_start, block.start))
+        if not markers:
+            continue
+        # Only whole-line blocks can be swapped without disturbing neighbouring code
+        line_start = source.rfind("\n", 0, block.start) + 1
+        line_end = source.find("\n", block.end)
+        line_end = len(source) if line_end == -1 else line_end
+        if masked[line_start:block.start].strip() or masked[block.end:line_end].strip():
+            continue
+        found[block.header_line] = (block, markers[-1])
+    return found
+
+
+def compact_source(source: str, replace_libraries: bool = True) -> CompactedSource:
+    """Compact ``source`` for a prompt; see the module docstring."""
+    libraries = _known_library_blocks(source) if replace_libraries else {}
+    lines = strip_comments(source).split("\n")
+    kept: List[str] = []
+    line_map: List[int] = []
+    replaced: List[str] = []
+    skip_until = 0
+    for number, line in enumerate(lines, 1):
+        if number <= skip_until:
+            continue
+        if number in libraries:
+            block, marker = libraries[number]
+            kept.append(_library_reference(block, marker))
+            line_map.append(number)
+            replaced.append(block.name)
+            skip_until = block.end_line
+            continue
+        compact = collapse_whitespace(line)
+        if compact:
+            kept.append(compact)
+            line_map.append(number)
+
+    text = "\n".join(kept)
+    result = CompactedSource(
+        text=text, line_map=line_map,
+        original_tokens=estimate_tokens(source), compacted_tokens=estimate_tokens(text),
+        replaced_libraries=replaced,
+    )
+    compaction_stats["sources"] += 1
+    compaction_stats["original_tokens"] += result.original_tokens
+    compaction_stats["compacted_tokens"] += result.compacted_tokens
+    compaction_stats["libraries_replaced"] += len(replaced)
+    return result
+
+
+def get_compaction_stats() -> Dict:
+    original = compaction_stats["original_tokens"]
+    return {
+        **compaction_stats,
+        "saved_pct": round(100.0 * (original - compaction_stats["compacted_tokens"]) / original, 1) if original else 0.0,
+    }
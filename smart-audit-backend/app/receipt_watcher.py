@@ -0,0 +1,167 @@
+"""
+Background receipt watcher.
+
+Instead of every deploy or mint polling ``wait_for_transaction_receipt``
+on its own (one coroutine or thread and one request stream per
+transaction), callers register the hash and await a future. A single
+task polls the block number and, once per new block, asks for the
+receipts of every outstanding transaction in JSON-RPC batches of
+``RECEIPT_BATCH_SIZE``; newly registered transactions are also looked up
+on the first poll after they arrive. The task exits when nothing is being
+watched and is restarted by the next ``watch``.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from web3.datastructures import AttributeDict
+from web3.exceptions import TimeExhausted, TransactionNotFound
+
+try:
+    from web3._utils.method_formatters import receipt_formatter
+except ImportError:
+    receipt_formatter = None
+
+from app.chain import get_web3
+from app.config import RECEIPT_BATCH_SIZE, RECEIPT_POLL_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WatchedTransaction:
+    tx_hash: str
+    deadline: float
+    checked: bool = False           # looked up at least once; afterwards only on new blocks
+    futures: List[asyncio.Future] = field(default_factory=list)
+    callbacks: List[Callable] = field(default_factory=list)
+
+
+class ReceiptWatcher:
+    """Resolves receipt futures for all pending transactions from one polling task."""
+
+    def __init__(self, poll_interval: float = RECEIPT_POLL_INTERVAL, batch_size: int = RECEIPT_BATCH_SIZE):
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self._watched: Dict[str, WatchedTransaction] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._last_block: Optional[int] = None
+        self.stats = {"watched": 0, "mined": 0, "timed_out": 0, "polls": 0, "new_blocks": 0,
+                      "receipt_requests": 0, "receipt_lookups": 0, "poll_errors": 0}
+
+    def watch(self, tx_hash: str, timeout: float = 180, callback: Optional[Callable] = None) -> asyncio.Future:
+        """
+        Future resolved with the receipt of ``tx_hash`` (or ``TimeExhausted``
+        after ``timeout`` seconds). ``callback(tx_hash, receipt_or_error)``
+        also runs on resolution, for job records that outlive the request.
+        """
+        tx_hash = tx_hash.lower()
+        future = asyncio.get_running_loop().create_future()
+        entry = self._watched.get(tx_hash)
+        if entry is None:
+            entry = self._watched[tx_hash] = WatchedTransaction(tx_hash, time.monotonic() + timeout)
+            self.stats["watched"] += 1
+        else:
+            entry.deadline = max(entry.deadline, time.monotonic() + timeout)
+        entry.futures.append(future)
+        if callback:
+            entry.callbacks.append(callback)
+        if self._task is None or self._task.done() or self._task.get_loop() is not asyncio.get_running_loop():
+            self._last_block = None
+            self._task = asyncio.ensure_future(self._run())
+        return future
+
+    async def wait_for_receipt(self, tx_hash: str, timeout: float = 180):
+        """Drop-in for ``wait_for_transaction_receipt``; each caller gets its own future."""
+        return await self.watch(tx_hash, timeout)
+
+    def _resolve(self, entry: WatchedTransaction, receipt=None, error: Optional[Exception] = None):
+        self._watched.pop(entry.tx_hash, None)
+        for future in entry.futures:
+            if not future.done():
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(receipt)
+            if error is not None and not future.cancelled():
+                future.exception()      # nobody may be awaiting it any more
+        for callback in entry.callbacks:
+            try:
+                callback(entry.tx_hash, error if error is not None else receipt)
+            except Exception as e:
+                logger.error(f"Receipt callback for {entry.tx_hash} failed: {e}")
+
+    async def _fetch_receipts(self, hashes: List[str]) -> Dict[str, AttributeDict]:
+        """Receipts of the mined transactions among ``hashes``, one batch request per chunk."""
+        w3 = get_web3()
+        found = {}
+        make_batch_request = getattr(w3.provider, "make_batch_request", None)
+        for start in range(0, len(hashes), self.batch_size):
+            chunk = hashes[start:start + self.batch_size]
+            self.stats["receipt_requests"] += 1
+            self.stats["receipt_lookups"] += len(chunk)
+            if make_batch_request is not None and receipt_formatter is not None:
+                # Raw batch: a formatted batch raises for the whole batch if any receipt is missing
+                responses = await make_batch_request([("eth_getTransactionReceipt", [h]) for h in chunk])
+                for tx_hash, response in zip(chunk, responses):
+                    result = response.get("result") if isinstance(response, dict) else None
+                    if result:
+                        found[tx_hash] = AttributeDict.recursive(receipt_formatter(result))
+            else:
+                for tx_hash in chunk:
+                    try:
+                        found[tx_hash] = await w3.eth.get_transaction_receipt(tx_hash)
+                    except TransactionNotFound:
+                        pass
+        return found
+
+    async def _poll_once(self):
+        self.stats["polls"] += 1
+        block = await get_web3().eth.block_number
+        if self._last_block is None or block > self._last_block:
+            self._last_block = block
+            self.stats["new_blocks"] += 1
+            hashes = list(self._watched)
+        else:
+            # A transaction registered after its block was seen would otherwise wait for the next block
+            hashes = [h for h, entry in self._watched.items() if not entry.checked]
+        if not hashes:
+            return
+        receipts = await self._fetch_receipts(hashes)
+        for tx_hash in hashes:
+            if tx_hash in self._watched:
+                self._watched[tx_hash].checked = True
+        for tx_hash, receipt in receipts.items():
+            entry = self._watched.get(tx_hash)
+            if entry is not None:
+                self.stats["mined"] += 1
+                self._resolve(entry, receipt)
+
+    def _expire(self):
+        now = time.monotonic()
+        for entry in [e for e in self._watched.values() if e.deadline <= now]:
+            self.stats["timed_out"] += 1
+            self._resolve(entry, error=TimeExhausted(
+                f"Transaction {entry.tx_hash} is not in the chain after the watch timeout"))
+
+    async def _run(self):
+        while self._watched:
+            # Waiters that all gave up don't need polling
+            for entry in [e for e in self._watched.values() if all(f.done() for f in e.futures) and not e.callbacks]:
+                self._watched.pop(entry.tx_hash, None)
+            try:
+                await self._poll_once()
+            except Exception as e:
+                self.stats["poll_errors"] += 1
+                logger.warning(f"Receipt poll failed: {e}")
+            self._expire()
+            if self._watched:
+                await asyncio.sleep(self.poll_interval)
+
+    def snapshot(self) -> Dict:
+        return {**self.stats, "pending": len(self._watched), "last_block": self._last_block}
+
+
+receipt_watcher = ReceiptWatcher()
@@ -0,0 +1,191 @@
+"""
+Best-of-N remediation.
+
+Several fix candidates are requested from the LLM at once. Each finished
+candidate is compiled with the cached compiler service and, if it compiles,
+checked with Slither, using the audit's detector profile so the original's
+baseline comes from the audit's own (cached) run. The first candidate that
+compiles and has strictly fewer Slither findings than the original wins; the
+remaining candidates are cancelled. If none qualifies within the time budget, the compiling
+candidate with the fewest findings is returned and marked as not accepted.
+Code that solc rejected is never returned; if solc itself is unavailable,
+an unverified candidate is returned and marked as such.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from app.compiler import CompilationError, compile_source
+from app.config import REMEDIATION_CANDIDATES, REMEDIATION_TIME_BUDGET
+from app.llm_rewriter import extract_contract_name, generate_fixed_contract
+from app.slither_runner import count_findings, run_slither_on_source
+
+logger = logging.getLogger(__name__)
+
+
+class RemediationError(Exception):
+    """No fix candidate compiled within the time budget."""
+
+
+@dataclass
+class FixCandidate:
+    index: int
+    fixed_code: str
+    compiled: Optional[bool]            # None if the compiler could not be run
+    findings: Optional[int] = None      # Slither findings; None if not compiled or Slither failed
+    compile_errors: List[str] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def summary(self) -> Dict:
+        return {
+            "candidate": self.index,
+            "compiled": self.compiled,
+            "slither_findings": self.findings,
+            "compile_errors": self.compile_errors[:3],
+            "elapsed_s": round(self.elapsed, 2),
+        }
+
+
+remediation_stats = {
+    "runs": 0,
+    "candidates_started": 0,
+    "candidates_compiled": 0,
+    "candidates_cancelled": 0,
+    "accepted": 0,
+    "not_improved": 0,
+    "none_compiled": 0,
+    "unverified": 0,
+    "budget_exhausted": 0,
+}
+
+
+async def _evaluate_candidate(index: int, original_code: str, contract_name: str,
+                              known_issues: str = "", slither_profile: Optional[str] = None) -> FixCandidate:
+    started = time.monotonic()
+    fixed_code = await generate_fixed_contract(original_code, known_issues)
+    try:
+        await compile_source(fixed_code, f"{contract_name}_fixed_{index}.sol", contract_name=contract_name)
+    except CompilationError as e:
+        errors = [err.get("formattedMessage") or err.get("message", "") for err in e.errors] or [str(e)]
+        return FixCandidate(index, fixed_code, compiled=False, compile_errors=errors,
+                            elapsed=time.monotonic() - started)
+    except Exception as e:
+        logger.warning(f"Could not compile fix candidate {index}: {e}")
+        return FixCandidate(index, fixed_code, compiled=None, compile_errors=[f"compiler unavailable: {e}"],
+                            elapsed=time.monotonic() - started)
+    findings = count_findings(await run_slither_on_source(fixed_code, slither_profile))
+    return FixCandidate(index, fixed_code, compiled=True, findings=findings, elapsed=time.monotonic() - started)
+
+
+def _improves(candidate: FixCandidate, baseline: Optional[int]) -> bool:
+    if not candidate.compiled:
+        return False
+    if baseline is None:
+        # Slither can't score the original, so compiling is the only check left
+        return True
+    return candidate.findings is not None and candidate.findings < baseline
+
+
+async def remediate(original_code: str, candidates: int = REMEDIATION_CANDIDATES,
+                    time_budget: float = REMEDIATION_TIME_BUDGET, known_issues: str = "",
+                    slither_profile: Optional[str] = None) -> Dict:
+    """
+    Return ``{"fixed_code", "accepted", "reason", "baseline_findings",
+    "candidates", "elapsed_s"}`` for the best validated fix candidate.
+    ``known_issues`` is passed on to the fix prompt; ``slither_profile``
+    selects the detectors candidates are scored with.
+    Raises ``RemediationError`` if every candidate failed or was rejected by solc.
+    """
+    remediation_stats["runs"] += 1
+    contract_name = extract_contract_name(original_code)
+    started = time.monotonic()
+    deadline = started + time_budget
+
+    baseline_task = asyncio.ensure_future(run_slither_on_source(original_code, slither_profile))
+    tasks = {
+        asyncio.ensure_future(_evaluate_candidate(i, original_code, contract_name, known_issues, slither_profile)): i
+        for i in range(1, max(1, candidates) + 1)
+    }
+    remediation_stats["candidates_started"] += len(tasks)
+
+    evaluated: List[FixCandidate] = []
+    errors: List[str] = []
+    winner: Optional[FixCandidate] = None
+    baseline: Optional[int] = None
+    pending = set(tasks)
+    try:
+        while pending and winner is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                remediation_stats["budget_exhausted"] += 1
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    logger.warning(f"Fix candidate {tasks[task]} failed: {task.exception()}")
+                    errors.append(str(task.exception()))
+                    continue
+                candidate = task.result()
+                evaluated.append(candidate)
+                if candidate.compiled is False:
+                    logger.info(f"Fix candidate {candidate.index} does not compile")
+                if not candidate.compiled:
+                    continue
+                remediation_stats["candidates_compiled"] += 1
+                if not baseline_task.done():
+                    try:
+                        await asyncio.wait_for(asyncio.shield(baseline_task), deadline - time.monotonic())
+                    except asyncio.TimeoutError:
+                        break
+                baseline = count_findings(baseline_task.result()) if not baseline_task.exception() else None
+                if _improves(candidate, baseline):
+                    winner = candidate
+                    break
+    finally:
+        for task in pending:
+            task.cancel()
+        remediation_stats["candidates_cancelled"] += len(pending)
+        if not baseline_task.done():
+            baseline_task.cancel()
+        elif not baseline_task.cancelled():
+            baseline_task.exception()  # mark as retrieved
+        for task in tasks:
+            if task.done() and not task.cancelled():
+                task.exception()
+
+    compiled = [c for c in evaluated if c.compiled]
+    unverified = [c for c in evaluated if c.compiled is None]
+    if winner is not None:
+        remediation_stats["accepted"] += 1
+        chosen, accepted = winner, True
+        reason = "compiles" if baseline is None else f"compiles with {winner.findings} Slither findings (original: {baseline})"
+    elif compiled:
+        remediation_stats["not_improved"] += 1
+        chosen = min(compiled, key=lambda c: (c.findings is None, c.findings or 0, c.index))
+        accepted = False
+        reason = "no candidate reduced the Slither findings"
+    elif unverified:
+        remediation_stats["unverified"] += 1
+        chosen, accepted = unverified[0], False
+        reason = "compiler unavailable; fix not validated"
+    else:
+        remediation_stats["none_compiled"] += 1
+        detail = "; ".join(errors) or "none of the candidates compiled"
+        raise RemediationError(f"No compiling fix within {time_budget:.0f}s: {detail}")
+
+    logger.info(f"Remediation picked candidate {chosen.index} of {len(tasks)} ({reason})")
+    return {
+        "fixed_code": chosen.fixed_code,
+        "accepted": accepted,
+        "reason": reason,
+        "chosen_candidate": chosen.index,
+        "baseline_findings": baseline,
+        "candidates": [c.summary() for c in evaluated],
+        "elapsed_s": round(time.monotonic() - started, 2),
+    }
+
+
+def get_remediation_stats() -> Dict:
+    return dict(remediation_stats)
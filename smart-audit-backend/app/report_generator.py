@@ -8,6 +8,7 @@ from app.llm_rewriter import (
     extract_contract_name,
     generate_fixed_contract
 )
+import inspect
 import logging
 import re
 import time
@@ -248,7 +249,7 @@ class AuditReportGenerator:
         summary_lines.append("\n" + "="*80 + "\n")
         
         return "".join(summary_lines)
-    def generate_detailed_report(self, original_code: str, vulnerabilities: Dict, 
+    async def generate_detailed_report(self, original_code: str, vulnerabilities: Dict, 
                                fixed_code: str = None, contract_description: str = None,
                                auto_generate_fixed: bool = True) -> str:
         """
@@ -263,7 +264,7 @@ class AuditReportGenerator:
                 try:
                     self.start_timer('code_remediation')
                     logger.info("Auto-generating fixed contract code...")
-                    fixed_code = generate_fixed_contract(original_code, "")
+                    fixed_code = await generate_fixed_contract(original_code, "")
                     self.end_timer('code_remediation')
                     logger.info("Fixed contract code generated successfully")
                 except Exception as e:
@@ -466,7 +467,7 @@ class AuditReportGenerator:
 
             # Change Summary
             try:
-                if changes := get_code_change_summary(original_code, fixed_code):
+                if changes := await get_code_change_summary(original_code, fixed_code):
                     report_lines.append(self.format_subsection_header("📝 Detailed Code Changes"))
                     report_lines.append(f"{self.sanitize_output(changes)}\n")
             except Exception as e:
@@ -486,6 +487,8 @@ class AuditReportGenerator:
                 self.start_timer(timing_key)
                 analysis_code = fixed_code if fixed_code else original_code
                 content = getter(analysis_code)
+                if inspect.isawaitable(content):
+                    content = await content
                 self.end_timer(timing_key)
 
                 if content:
@@ -576,7 +579,7 @@ This automated security audit report was generated using advanced static analysi
         return "".join(card_lines)
 
 
-def generate_report(original_code: str, vulnerabilities, fixed_code: str = None, 
+async def generate_report(original_code: str, vulnerabilities, fixed_code: str = None, 
                    contract_description: str = None, auto_generate_fixed: bool = True) -> str:
     """
     Main function to generate a comprehensive audit report with enhanced formatting.
@@ -588,12 +591,12 @@ def generate_report(original_code: str, vulnerabilities, fixed_code: str = None,
         generator.start_timer('vulnerability_analysis')
         generator.end_timer('vulnerability_analysis')
     
-    return generator.generate_detailed_report(
+    return await generator.generate_detailed_report(
         original_code, vulnerabilities, fixed_code, contract_description, auto_generate_fixed
     )
 
 
-def generate_complete_audit_report(original_code: str, include_fixed_code: bool = True, 
+async def generate_complete_audit_report(original_code: str, include_fixed_code: bool = True, 
                                  include_description: bool = True) -> str:
     """
     Generate a complete audit report with all features enabled and enhanced formatting.
@@ -603,7 +606,7 @@ def generate_complete_audit_report(original_code: str, include_fixed_code: bool
     try:
         # Step 1: Find vulnerabilities
         generator.start_timer('vulnerability_analysis')
-        vulnerabilities = find_vulnerabilities(original_code)
+        vulnerabilities = await find_vulnerabilities(original_code)
         generator.end_timer('vulnerability_analysis')
         
         # Step 2: Get contract description if requested
@@ -611,7 +614,7 @@ def generate_complete_audit_report(original_code: str, include_fixed_code: bool
         if include_description:
             try:
                 generator.start_timer('contract_description')
-                contract_description = get_contract_description(original_code)
+                contract_description = await get_contract_description(original_code)
                 generator.end_timer('contract_description')
             except Exception as e:
                 logger.warning(f"Could not generate contract description: {e}")
@@ -623,14 +626,14 @@ def generate_complete_audit_report(original_code: str, include_fixed_code: bool
             if total_vulns > 0:
                 try:
                     generator.start_timer('code_remediation')
-                    fixed_code = generate_fixed_contract(original_code, "")
+                    fixed_code = await generate_fixed_contract(original_code, "")
                     generator.end_timer('code_remediation')
                     logger.info("Fixed contract code generated successfully")
                 except Exception as e:
                     logger.warning(f"Could not generate fixed code: {e}")
         
         # Step 4: Generate the comprehensive report
-        return generator.generate_detailed_report(
+        return await generator.generate_detailed_report(
             original_code, vulnerabilities, fixed_code, contract_description, False
         )
         
@@ -639,12 +642,12 @@ def generate_complete_audit_report(original_code: str, include_fixed_code: bool
         raise
 
 
-def generate_enhanced_report(original_code: str, vulnerabilities, fixed_code: str = None, 
+async def generate_enhanced_report(original_code: str, vulnerabilities, fixed_code: str = None, 
                            contract_description: str = None, include_metrics: bool = True) -> str:
     """
     Generate an enhanced report with improved formatting and visual appeal.
     """
-    return generate_report(original_code, vulnerabilities, fixed_code, contract_description, True)
+    return await generate_report(original_code, vulnerabilities, fixed_code, contract_description, True)
 
 
 def generate_summary_report(original_code: str, vulnerabilities, fixed_code: str = None) -> str:
@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import APIRouter, File, Form, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
+
+from app.config import BATCH_AUDIT_CONCURRENCY, BATCH_AUDIT_MAX_ITEMS, SLITHER_COMPREHENSIVE_PROFILE
+from app.etherscan import SourceProject
+from app.routes import (
+    comprehensive_audit_response,
+    extract_contract_name,
+    load_verified_project,
+    process_contract_analysis,
+    slither_profile_param,
+)
+from app.shared_state import SharedSemaphore
+from reports.audit_history import record_audit
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Shared by every batch request (in every worker process, with several), so concurrent CI runs can't multiply the load.
+# The TTL only reclaims slots of a hung worker; slots of exited workers are reclaimed at once.
+audit_slots = SharedSemaphore("batch_audits", BATCH_AUDIT_CONCURRENCY, ttl=3600)
+
+
+def parse_addresses(values: Optional[List[str]]) -> List[str]:
+    """Addresses from repeated form fields, each of which may hold a comma/whitespace separated list."""
+    addresses = []
+    for value in values or []:
+        addresses.extend(a for a in value.replace(",", " ").split() if a)
+    return addresses
+
+
+class BatchAuditRun:
+    """One batch: audits every unique source once, within the shared concurrency budget."""
+
+    def __init__(self, slither_profile: str = SLITHER_COMPREHENSIVE_PROFILE):
+        self.slither_profile = slither_profile
+        self._audits: Dict[str, asyncio.Task] = {}
+        self._sources: Dict[str, asyncio.Task] = {}
+        self.unique_sources = 0
+        self.duplicates = 0
+
+    async def _audit(self, source: str, project: Optional[SourceProject]) -> Dict[str, Any]:
+        contract_name = project.contract_name if project else extract_contract_name(source)
+        async with audit_slots.slot():
+            audit_result = await process_contract_analysis(source, contract_name, include_llm_analysis=True,
+                                                           project=project, slither_profile=self.slither_profile)
+        response = comprehensive_audit_response(audit_result)
+        record_audit("batch-audit", source, response)
+        return response
+
+    def audit_source(self, source: str, project: Optional[SourceProject] = None) -> asyncio.Task:
+        key = hashlib.sha256(source.encode("utf-8")).hexdigest()
+        task = self._audits.get(key)
+        if task is None:
+            self.unique_sources += 1
+            task = self._audits[key] = asyncio.ensure_future(self._audit(source, project))
+        else:
+            self.duplicates += 1
+        return task
+
+    def fetch_source(self, address: str) -> asyncio.Task:
+        key = address.lower()
+        if key not in self._sources:
+            self._sources[key] = asyncio.ensure_future(load_verified_project(address))
+        return self._sources[key]
+
+    async def run_item(self, index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+        line = {"type": "result", "index": index, **{k: v for k, v in item.items() if k != "source"}}
+        started = time.monotonic()
+        try:
+            source, project = item.get("source"), None
+            if source is None:
+                project = await asyncio.shield(self.fetch_source(item["address"]))
+                source = project.flatten()
+            task = self.audit_source(source, project)
+            line["source_sha256"] = hashlib.sha256(source.encode("utf-8")).hexdigest()
+            line["result"] = await asyncio.shield(task)
+            line["status"] = "success"
+        except HTTPException as e:
+            line.update(status="error", error=e.detail)
+        except Exception as e:
+            logger.error(f"Batch item {index} failed: {e}")
+            line.update(status="error", error=str(e))
+        line["elapsed_s"] = round(time.monotonic() - started, 3)
+        return line
+
+    def cancel(self):
+        for task in list(self._audits.values()) + list(self._sources.values()):
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()  # mark as retrieved
+
+
+async def stream_batch(items: List[Dict[str, Any]],
+                       slither_profile: str = SLITHER_COMPREHENSIVE_PROFILE) -> AsyncIterator[bytes]:
+    """NDJSON: one result line per item in completion order, then a summary line."""
+    run = BatchAuditRun(slither_profile)
+    started = time.monotonic()
+    item_tasks = [asyncio.ensure_future(run.run_item(i, item)) for i, item in enumerate(items)]
+    succeeded = 0
+    try:
+        for next_done in asyncio.as_completed(item_tasks):
+            line = await next_done
+            succeeded += line["status"] == "success"
+            yield (json.dumps(line, default=str) + "\n").encode("utf-8")
+        yield (json.dumps({
+            "type": "summary",
+            "items": len(items),
+            "succeeded": succeeded,
+            "failed": len(items) - succeeded,
+            "unique_sources": run.unique_sources,
+            "duplicates": run.duplicates,
+            "elapsed_s": round(time.monotonic() - started, 3)
+        }) + "\n").encode("utf-8")
+    finally:
+        # Also runs when the client disconnects mid-stream
+        for task in item_tasks:
+            task.cancel()
+        run.cancel()
+
+
+@router.post("/batch-audit/")
+async def batch_audit(files: Optional[List[UploadFile]] = File(None),
+                      addresses: Optional[List[str]] = Form(None),
+                      slither_profile: Optional[str] = Query(None)):
+    """
+    Comprehensive audit of many uploaded contracts and/or verified deployed
+    contracts in one request. Results stream back as NDJSON as they finish.
+    """
+    slither_profile = slither_profile_param(slither_profile, SLITHER_COMPREHENSIVE_PROFILE)
+    items: List[Dict[str, Any]] = []
+    for file in files or []:
+        try:
+            source = (await file.read()).decode("utf-8")
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail=f"{file.filename} is not UTF-8 text")
+        items.append({"filename": file.filename, "source": source})
+    items.extend({"address": address} for address in parse_addresses(addresses))
+
+    if not items:
+        raise HTTPException(status_code=400, detail="Provide at least one file or address.")
+    if len(items) > BATCH_AUDIT_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"A batch may contain at most {BATCH_AUDIT_MAX_ITEMS} items.")
+
+    return StreamingResponse(stream_batch(items, slither_profile), media_type="application/x-ndjson")
@@ -1,11 +1,14 @@
+import asyncio
 import os
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Query
 from fastapi.responses import JSONResponse
-from app.nft_minter import NFTMinter
 from typing import Dict, Optional, Any
 import logging
 from pydantic import BaseModel
 
+from app import shared_state
+from app.config import NFT_CONTRACT_ADDRESS
+
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -15,14 +18,14 @@ class MintRequestModel(BaseModel):
     recipient: str
     metadata: Dict[str, Any]
     token_uri: Optional[str] = None
-    abi_path: Optional[str] = None
+    abi_path: Optional[str] = None      # a file inside the server's ABI directory; anything else is refused
 
 @router.post("/mint")
 async def mint_nft(request: MintRequestModel = Body(...)):
     """Endpoint to mint NFTs"""
     try:
-        minter = NFTMinter()
-        result = await minter.mint(
+        from app.nft_minter import get_minter     # loads web3 on first use, not at startup
+        result = await get_minter().mint(
             request.contract_address,
             request.recipient,
             request.metadata,
@@ -39,3 +42,43 @@ async def mint_nft(request: MintRequestModel = Body(...)):
     except Exception as e:
         logger.error(f"NFT minting failed: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
+
+
+def _indexed_contract(contract: Optional[str]) -> str:
+    contract = contract or NFT_CONTRACT_ADDRESS
+    if not contract:
+        raise HTTPException(status_code=400, detail="No contract given and NFT_CONTRACT_ADDRESS is not set")
+    return contract
+
+
+@router.get("/owner/{token_id}")
+async def get_token_owner(token_id: int, contract: Optional[str] = Query(None)):
+    """Current owner of a token, from the Transfer-event index (no RPC)"""
+    contract = _indexed_contract(contract)
+    owner, checkpoint = await asyncio.gather(
+        asyncio.to_thread(shared_state.token_owner, contract, token_id),
+        asyncio.to_thread(shared_state.indexer_checkpoint, contract))
+    if owner is None:
+        raise HTTPException(status_code=404, detail=f"Token {token_id} is not in the index")
+    return {"contract": contract, **owner, "indexed_block": checkpoint[0] if checkpoint else None}
+
+
+@router.get("/tokens/{owner}")
+async def get_owner_tokens(owner: str, contract: Optional[str] = Query(None)):
+    """Tokens held by an address, from the Transfer-event index (no RPC)"""
+    contract = _indexed_contract(contract)
+    tokens, checkpoint = await asyncio.gather(
+        asyncio.to_thread(shared_state.owner_tokens, contract, owner),
+        asyncio.to_thread(shared_state.indexer_checkpoint, contract))
+    return {"contract": contract, "owner": owner, "token_ids": tokens, "count": len(tokens),
+            "indexed_block": checkpoint[0] if checkpoint else None}
+
+
+@router.get("/indexer")
+async def get_indexer_status(contract: Optional[str] = Query(None)):
+    """Progress of the Transfer-event index"""
+    contract = _indexed_contract(contract)
+    summary, checkpoint = await asyncio.gather(
+        asyncio.to_thread(shared_state.index_summary, contract),
+        asyncio.to_thread(shared_state.indexer_checkpoint, contract))
+    return {"contract": contract, "indexed_block": checkpoint[0] if checkpoint else None, **summary}
@@ -1,34 +1,49 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Request, Depends
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Request, Query
 from fastapi.responses import JSONResponse
 from typing import Dict, Any, Optional
 import os
+import sys
 import asyncio
 import re
 import logging
 import json
 import requests
 import tempfile
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
-from solcx import compile_standard, install_solc
-from web3 import Web3
-from datetime import datetime, timedelta
+from datetime import datetime
+from app.config import PINATA_GATEWAY_URL, PINATA_TIMEOUT, LLM_SPECULATIVE_FIX, REPORTS_BULK_CHUNK_SIZE, REPORTS_MAX_PAGE_SIZE
+from app.config import SLITHER_COMPREHENSIVE_PROFILE, SLITHER_DEFAULT_PROFILE
 from app.pinata_utils import pin_json_to_pinata, pin_file_to_pinata
-from app.deploy import deploy_fixed_contract, security_checks
-from app.slither_runner import run_slither
+from app.slither_runner import get_slither_stats, resolve_profile, run_slither_on_source, run_slither_on_project
+from app.slither_runner import count_findings, slither_status
+from app.sandbox import get_sandbox_stats
+from app.etherscan import EtherscanError, SourceNotVerifiedError, SourceProject, UnsupportedSourceError
+from app.etherscan import fetch_verified_project, get_etherscan_stats
+from app.compiler import compile_source
 from app.report_generator import generate_report
-from app.llm_rewriter import generate_fixed_contract, get_contract_description, find_vulnerabilities
-from pymongo.database import Database
-from utils.connect_db import get_db
-from reports.save_minting_report import save_minting_report
-from models.report_model import MintingReport 
+from app.llm_rewriter import get_contract_description, find_vulnerabilities, degraded_vulnerability_result
+from app.llm_rewriter import SpeculativeFix, get_speculation_stats
+from app.remediation import remediate, get_remediation_stats
+from app.findings import findings_prompt, normalize_findings
+from app.compiler import get_compiler_stats
+from app.llm_client import get_llm_metrics, track_token_usage
+from app.prompt_compactor import get_compaction_stats
+from app.finding_cache import finding_cache
+from app import shared_state
+# On-chain modules (app.deploy, app.chain, ...) pull in web3, the slowest import by far; they
+# are imported where used so startup and the off-chain audit endpoints don't pay for it
+from reports.minting_reports import find_reports_by_recipient, insert_report, insert_reports, run_db
+from reports.audit_history import find_audits, get_audit, get_history_stats, record_audit
+from models.report_model import MintingReport
+from pydantic import ValidationError
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
-wallet_audit_registry = {}  # Track if a wallet has already audited
-wallet_usage_log = []  
-WALLET_DATA_FILE = Path("wallet_data.json")
+# Free-audit registry and usage log live in app.shared_state, so every worker process sees them
 WHITELISTED_WALLETS = {
     "0xb97fcdcd02fe2b50d8014b80080c904845e027f1",  # replace with your real address 1
     "0x857b213598ed77fb4e862fc4355c13c472b94078",  # replace with address 2
@@ -41,46 +56,40 @@ def extract_contract_name(solidity_code: str) -> str:
     match = re.search(r'contract\s+(\w+)', solidity_code)
     return match.group(1) if match else "Contract"
 
-def clean_old_wallet_entries():
-    """Clean wallet log entries older than 24 hours"""
-    now = datetime.utcnow()
-    wallet_usage_log[:] = [entry for entry in wallet_usage_log if now - entry['timestamp'] < timedelta(hours=24)]
+def llm_analysis_degraded(llm_vulnerabilities: Optional[Dict]) -> bool:
+    """True when the LLM analysis could not run (provider outage), so counts are unknown"""
+    return bool(llm_vulnerabilities) and llm_vulnerabilities.get("analysis_status") == "degraded"
+
+
+def llm_vulnerability_count(llm_vulnerabilities: Optional[Dict]) -> int:
+    """Numeric LLM finding count; unknown counts (degraded or unparseable analysis) count as 0"""
+    total = (llm_vulnerabilities or {}).get("total_vulnerabilities", 0)
+    return total if isinstance(total, int) else 0
+
+
+def llm_risk_score(llm_vulnerabilities: Optional[Dict], default: float = 0) -> float:
+    score = (llm_vulnerabilities or {}).get("overall_risk_score", default)
+    return score if isinstance(score, (int, float)) else default
+
 
 async def async_pin_json_to_pinata(metadata: dict) -> str:
     loop = asyncio.get_event_loop()
     return await loop.run_in_executor(None, pin_json_to_pinata, metadata)
 
-def load_wallet_data():
-    if WALLET_DATA_FILE.exists():
-        print(f"Loading data from: {WALLET_DATA_FILE.absolute()}")  # 🔍 Confirm path
-        with open(WALLET_DATA_FILE, 'r') as file:
-            return json.load(file)
-    return {"wallet_audit_registry": {}, "wallet_usage_log": []}
-
-
-def save_wallet_data(data):
-    with open(WALLET_DATA_FILE, "w") as file:
-        json.dump(data, file, indent=4, default=str)
-
-def clean_old_wallet_entries(data):
-    """Clean wallet log entries older than 24 hours"""
-    now = datetime.utcnow()
-    cleaned_log = [
-        entry for entry in data["wallet_usage_log"]
-        if now - datetime.fromisoformat(entry['timestamp']) < timedelta(hours=24)
-    ]
-    data["wallet_usage_log"] = cleaned_log
-    save_wallet_data(data)
-
-def pin_content_to_pinata(content: str, filename: str) -> str:
+def _pin_content(content: str, filename: str) -> str:
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.sol', delete=False, encoding='utf-8') as temp_file:
+        temp_file.write(content)
+        temp_path = temp_file.name
     try:
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.sol', delete=False, encoding='utf-8') as temp_file:
-            temp_file.write(content)
-            temp_path = temp_file.name
-        try:
-            return pin_file_to_pinata(temp_path, filename)
-        finally:
-            os.unlink(temp_path)
+        return pin_file_to_pinata(temp_path, filename)
+    finally:
+        os.unlink(temp_path)
+
+
+async def pin_content_to_pinata(content: str, filename: str) -> str:
+    # The upload is a blocking requests call; keep it off the event loop
+    try:
+        return await asyncio.to_thread(_pin_content, content, filename)
     except Exception as e:
         logger.error(f"Error pinning content: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -91,62 +100,33 @@ async def compile_contract_file(contract_path: str) -> Dict:
     with open(contract_path, "r", encoding='utf-8') as file:
         source = file.read()
 
-    contract_match = re.search(r'contract\s+(\w+)', source)
-    contract_name = contract_match.group(1) if contract_match else file_name
-
-    solc_version = '0.8.19'
-    pragma = re.search(r'pragma solidity\s+[\^>=]*(\d+\.\d+\.\d*)', source)
-    if pragma:
-        solc_version = pragma.group(1)
-        if len(solc_version.split(".")) == 2:
-            solc_version += ".0"
-
-    install_solc(solc_version)
-
-    compiled = compile_standard({
-        "language": "Solidity",
-        "sources": {f"{file_name}.sol": {"content": source}},
-        "settings": {
-            "optimizer": {"enabled": True, "runs": 200},
-            "outputSelection": {"*": {"*": ["abi", "evm.bytecode", "evm.gasEstimates"]}}
-        }
-    }, solc_version=solc_version)
-
-    compiled_contracts = compiled["contracts"][f"{file_name}.sol"]
-    contract_name = list(compiled_contracts.keys())[0]
-    bytecode_obj = compiled_contracts[contract_name]["evm"]["bytecode"]["object"]
-
-    if not bytecode_obj:
+    compilation = await compile_source(source, f"{file_name}.sol")
+    if not compilation["bytecode"]:
         raise ValueError("Compilation failed: Bytecode is empty.")
 
-    return {
-        "contract_name": contract_name,
-        "file_name": file_name,
-        "bytecode": bytecode_obj,
-        "abi": compiled_contracts[contract_name]["abi"],
-        "gas_estimates": compiled_contracts[contract_name]["evm"]["gasEstimates"],
-        "solc_version": solc_version
-    }
+    return {**compilation, "file_name": file_name}
 
 
-def load_contract_abi_from_pinata(cid: str):
-    url = f"https://gateway.pinata.cloud/ipfs/{cid}"
-    response = requests.get(url)
+async def load_contract_abi_from_pinata(cid: str):
+    url = f"{PINATA_GATEWAY_URL}/ipfs/{cid}"
+    response = await asyncio.to_thread(requests.get, url, timeout=PINATA_TIMEOUT)
     if response.status_code != 200:
         raise HTTPException(status_code=502, detail="Failed to fetch ABI from IPFS")
     data = response.json()
     return data.get("abi")
 
 
-async def run_slither_on_content(content: str, contract_name: str):
+def slither_profile_param(name: Optional[str], default: str = SLITHER_DEFAULT_PROFILE) -> str:
+    """The ``slither_profile`` query parameter, or ``default``; 400 if it names no profile."""
     try:
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.sol', delete=False, encoding='utf-8') as temp_file:
-            temp_file.write(content)
-            temp_path = temp_file.name
-        try:
-            return await asyncio.to_thread(run_slither, temp_path)
-        finally:
-            os.unlink(temp_path)
+        return resolve_profile(name or default)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def run_slither_on_content(content: str, contract_name: str, profile: Optional[str] = None):
+    try:
+        return await run_slither_on_source(content, profile)
     except Exception as e:
         logger.error(f"Slither failed: {e}")
         raise
@@ -158,6 +138,7 @@ async def deploy_contract_from_content(content: str, contract_name: str):
             temp_file.write(content)
             temp_path = temp_file.name
         try:
+            from app.deploy import deploy_fixed_contract
             return await deploy_fixed_contract(temp_path)
         finally:
             os.unlink(temp_path)
@@ -166,109 +147,182 @@ async def deploy_contract_from_content(content: str, contract_name: str):
         raise
 
 
-async def process_contract_analysis(original_code: str, contract_name: str, include_llm_analysis: bool = True) -> Dict[str, Any]:
-    """Enhanced contract analysis with LLM vulnerability detection"""
-    
+async def process_contract_analysis(original_code: str, contract_name: str, include_llm_analysis: bool = True,
+                                    project: Optional[SourceProject] = None,
+                                    slither_profile: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Enhanced contract analysis with LLM vulnerability detection. For verified
+    multi-file contracts, ``original_code`` is the flattened source and Slither
+    runs on ``project`` as laid out on Etherscan. ``slither_profile`` names the
+    Slither detector profile (default ``SLITHER_DEFAULT_PROFILE``).
+    """
+    slither_profile = resolve_profile(slither_profile)
+    with track_token_usage() as token_usage:
+        result = await _process_contract_analysis(original_code, contract_name, include_llm_analysis, project,
+                                                  slither_profile)
+    result["token_usage"] = token_usage
+    return result
+
+
+async def _process_contract_analysis(original_code: str, contract_name: str, include_llm_analysis: bool,
+                                     project: Optional[SourceProject], slither_profile: str) -> Dict[str, Any]:
+    # Most uploads have findings, so start the fix now instead of after detection
+    speculative_fix = (SpeculativeFix(remediate(original_code, slither_profile=slither_profile))
+                       if LLM_SPECULATIVE_FIX else None)
+    # Pin the original contract to IPFS while the analysis runs
+    original_pin = asyncio.ensure_future(pin_content_to_pinata(original_code, f"{contract_name}.sol"))
+    try:
+        return await _analyze_and_fix(original_code, contract_name, include_llm_analysis, speculative_fix, project,
+                                      slither_profile, original_pin)
+    finally:
+        if speculative_fix:
+            speculative_fix.cancel()
+        if not original_pin.done():
+            original_pin.cancel()
+        elif not original_pin.cancelled():
+            original_pin.exception()  # mark as retrieved
+
+
+@contextmanager
+def timed_stage(timings: Dict[str, float], stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = round((time.perf_counter() - started) * 1000, 1)
+
+
+async def _analyze_and_fix(original_code: str, contract_name: str, include_llm_analysis: bool,
+                           speculative_fix: Optional[SpeculativeFix],
+                           project: Optional[SourceProject] = None,
+                           slither_profile: Optional[str] = None,
+                           original_pin: Optional[asyncio.Future] = None) -> Dict[str, Any]:
+    timings: Dict[str, float] = {}
+    if original_pin is None:
+        original_pin = asyncio.ensure_future(pin_content_to_pinata(original_code, f"{contract_name}.sol"))
+
     # Get contract description
-    description = await asyncio.to_thread(get_contract_description, original_code)
-    
-    # Pin original contract to IPFS
-    original_ipfs = pin_content_to_pinata(original_code, f"{contract_name}.sol")
+    with timed_stage(timings, "description"):
+        description = await get_contract_description(original_code)
 
     # Run Slither analysis
-    slither_results = await run_slither_on_content(original_code, contract_name)
+    with timed_stage(timings, "slither"):
+        if project is not None and project.is_multi_file:
+            slither_results = await run_slither_on_project(project, slither_profile)
+        else:
+            slither_results = await run_slither_on_content(original_code, contract_name, slither_profile)
     
     # LLM-based vulnerability analysis
     llm_vulnerabilities = None
     if include_llm_analysis:
-        try:
-            llm_vulnerabilities = await asyncio.to_thread(find_vulnerabilities, original_code)
-            logger.info(f"LLM vulnerability analysis completed for {contract_name}")
-        except Exception as e:
-            logger.error(f"LLM vulnerability analysis failed: {e}")
-            llm_vulnerabilities = {
-                "error": f"LLM analysis failed: {str(e)}",
-                "contract_name": contract_name,
-                "total_vulnerabilities": 0,
-                "overall_risk_score": 0
-            }
+        with timed_stage(timings, "llm_analysis"):
+            try:
+                llm_vulnerabilities = await find_vulnerabilities(original_code)
+                logger.info(f"LLM vulnerability analysis completed for {contract_name}")
+            except Exception as e:
+                logger.error(f"LLM vulnerability analysis failed: {e}")
+                llm_vulnerabilities = degraded_vulnerability_result(contract_name, e)
+
+    # Slither and LLM findings overlap; merge them into one de-duplicated set
+    with timed_stage(timings, "normalize_findings"):
+        findings = normalize_findings(original_code, slither_results, llm_vulnerabilities, contract_name)
 
     # Generate fixed code if vulnerabilities found
-    fixed_code = fixed_uri = None
-    if slither_results or (llm_vulnerabilities and llm_vulnerabilities.get('total_vulnerabilities', 0) > 0):
-        try:
-            fixed_code = await asyncio.to_thread(generate_fixed_contract, original_code, slither_results or "")
-            fixed_ipfs = pin_content_to_pinata(fixed_code, f"{contract_name}_fixed.sol")
-            fixed_uri = f"ipfs://{fixed_ipfs}"
-        except Exception as e:
-            logger.error(f"Failed to generate fixed contract: {e}")
+    fixed_code = fix_validation = None
+    # A Slither error or timeout is a result like any other here: only actual findings call for a fix
+    if count_findings(slither_results) or llm_vulnerability_count(llm_vulnerabilities) > 0:
+        with timed_stage(timings, "remediation"):
+            try:
+                known_issues = findings_prompt(findings)
+                remediation = None
+                if speculative_fix:
+                    # The speculative prompt had no findings to go on: unless its fix validated,
+                    # give the prompt with the merged findings its turn
+                    remediation = await speculative_fix.take(
+                        usable=lambda result: result["accepted"] or not known_issues)
+                if remediation is None:
+                    remediation = await remediate(original_code, known_issues=known_issues,
+                                                  slither_profile=slither_profile)
+                fixed_code = remediation.pop("fixed_code")
+                fix_validation = remediation
+            except Exception as e:
+                logger.error(f"Failed to generate fixed contract: {e}")
+    elif speculative_fix:
+        speculative_fix.discard()
 
     # Generate report
-    report = generate_report(original_code, slither_results, fixed_code)
-    report_ipfs = pin_content_to_pinata(report, f"{contract_name}_report.md")
-    
+    with timed_stage(timings, "report"):
+        report = await generate_report(original_code, findings, fixed_code, auto_generate_fixed=False)
+
+    # The original has been uploading since the start; the report and fixed code upload together
+    with timed_stage(timings, "pin"):
+        original_ipfs, report_ipfs, fixed_ipfs = await asyncio.gather(
+            original_pin,
+            pin_content_to_pinata(report, f"{contract_name}_report.md"),
+            pin_content_to_pinata(fixed_code, f"{contract_name}_fixed.sol") if fixed_code else asyncio.sleep(0),
+            return_exceptions=True
+        )
+    for pinned in (original_ipfs, report_ipfs):
+        if isinstance(pinned, BaseException):
+            raise pinned
+    if isinstance(fixed_ipfs, BaseException):
+        logger.error(f"Failed to pin fixed contract: {fixed_ipfs}")
+        fixed_ipfs = None
+    fixed_uri = f"ipfs://{fixed_ipfs}" if fixed_ipfs else None
+
     # Security checks
-    sec_checks = await security_checks(original_code)
+    with timed_stage(timings, "security_checks"):
+        from app.deploy import security_checks
+        sec_checks = await security_checks(original_code)
 
     return {
         "contract_name": contract_name,
         "contract_description": description,
         "slither_vulnerabilities": slither_results,
+        "slither_profile": slither_profile,
         "llm_vulnerabilities": llm_vulnerabilities,
+        "findings": findings,
         "fixed_code": fixed_code,
+        "fix_validation": fix_validation,
         "original_uri": f"ipfs://{original_ipfs}",
         "fixed_uri": fixed_uri,
         "report_uri": f"ipfs://{report_ipfs}",
         "security_checks": sec_checks,
+        "stage_timings_ms": timings,
         "analysis_summary": {
-            "slither_issues_found": bool(slither_results),
+            "slither_issues_found": bool(count_findings(slither_results)),
+            "slither_status": slither_status(slither_results),
+            "unique_findings": findings["total_vulnerabilities"],
             "llm_vulnerabilities_found": llm_vulnerabilities.get('total_vulnerabilities', 0) if llm_vulnerabilities else 0,
             "overall_risk_score": llm_vulnerabilities.get('overall_risk_score', 0) if llm_vulnerabilities else 0,
-            "severity_breakdown": llm_vulnerabilities.get('severity_breakdown', {}) if llm_vulnerabilities else {}
+            "severity_breakdown": llm_vulnerabilities.get('severity_breakdown', {}) if llm_vulnerabilities else {},
+            "llm_analysis_status": llm_vulnerabilities.get('analysis_status', 'complete') if llm_vulnerabilities else 'skipped'
         }
     }
 @router.post("/audit-only/", response_model=Dict[str, Any])
-async def audit_only(request: Request, file: UploadFile = File(...)):
+async def audit_only(request: Request, file: UploadFile = File(...), slither_profile: Optional[str] = Query(None)):
+    slither_profile = slither_profile_param(slither_profile)
     try:
         wallet_address = request.headers.get("wallet-address")
         if not wallet_address:
             raise HTTPException(status_code=400, detail="Wallet address is required in headers")
 
-        # Load wallet data from JSON
-        wallet_data = load_wallet_data()
-        clean_old_wallet_entries(wallet_data)
-
-        # Restriction 1: One audit per wallet
+        # One free audit per wallet, max 100 unique wallets per 24 hours; checked and
+        # registered atomically in the shared store so concurrent workers can't both pass
         is_whitelisted = wallet_address.lower() in WHITELISTED_WALLETS
-        if not is_whitelisted:
-            if wallet_address in wallet_data["wallet_audit_registry"]:
-                raise HTTPException(status_code=403, detail="Your free audit trial exceeded.")
-
-        # Restriction 2: Max 100 unique wallets per 24 hours
-        unique_wallets = {entry['wallet'] for entry in wallet_data["wallet_usage_log"]}
-        remaining_slots = 100 - len(unique_wallets)
-
-        if not is_whitelisted and len(unique_wallets) >= 100:
-            raise HTTPException(status_code=403, detail="Daily wallet limit reached. Please try again in 24 hours.")
-
+        allowed, reason, remaining_slots = await asyncio.to_thread(
+            shared_state.claim_wallet_audit, wallet_address, is_whitelisted)
+        if not allowed:
+            raise HTTPException(status_code=403, detail=reason)
 
         # 🔥 Log remaining wallets count live
         logger.info(f"Remaining wallets for today: {remaining_slots} out of 100")
 
-        # Register wallet usage
-        if not is_whitelisted:
-    
-            wallet_data["wallet_audit_registry"][wallet_address] = True
-            
-            wallet_data["wallet_usage_log"].append({'wallet': wallet_address, 'timestamp': datetime.utcnow().isoformat()})
-
-        # Save back to JSON
-        save_wallet_data(wallet_data)
-
         # Continue with your existing audit process
         original_code = (await file.read()).decode("utf-8")
         contract_name = extract_contract_name(original_code)
-        audit_result = await process_contract_analysis(original_code, contract_name, include_llm_analysis=True)
+        audit_result = await process_contract_analysis(original_code, contract_name, include_llm_analysis=True,
+                                                       slither_profile=slither_profile)
 
         llm_vulns = audit_result.get("llm_vulnerabilities", {})
         critical_high_vulns = 0
@@ -276,13 +330,23 @@ async def audit_only(request: Request, file: UploadFile = File(...)):
             severity = llm_vulns.get('severity_breakdown', {})
             critical_high_vulns = severity.get('critical', 0) + severity.get('high', 0)
 
-        deployment_ready = bool(audit_result.get("fixed_code")) and critical_high_vulns == 0
+        degraded = llm_analysis_degraded(llm_vulns)
+        deployment_ready = bool(audit_result.get("fixed_code")) and critical_high_vulns == 0 and not degraded
 
-        return {
+        if degraded:
+            message = "Audit incomplete: AI vulnerability analysis is temporarily unavailable. Please try again later."
+        elif llm_vulns:
+            message = f"Audit complete. Found {llm_vulns.get('total_vulnerabilities', 0)} vulnerabilities."
+        else:
+            message = "Audit complete."
+
+        response = {
             **audit_result,
             "deployment_ready": deployment_ready,
-            "message": f"Audit complete. Found {llm_vulns.get('total_vulnerabilities', 0)} vulnerabilities." if llm_vulns else "Audit complete."
+            "message": message
         }
+        record_audit("audit-only", original_code, response, wallet=wallet_address)
+        return response
     except HTTPException as http_exc:
         logger.error(f"Audit failed: {http_exc.detail}")
         raise http_exc  # Return the HTTPException with your message (status code is not shown to user by default)
@@ -299,7 +363,9 @@ async def analyze_vulnerabilities_only(file: UploadFile = File(...)):
         contract_name = extract_contract_name(original_code)
         
         # Run LLM vulnerability analysis
-        vulnerability_results = await asyncio.to_thread(find_vulnerabilities, original_code)
+        vulnerability_results = await find_vulnerabilities(original_code)
+        if llm_analysis_degraded(vulnerability_results):
+            raise HTTPException(status_code=503, detail=vulnerability_results["summary"])
         
         return {
             "status": "success",
@@ -307,6 +373,8 @@ async def analyze_vulnerabilities_only(file: UploadFile = File(...)):
             "vulnerability_analysis": vulnerability_results,
             "message": f"Found {vulnerability_results.get('total_vulnerabilities', 0)} potential vulnerabilities"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Vulnerability analysis failed: {e}")
         raise HTTPException(status_code=500, detail=f"Vulnerability analysis failed: {str(e)}")
@@ -320,11 +388,13 @@ async def quick_security_scan(file: UploadFile = File(...)):
         contract_name = extract_contract_name(original_code)
         
         # Run LLM vulnerability analysis
-        vulnerability_results = await asyncio.to_thread(find_vulnerabilities, original_code)
+        vulnerability_results = await find_vulnerabilities(original_code)
+        if llm_analysis_degraded(vulnerability_results):
+            raise HTTPException(status_code=503, detail=vulnerability_results["summary"])
         
         # Extract key metrics
         total_vulns = vulnerability_results.get('total_vulnerabilities', 0)
-        risk_score = vulnerability_results.get('overall_risk_score', 0)
+        risk_score = llm_risk_score(vulnerability_results)
         severity = vulnerability_results.get('severity_breakdown', {})
         
         # Determine risk level
@@ -356,6 +426,8 @@ async def quick_security_scan(file: UploadFile = File(...)):
             "detailed_analysis": vulnerability_results,
             "message": f"Security scan complete. Risk level: {risk_level}"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Quick security scan failed: {e}")
         raise HTTPException(status_code=500, detail=f"Security scan failed: {str(e)}")
@@ -366,7 +438,7 @@ async def get_contract_description_endpoint(file: UploadFile = File(...)):
     try:
         original_code = (await file.read()).decode("utf-8")
         contract_name = extract_contract_name(original_code)
-        description = await asyncio.to_thread(get_contract_description, original_code)
+        description = await get_contract_description(original_code)
 
         return {
             "status": "success",
@@ -380,42 +452,55 @@ async def get_contract_description_endpoint(file: UploadFile = File(...)):
 
 
 @router.post("/comprehensive-audit/", response_model=Dict[str, Any])
-async def comprehensive_audit(file: UploadFile = File(...)):
+async def comprehensive_audit(file: UploadFile = File(...), slither_profile: Optional[str] = Query(None)):
     """Most comprehensive audit combining Slither + LLM analysis"""
+    slither_profile = slither_profile_param(slither_profile, SLITHER_COMPREHENSIVE_PROFILE)
     try:
         original_code = (await file.read()).decode("utf-8")
         contract_name = extract_contract_name(original_code)
         
         # Run comprehensive analysis
-        audit_result = await process_contract_analysis(original_code, contract_name, include_llm_analysis=True)
-        
-        # Enhanced response with comparative analysis
-        slither_issues = bool(audit_result.get("slither_vulnerabilities"))
-        llm_vulns = audit_result.get("llm_vulnerabilities", {})
-        llm_issues = llm_vulns.get('total_vulnerabilities', 0) > 0
-        
-        return {
-            **audit_result,
-            "audit_type": "comprehensive",
-            "analysis_methods": ["slither", "llm"],
-            "comparative_results": {
-                "slither_found_issues": slither_issues,
-                "llm_found_issues": llm_issues,
-                "consensus": slither_issues and llm_issues,
-                "total_unique_findings": llm_vulns.get('total_vulnerabilities', 0)
-            },
-            "recommendations": {
-                "immediate_action_required": llm_vulns.get('severity_breakdown', {}).get('critical', 0) > 0,
-                "deployment_recommended": llm_vulns.get('overall_risk_score', 10) < 5,
-                "further_review_needed": llm_vulns.get('overall_risk_score', 0) >= 7
-            },
-            "message": "Comprehensive audit completed with both static analysis and AI-powered vulnerability detection"
-        }
+        audit_result = await process_contract_analysis(original_code, contract_name, include_llm_analysis=True,
+                                                       slither_profile=slither_profile)
+        response = comprehensive_audit_response(audit_result)
+        record_audit("comprehensive-audit", original_code, response)
+        return response
     except Exception as e:
         logger.error(f"Comprehensive audit failed: {e}")
         raise HTTPException(status_code=500, detail=f"Comprehensive audit failed: {str(e)}")
 
 
+def comprehensive_audit_response(audit_result: Dict[str, Any]) -> Dict[str, Any]:
+    """Enhanced response with comparative analysis"""
+    slither_issues = bool(count_findings(audit_result.get("slither_vulnerabilities")))
+    llm_vulns = audit_result.get("llm_vulnerabilities", {})
+    llm_issues = llm_vulnerability_count(llm_vulns) > 0
+    degraded = llm_analysis_degraded(llm_vulns)
+
+    return {
+        **audit_result,
+        "audit_type": "comprehensive",
+        "analysis_methods": ["slither", "llm"],
+        "comparative_results": {
+            "slither_found_issues": slither_issues,
+            "llm_found_issues": llm_issues,
+            "consensus": slither_issues and llm_issues,
+            "total_unique_findings": audit_result.get("findings", {}).get("total_vulnerabilities", 0),
+            "found_by_both": audit_result.get("findings", {}).get("source_counts", {}).get("found_by_both", 0)
+        },
+        "recommendations": {
+            "immediate_action_required": llm_vulns.get('severity_breakdown', {}).get('critical', 0) > 0,
+            "deployment_recommended": not degraded and llm_risk_score(llm_vulns, 10) < 5,
+            "further_review_needed": degraded or llm_risk_score(llm_vulns) >= 7
+        },
+        "message": (
+            "Comprehensive audit incomplete: static analysis ran, but AI-powered vulnerability detection is temporarily unavailable"
+            if degraded else
+            "Comprehensive audit completed with both static analysis and AI-powered vulnerability detection"
+        )
+    }
+
+
 @router.post("/pin-metadata/", response_model=Dict[str, Any])
 async def pin_metadata(metadata: Dict[str, Any]):
     try:
@@ -437,7 +522,7 @@ async def get_nft_config():
         cid = os.getenv("NFT_CONTRACT_ABI_CID")
         if not addr or not cid:
             raise HTTPException(status_code=404, detail="NFT config missing")
-        abi = load_contract_abi_from_pinata(cid)
+        abi = await load_contract_abi_from_pinata(cid)
         return {
             "nft_contract_address": addr,
             "nft_abi": abi,
@@ -454,37 +539,14 @@ async def compile_only(file: UploadFile = File(...)):
         content = (await file.read()).decode("utf-8")
         filename = file.filename or "Contract.sol"
 
-        pragma = re.search(r'pragma solidity\s+[\^>=]*(\d+\.\d+\.\d*)', content)
-        solc_version = pragma.group(1) if pragma else "0.8.19"
-        if len(solc_version.split(".")) == 2:
-            solc_version += ".0"
-
-        install_solc(solc_version)
-
-        compiled = compile_standard({
-            "language": "Solidity",
-            "sources": {
-                filename: {
-                    "content": content
-                }
-            },
-            "settings": {
-                "optimizer": {"enabled": True, "runs": 200},
-                "outputSelection": {
-                    "*": {"*": ["abi", "evm.bytecode"]}
-                }
-            }
-        }, solc_version=solc_version)
-
-        contract_name = list(compiled["contracts"][filename].keys())[0]
-        contract_data = compiled["contracts"][filename][contract_name]
+        compilation = await compile_source(content, filename)
 
         return {
             "status": "success",
-            "contract_name": contract_name,
-            "abi": contract_data["abi"],
-            "bytecode": contract_data["evm"]["bytecode"]["object"],
-            "solc_version": solc_version
+            "contract_name": compilation["contract_name"],
+            "abi": compilation["abi"],
+            "bytecode": compilation["bytecode"],
+            "solc_version": compilation["solc_version"]
         }
     except Exception as e:
         logger.exception("Compilation failed")
@@ -517,17 +579,54 @@ async def get_vulnerability_statistics():
     }
     
     
+@router.get("/llm-metrics/", response_model=Dict[str, Any])
+async def llm_metrics():
+    """Per-model latency statistics, hedging counters and token usage for the LLM integration"""
+    return {
+        "status": "success",
+        **get_llm_metrics(),
+        "prompt_compaction": get_compaction_stats(),
+        "finding_cache": finding_cache.snapshot(),
+        "speculative_fix": {"enabled": LLM_SPECULATIVE_FIX, **get_speculation_stats()},
+        "remediation": get_remediation_stats(),
+        "compiler": get_compiler_stats(),
+        "etherscan": get_etherscan_stats(),
+        "audit_history": get_history_stats(),
+        "slither": get_slither_stats(),
+        "sandbox": get_sandbox_stats(),
+        **chain_metrics()
+    }
+
+
+def chain_metrics() -> Dict[str, Any]:
+    """Stats of the on-chain components, without importing them (and web3) if nothing has used them yet."""
+    if "app.chain" not in sys.modules:
+        return {"chain": {"loaded": False}}
+    from app.chain import get_chain_stats
+    from app.mint_queue import mint_queue
+    from app.nft_minter import get_minter
+    from app.nonce_manager import nonce_manager
+    from app.receipt_watcher import receipt_watcher
+    from app.rpc_batching import get_rpc_stats
+    metrics = {
+        "chain": {"loaded": True, **get_chain_stats()},
+        "nonces": nonce_manager.snapshot(),
+        "receipts": receipt_watcher.snapshot(),
+        "rpc": get_rpc_stats(),
+        "mint_queue": mint_queue.snapshot(),
+        "minter": get_minter().snapshot()
+    }
+    indexer = sys.modules["app.transfer_indexer"].get_indexer() if "app.transfer_indexer" in sys.modules else None
+    if indexer is not None:
+        metrics["transfer_indexer"] = indexer.snapshot()
+    return metrics
+
+
 @router.get("/audit-wallets/", response_model=Dict[str, Any])
 async def get_audit_wallets():
     """View wallets that have performed audits"""
     try:
-        wallet_data = load_wallet_data()
-        clean_old_wallet_entries(wallet_data)
-        return {
-            "audited_wallets": list(wallet_data["wallet_audit_registry"].keys()),
-            "wallet_usage_log": wallet_data["wallet_usage_log"],
-            "unique_wallets_last_24_hours": len({entry['wallet'] for entry in wallet_data["wallet_usage_log"]})
-        }
+        return await asyncio.to_thread(shared_state.wallet_summary)
     except Exception as e:
         logger.error(f"Error fetching audit wallets: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -535,73 +634,174 @@ async def get_audit_wallets():
 @router.post("/minting-report")
 async def create_minting_report(report: MintingReport, request: Request):
     try:
-        report_dict = report.dict()
-        report_dict["recipient"] = report_dict["recipient"].lower()
-        
-        # Check if this is a duplicate before saving
-        db = get_db()
-        existing = db["reports"].find_one({
-            "transaction_hash": report_dict["transaction_hash"],
-            "token_id": report_dict["token_id"]
-        })
-        
-        if existing:
+        report_id, is_duplicate = await run_db(insert_report, report.dict())
+        if is_duplicate:
             return JSONResponse(
                 status_code=200,
                 content={
                     "message": "This NFT minting record already exists",
-                    "id": str(existing["_id"]),
+                    "id": report_id,
                     "is_duplicate": True
                 }
             )
-            
-        inserted_id = save_minting_report(report_dict)
-        return {"message": "Minting report saved", "id": inserted_id}
-        
+        return {"message": "Minting report saved", "id": report_id}
+
     except Exception as e:
         raise HTTPException(
             status_code=400,
             detail=f"Failed to save minting report: {str(e)}"
         )
 
+async def _bulk_report_records(request: Request):
+    """Raw report records from a JSON array body, or line by line from an NDJSON stream."""
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+        if buffer.strip():
+            yield buffer
+        return
+    try:
+        records = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if not isinstance(records, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array of minting reports")
+    for record in records:
+        yield record
+
+@router.post("/minting-reports/bulk")
+async def bulk_create_minting_reports(request: Request):
+    """
+    Backfill many minting reports at once, from a JSON array or an NDJSON
+    stream (``Content-Type: application/x-ndjson``). Records are written
+    with unordered bulk inserts of ``REPORTS_BULK_CHUNK_SIZE``; ones already
+    stored are counted as duplicates, so re-sending a backfill is safe.
+    """
+    summary = {"received": 0, "inserted": 0, "duplicates": 0, "invalid": 0, "failed": 0, "errors": []}
+    chunk, chunk_indexes = [], []
+
+    async def flush():
+        result = await run_db(insert_reports, chunk)
+        summary["inserted"] += result["inserted"]
+        summary["duplicates"] += result["duplicates"]
+        summary["failed"] += len(result["errors"])
+        summary["errors"].extend({**err, "index": chunk_indexes[err["index"]]} for err in result["errors"])
+        chunk.clear()
+        chunk_indexes.clear()
+
+    async for record in _bulk_report_records(request):
+        index = summary["received"]
+        summary["received"] += 1
+        try:
+            report = MintingReport(**(json.loads(record) if isinstance(record, bytes) else record))
+        except ValidationError as e:
+            summary["invalid"] += 1
+            summary["errors"].append({"index": index, "error": "; ".join(
+                f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())})
+            continue
+        except (TypeError, ValueError) as e:
+            summary["invalid"] += 1
+            summary["errors"].append({"index": index, "error": f"Invalid record: {e}"})
+            continue
+        chunk.append(report.dict())
+        chunk_indexes.append(index)
+        if len(chunk) >= REPORTS_BULK_CHUNK_SIZE:
+            await flush()
+    if chunk:
+        await flush()
+
+    logger.info(f"Bulk minting reports: {summary['inserted']} inserted, {summary['duplicates']} duplicates, "
+                f"{summary['invalid']} invalid of {summary['received']}")
+    return summary
+
 @router.get("/minting-reports/{recipient}")
-async def get_reports_by_recipient(recipient: str, db: Database = Depends(get_db)):
-    reports_collection = db["reports"]
-    normalized_recipient = recipient.lower()
-    reports = list(reports_collection.find({"recipient": normalized_recipient}))
+async def get_reports_by_recipient(
+    recipient: str,
+    limit: int = Query(50, ge=1, le=REPORTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated report fields to return"),
+    order: str = Query("desc", pattern="^(asc|desc)$")
+):
+    """Reports minted to ``recipient``, one page at a time; follow ``next_cursor`` for more."""
+    try:
+        return await run_db(
+            find_reports_by_recipient,
+            recipient,
+            limit=limit,
+            cursor=cursor,
+            fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None,
+            newest_first=order == "desc"
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/audits")
+async def search_audits(
+    wallet: Optional[str] = None,
+    source_hash: Optional[str] = Query(None, description="SHA-256 of the audited source (hex)"),
+    contract_name: Optional[str] = None,
+    severity: Optional[str] = Query(None, description="Audits with at least one finding of this severity"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    q: Optional[str] = Query(None, description="Text search over finding titles and descriptions"),
+    limit: int = Query(50, ge=1, le=REPORTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    """Stored audits matching every given filter, newest first; follow ``next_cursor`` for more."""
+    try:
+        return await run_db(find_audits, wallet=wallet, source_hash=source_hash, contract_name=contract_name,
+                            severity=severity, since=since, until=until, q=q, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    for report in reports:
-        report["_id"] = str(report["_id"])
 
-    return {"reports": reports}
+@router.get("/audits/{audit_id}")
+async def get_stored_audit(audit_id: str, include_report: bool = True):
+    """One stored audit, including the full original response unless ``include_report`` is false."""
+    try:
+        audit = await run_db(get_audit, audit_id, include_report)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if audit is None:
+        raise HTTPException(status_code=404, detail="Audit not found")
+    return audit
+
+
+async def load_verified_project(address: str) -> SourceProject:
+    """Verified sources from Etherscan, with lookup failures mapped to HTTP errors."""
+    try:
+        return await fetch_verified_project(address)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SourceNotVerifiedError:
+        raise HTTPException(status_code=404, detail="Verified source code not found for this contract.")
+    except UnsupportedSourceError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except EtherscanError as e:
+        logger.error(f"Etherscan lookup for {address} failed: {e}")
+        raise HTTPException(status_code=502, detail="Could not fetch the contract source from Etherscan.")
+
 
 @router.post("/audit-deployed-contract/", response_model=Dict[str, Any])
-async def audit_deployed_contract(payload: Dict[str, str]):
+async def audit_deployed_contract(payload: Dict[str, str], slither_profile: Optional[str] = Query(None)):
+    slither_profile = slither_profile_param(slither_profile)
     try:
         address = payload.get("address", "").strip()
         if not address:
             raise HTTPException(status_code=400, detail="Contract address is required.")
         
-        ETHERSCAN_API_KEY = os.getenv("ETHERSCAN_API_KEY")
-        etherscan_url = f"https://api-sepolia.etherscan.io/api"
-
-        params = {
-            "module": "contract",
-            "action": "getsourcecode",
-            "address": address,
-            "apikey": ETHERSCAN_API_KEY
-        }
-
-        response = requests.get(etherscan_url, params=params)
-        data = response.json()
-
-        if data["status"] != "1" or not data["result"] or not data["result"][0]["SourceCode"]:
-            raise HTTPException(status_code=404, detail="Verified source code not found for this contract.")
-
-        source_code = data["result"][0]["SourceCode"]
-        contract_name = extract_contract_name(source_code)
+        project = await load_verified_project(address)
+        source_code = project.flatten()
+        contract_name = project.contract_name or extract_contract_name(source_code)
 
-        audit_result = await process_contract_analysis(source_code, contract_name, include_llm_analysis=True)
+        audit_result = await process_contract_analysis(source_code, contract_name, include_llm_analysis=True,
+                                                       project=project, slither_profile=slither_profile)
 
         llm_vulns = audit_result.get("llm_vulnerabilities", {})
         critical_high_vulns = 0
@@ -609,14 +809,23 @@ async def audit_deployed_contract(payload: Dict[str, str]):
             severity = llm_vulns.get('severity_breakdown', {})
             critical_high_vulns = severity.get('critical', 0) + severity.get('high', 0)
 
-        deployment_ready = bool(audit_result.get("fixed_code")) and critical_high_vulns == 0
+        degraded = llm_analysis_degraded(llm_vulns)
+        deployment_ready = bool(audit_result.get("fixed_code")) and critical_high_vulns == 0 and not degraded
 
-        return {
+        response = {
             **audit_result,
             "deployment_ready": deployment_ready,
-            "message": f"Audit of deployed contract complete. Found {llm_vulns.get('total_vulnerabilities', 0)} vulnerabilities."
+            "message": (
+                "Audit of deployed contract incomplete: AI vulnerability analysis is temporarily unavailable."
+                if degraded else
+                f"Audit of deployed contract complete. Found {llm_vulns.get('total_vulnerabilities', 0)} vulnerabilities."
+            )
         }
+        record_audit("audit-deployed-contract", source_code, response, contract_address=address)
+        return response
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Deployed contract audit failed: {e}")
         raise HTTPException(status_code=500, detail="Something went wrong during deployed contract audit.")
@@ -0,0 +1,147 @@
+"""
+JSON-RPC request coalescing for the shared L1X provider.
+
+``BatchingHTTPProvider`` holds each request for ``RPC_BATCH_WINDOW``
+seconds. Requests issued concurrently in that window (e.g. chain id, gas
+price, nonce and gas estimate gathered before a transaction) go out as one
+JSON-RPC batch; a lone request is sent as a plain call. Independent calls
+only coalesce if the caller issues them concurrently, so preflight code
+gathers them.
+
+``rpc_operation(name)`` tags the requests made inside it and counts the
+logical calls against the HTTP round trips they actually cost. Totals per
+operation are always kept; with ``RPC_BATCH_MEASURE`` each operation is
+also logged and returned to the caller.
+"""
+import asyncio
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from web3 import AsyncHTTPProvider
+
+from app.config import RPC_BATCH_MAX_SIZE, RPC_BATCH_MEASURE, RPC_BATCH_WINDOW
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OperationStats:
+    name: str
+    calls: int = 0
+    round_trips: int = 0
+    closed: bool = False
+
+    def summary(self) -> Dict:
+        return {
+            "operation": self.name,
+            "rpc_calls": self.calls,
+            "round_trips": self.round_trips,
+            "round_trips_saved": self.calls - self.round_trips,
+        }
+
+
+_current_operation: ContextVar[Optional[OperationStats]] = ContextVar("rpc_operation", default=None)
+rpc_stats: Dict[str, Any] = {"calls": 0, "round_trips": 0, "batches": 0, "largest_batch": 0, "operations": {}}
+
+
+@contextmanager
+def rpc_operation(name: str) -> Iterator[OperationStats]:
+    """Count the RPC calls and round trips of everything awaited inside the block."""
+    stats = OperationStats(name)
+    token = _current_operation.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_operation.reset(token)
+        stats.closed = True     # background tasks started inside may outlive the operation
+        totals = rpc_stats["operations"].setdefault(name, {"count": 0, "rpc_calls": 0, "round_trips": 0})
+        totals["count"] += 1
+        totals["rpc_calls"] += stats.calls
+        totals["round_trips"] += stats.round_trips
+        if RPC_BATCH_MEASURE:
+            logger.info(f"RPC {name}: {stats.calls} calls in {stats.round_trips} round trips "
+                        f"({stats.calls - stats.round_trips} saved)")
+
+
+def _record(operations: List[Optional[OperationStats]]):
+    rpc_stats["calls"] += len(operations)
+    rpc_stats["round_trips"] += 1
+    seen: Set[int] = set()
+    for op in operations:
+        if op is None or op.closed:
+            continue
+        op.calls += 1
+        if id(op) not in seen:
+            seen.add(id(op))
+            op.round_trips += 1
+
+
+class BatchingHTTPProvider(AsyncHTTPProvider):
+    """AsyncHTTPProvider that coalesces concurrent requests into JSON-RPC batches."""
+
+    def __init__(self, *args, batch_window: float = RPC_BATCH_WINDOW,
+                 max_batch_size: int = RPC_BATCH_MAX_SIZE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self._queue: List[Tuple[str, Any, asyncio.Future, Optional[OperationStats]]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    async def make_request(self, method, params):
+        operation = _current_operation.get()
+        if self.batch_window <= 0:
+            _record([operation])
+            return await super().make_request(method, params)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((method, params, future, operation))
+        if len(self._queue) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._queue = self._queue, []
+        if batch:
+            asyncio.ensure_future(self._send(batch))
+
+    async def _send(self, batch: List[Tuple[str, Any, asyncio.Future, Optional[OperationStats]]]):
+        _record([operation for _, _, _, operation in batch])
+        try:
+            if len(batch) == 1:
+                method, params, _, _ = batch[0]
+                responses = [await super().make_request(method, params)]
+            else:
+                rpc_stats["batches"] += 1
+                rpc_stats["largest_batch"] = max(rpc_stats["largest_batch"], len(batch))
+                responses = await super().make_batch_request([(method, params) for method, params, _, _ in batch])
+                if not isinstance(responses, list):
+                    # The node rejected the batch as a whole
+                    responses = [responses] * len(batch)
+        except Exception as e:
+            for _, _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future, _), response in zip(batch, responses):
+            if not future.done():
+                future.set_result(response)
+
+
+def get_rpc_stats() -> Dict:
+    return {
+        "batch_window_s": RPC_BATCH_WINDOW,
+        **rpc_stats,
+        "round_trips_saved": rpc_stats["calls"] - rpc_stats["round_trips"],
+        "operations": {
+            name: {**totals, "round_trips_saved": totals["rpc_calls"] - totals["round_trips"]}
+            for name, totals in rpc_stats["operations"].items()
+        },
+    }
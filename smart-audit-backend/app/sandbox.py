@@ -0,0 +1,341 @@
+"""
+Resource-limited worker processes for analysis jobs (Slither runs, solc compiles).
+
+Jobs run in a small pool of long-lived worker processes instead of the web
+server. Each worker is the leader of its own process group and runs under
+an address-space limit (``SANDBOX_MEMORY_LIMIT_MB``) and a per-job CPU-time
+limit (``SANDBOX_CPU_LIMIT``); both are inherited by the tools it starts.
+The caller waits at most ``timeout`` seconds of wall-clock time. When a job
+overruns, the worker's whole process group (worker, slither, solc) is
+killed and a fresh worker is started in its place; the caller gets
+``SandboxTimeout``. A worker that dies mid-job (rlimit hit, OOM kill) is
+replaced the same way and reported as ``SandboxCrash``. Workers are also
+recycled after ``SANDBOX_MAX_JOBS`` jobs.
+
+Workers are fresh interpreters (``python -m app.sandbox``) that receive
+pickled jobs over their stdin and reply over stdout, so starting one
+neither forks the threaded server nor re-imports the app. On Windows, or
+with ``SANDBOX_ENABLED=false``, jobs run in a thread of this process as
+before.
+"""
+import asyncio
+import importlib
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Connection
+from typing import Callable, Dict, List, Optional
+
+from app.config import SANDBOX_CPU_LIMIT, SANDBOX_ENABLED, SANDBOX_MAX_JOBS, SANDBOX_MEMORY_LIMIT_MB, SANDBOX_WORKERS
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Imported by each worker before it takes jobs, so the first job doesn't pay for them
+PRELOAD_MODULES = ("app.slither_runner", "app.compiler")
+
+
+class SandboxTimeout(Exception):
+    """The job didn't finish within its wall-clock timeout; its worker was killed."""
+
+
+class SandboxCrash(Exception):
+    """The worker died during the job (resource limit, OOM kill, crash)."""
+
+
+class SandboxJobError(Exception):
+    """The job raised; the message carries the worker-side exception."""
+
+
+def analysis_timeout(tool: str, seconds: float) -> Dict:
+    """Structured result for an analysis that ran out of time, in place of its findings."""
+    return {"error": "Analysis timed out", "details": f"{tool} did not finish within {seconds:.0f}s",
+            "timed_out": True}
+
+
+def analysis_crashed(tool: str, reason: str) -> Dict:
+    """Structured result for an analysis whose worker died (usually a memory or CPU limit)."""
+    return {"error": "Analysis aborted", "details": f"{tool} worker died: {reason}", "resource_limit": True}
+
+
+def _limit_memory(limit_mb: int):
+    if resource is not None and limit_mb > 0:
+        limit = limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _limit_cpu(seconds: int):
+    # RLIMIT_CPU counts the worker's whole lifetime, so move the soft limit along with each job
+    if resource is None or seconds <= 0:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = int(usage.ru_utime + usage.ru_stime) + seconds
+    hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _worker_main():
+    """Entry point of a worker process (``python -m app.sandbox``), serving jobs over stdin/stdout."""
+    # The pipes carry pickled jobs and results; anything a job prints goes to stderr instead
+    requests, replies = os.dup(0), os.dup(1)
+    os.dup2(2, 1)
+    with open(os.devnull, "rb") as devnull:
+        os.dup2(devnull.fileno(), 0)
+    conn_in, conn_out = Connection(requests, writable=False), Connection(replies, readable=False)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)    # the server shuts workers down itself
+    _limit_memory(int(os.environ.get("SANDBOX_WORKER_MEMORY_MB", "0")))
+    cpu_limit = int(os.environ.get("SANDBOX_WORKER_CPU_S", "0"))
+    for module in PRELOAD_MODULES:
+        importlib.import_module(module)
+    while True:
+        try:
+            fn, args, kwargs = conn_in.recv()
+        except (EOFError, OSError):
+            return      # server went away
+        _limit_cpu(cpu_limit)
+        try:
+            reply = (True, fn(*args, **kwargs))
+        except BaseException as e:
+            reply = (False, f"{type(e).__name__}: {e}")
+        try:
+            conn_out.send(reply)
+        except Exception as e:
+            conn_out.send((False, f"Unpicklable job result: {e}"))
+
+
+class _Worker:
+    def __init__(self):
+        env = dict(os.environ, SANDBOX_WORKER_MEMORY_MB=str(SANDBOX_MEMORY_LIMIT_MB),
+                   SANDBOX_WORKER_CPU_S=str(SANDBOX_CPU_LIMIT))
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [BACKEND_ROOT, env.get("PYTHONPATH")]))
+        # Own session and process group: one kill reaches the worker and every tool it started
+        self.process = subprocess.Popen([sys.executable, "-m", "app.sandbox"], cwd=BACKEND_ROOT, env=env,
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, start_new_session=True)
+        self.conn_out = Connection(os.dup(self.process.stdin.fileno()), readable=False)
+        self.conn_in = Connection(os.dup(self.process.stdout.fileno()), writable=False)
+        self.process.stdin.close()
+        self.process.stdout.close()
+        self.jobs = 0
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def call(self, fn: Callable, args, kwargs, timeout: float):
+        self.jobs += 1
+        try:
+            self.conn_out.send((fn, args, kwargs))
+            ready = self.conn_in.poll(timeout)
+            if ready:
+                ok, payload = self.conn_in.recv()
+        except (EOFError, OSError):
+            raise SandboxCrash(_exit_reason(self._wait(1)))
+        if not ready:
+            raise SandboxTimeout(f"no result within {timeout:.0f}s")
+        if not ok:
+            raise SandboxJobError(payload)
+        return payload
+
+    def _wait(self, timeout: float) -> Optional[int]:
+        try:
+            return self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            return None
+
+    def kill(self):
+        if self.alive():
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self._wait(5)
+        self.conn_in.close()
+        self.conn_out.close()
+
+
+def _exit_reason(exitcode: Optional[int]) -> str:
+    if exitcode is None:
+        return "unknown"
+    if exitcode < 0:
+        try:
+            return f"killed by {signal.Signals(-exitcode).name}"
+        except ValueError:
+            return f"killed by signal {-exitcode}"
+    return f"exit status {exitcode}"
+
+
+class SandboxPool:
+    """Up to ``size`` worker processes, started on demand and replaced when killed."""
+
+    def __init__(self, size: int = SANDBOX_WORKERS):
+        self.size = max(1, size)
+        self._idle: List[_Worker] = []
+        self._workers: List[_Worker] = []
+        self._lock = threading.Lock()
+        # Waits for job results without tying up the default executor
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="sandbox")
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {"jobs": 0, "job_errors": 0, "timeouts": 0, "crashes": 0, "workers_started": 0,
+                      "workers_replaced": 0, "workers_recycled": 0, "busy_seconds": 0.0}
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore, self._semaphore_loop = asyncio.Semaphore(self.size), loop
+        return self._semaphore
+
+    def _start_worker(self) -> _Worker:
+        worker = _Worker()
+        with self._lock:
+            self._workers.append(worker)
+            self.stats["workers_started"] += 1
+        return worker
+
+    def _checkout(self) -> _Worker:
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.alive():
+                    return worker
+                self._workers.remove(worker)
+        return self._start_worker()
+
+    def _discard(self, worker: _Worker, replace: bool):
+        worker.kill()
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+        if replace:
+            self.stats["workers_replaced"] += 1
+            # Warm a replacement right away so the next job doesn't wait for it
+            self._executor.submit(self._replenish)
+
+    def _replenish(self):
+        with self._lock:
+            if len(self._workers) >= self.size:
+                return
+        try:
+            worker = self._start_worker()
+        except Exception as e:
+            logger.warning(f"Could not start a replacement sandbox worker: {e}")
+            return
+        with self._lock:
+            self._idle.append(worker)
+
+    def _run(self, fn: Callable, args, kwargs, timeout: float):
+        worker = self._checkout()
+        started = time.monotonic()
+        try:
+            result = worker.call(fn, args, kwargs, timeout)
+        except SandboxTimeout:
+            self.stats["timeouts"] += 1
+            logger.warning(f"Sandbox job {getattr(fn, '__name__', fn)} timed out after {timeout:.0f}s; "
+                           f"killing worker {worker.process.pid}")
+            self._discard(worker, replace=True)
+            raise
+        except SandboxCrash as e:
+            self.stats["crashes"] += 1
+            logger.warning(f"Sandbox worker {worker.process.pid} died running {getattr(fn, '__name__', fn)}: {e}")
+            self._discard(worker, replace=True)
+            raise
+        except SandboxJobError:
+            self.stats["job_errors"] += 1
+            self._release(worker)
+            raise
+        finally:
+            self.stats["busy_seconds"] += time.monotonic() - started
+        self._release(worker)
+        return result
+
+    def _release(self, worker: _Worker):
+        if worker.jobs >= SANDBOX_MAX_JOBS > 0:
+            self.stats["workers_recycled"] += 1
+            self._discard(worker, replace=False)
+            return
+        with self._lock:
+            self._idle.append(worker)
+
+    async def run(self, fn: Callable, *args, timeout: float, **kwargs):
+        """``fn(*args, **kwargs)`` in a worker process; ``fn`` and its result must be picklable."""
+        async with self._get_semaphore():
+            self.stats["jobs"] += 1
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._run, fn, args, kwargs, timeout)
+
+    def shutdown(self):
+        with self._lock:
+            workers, self._workers, self._idle = self._workers, [], []
+        for worker in workers:
+            worker.kill()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            alive = sum(w.alive() for w in self._workers)
+            idle = len(self._idle)
+        return {
+            **self.stats,
+            "busy_seconds": round(self.stats["busy_seconds"], 2),
+            "size": self.size,
+            "workers": alive,
+            "idle": idle,
+            "memory_limit_mb": SANDBOX_MEMORY_LIMIT_MB,
+            "cpu_limit_s": SANDBOX_CPU_LIMIT,
+        }
+
+
+def sandbox_available() -> bool:
+    return SANDBOX_ENABLED and os.name == "posix"
+
+
+_pool: Optional[SandboxPool] = None
+_pool_pid: Optional[int] = None
+
+
+def get_pool() -> SandboxPool:
+    # Per process: pre-forked server workers each start their own pool
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        _pool, _pool_pid = SandboxPool(), os.getpid()
+    return _pool
+
+
+async def run_sandboxed(fn: Callable, *args, timeout: float, **kwargs):
+    """
+    Run ``fn(*args, **kwargs)`` in a resource-limited worker process.
+    Raises ``SandboxTimeout`` after ``timeout`` seconds, ``SandboxCrash`` if
+    the worker died and ``SandboxJobError`` if ``fn`` raised. Without
+    sandbox support the call runs in a thread, with no limits.
+    """
+    if not sandbox_available():
+        try:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+        except Exception as e:
+            raise SandboxJobError(f"{type(e).__name__}: {e}") from e
+    return await get_pool().run(fn, *args, timeout=timeout, **kwargs)
+
+
+def shutdown_sandbox():
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.shutdown()
+
+
+def get_sandbox_stats() -> Dict:
+    if not sandbox_available():
+        return {"enabled": False}
+    return {"enabled": True, **(get_pool().snapshot() if _pool is not None else {"workers": 0})}
+
+
+if __name__ == "__main__":
+    _worker_main()
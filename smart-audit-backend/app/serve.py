@@ -0,0 +1,160 @@
+"""
+Pre-fork multi-process server: ``python -m app.serve --workers 4``.
+
+The parent binds the listening socket, imports the whole app (including
+the modules that are otherwise loaded lazily, such as web3), installs and
+indexes the solc binaries, loads the on-disk Etherscan cache and then
+freezes the GC, before forking. Workers start with all of that already in
+memory, shared copy-on-write, and accept from the same socket; each runs
+its own event loop, so loop-bound clients and pools are created per
+worker on first use. State that must agree across workers lives in
+``app.shared_state`` (with a single worker, limits and breakers stay in
+memory). The parent restarts workers that die and forwards
+SIGINT/SIGTERM for a graceful shutdown.
+"""
+import argparse
+import asyncio
+import gc
+import importlib
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+
+import uvicorn
+
+from app.config import SERVER_WORKERS, SOLC_PRELOAD_VERSIONS
+
+logger = logging.getLogger("app.serve")
+
+# Imported lazily by a single-process server; preloaded here so every worker shares them
+PRELOAD_MODULES = (
+    "app.main",
+    "app.chain",
+    "app.deploy",
+    "app.nonce_manager",
+    "app.receipt_watcher",
+    "app.mint_queue",
+    "app.nft_minter",
+    "app.transfer_indexer",
+    "pymongo",
+    "bson",
+)
+
+
+async def warm_caches():
+    from app import etherscan
+    from app.compiler import DEFAULT_SOLC_VERSION, ensure_solc
+
+    for version in SOLC_PRELOAD_VERSIONS or [DEFAULT_SOLC_VERSION]:
+        try:
+            await ensure_solc(version)
+        except Exception as e:
+            logger.warning(f"Could not preload solc {version}: {e}")
+    loaded = etherscan.preload_cache()
+    if loaded:
+        logger.info(f"Preloaded {loaded} Etherscan projects")
+
+
+def preload():
+    started = time.perf_counter()
+    for module in PRELOAD_MODULES:
+        importlib.import_module(module)
+    asyncio.run(warm_caches())
+    from app import shared_state
+    shared_state.close()    # creates the schema; workers open their own connections
+    # Objects that exist now are never collected, so the GC doesn't touch (and un-share) their pages
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Preloaded app in {time.perf_counter() - started:.2f}s")
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, log_level: str):
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    from app.main import app
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level, lifespan="on"))
+    server.run(sockets=[sock])
+
+
+def spawn(sock: socket.socket, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(sock, log_level)
+        except BaseException:
+            logger.exception("Worker crashed")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def serve(host: str, port: int, workers: int, log_level: str = "info"):
+    from app import shared_state
+    # Inherited by the workers: limits and breakers only go through the database if there are several
+    shared_state.set_worker_processes(workers)
+    sock = bind_socket(host, port)
+    preload()
+    children: Dict[int, float] = {}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for _ in range(workers):
+        children[spawn(sock, log_level)] = time.monotonic()
+    logger.info(f"Serving on http://{host}:{port} with {workers} workers")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        logger.warning(f"Worker {pid} exited with status {status}; restarting")
+        if time.monotonic() - started < 1:
+            time.sleep(1)       # don't spin if workers die on startup
+        children[spawn(sock, log_level)] = time.monotonic()
+    sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the API from pre-forked worker processes")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    serve(args.host, args.port, max(1, args.workers), args.log_level)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
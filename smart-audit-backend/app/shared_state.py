@@ -0,0 +1,572 @@
+"""
+Cross-process state for multi-worker serving.
+
+Everything that must agree across requests *and* across worker processes
+lives in one SQLite database (``SHARED_STATE_DB``, WAL mode) instead of
+module globals or JSON files: the free-audit wallet registry and usage
+log, the service account's nonce floor, rate-limit token buckets,
+concurrency slots (the OpenRouter in-flight ceiling, the batch-audit cap),
+the OpenRouter circuit breakers and adaptive limit, the NFT Transfer-event
+index and leases that elect one worker for singleton background jobs.
+Each read-modify-write is one ``BEGIN IMMEDIATE`` transaction, so
+concurrent workers serialize on the database rather than overwrite each
+other. Deliberately process-local: caches (compiled contracts, findings,
+Etherscan sources, ABIs), the per-model latency samples that set the hedge
+delay, metrics counters and token-usage logs, the Slither/solc sandbox
+pools and the per-audit LLM chunk fan-out (``LLM_CHUNK_CONCURRENCY``,
+bounded by the shared OpenRouter ceiling anyway). They only affect speed
+or reporting, not correctness or the load sent to third parties.
+
+Rate limits, concurrency slots and circuit breakers only go through the
+database when ``app.serve`` runs more than one worker (``multi_process``);
+a single process keeps their in-memory, event-driven versions and makes
+no SQLite round trips for them.
+
+Connections are per thread and per process (never inherited across a
+fork). The functions here block; async callers use ``asyncio.to_thread``
+(``SharedSemaphore`` does so itself).
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from app.config import SHARED_STATE_BUSY_TIMEOUT, SHARED_STATE_DB
+
+logger = logging.getLogger(__name__)
+
+LEGACY_WALLET_FILE = Path("wallet_data.json")      # pre-sqlite wallet store, imported once
+WALLET_WINDOW = timedelta(hours=24)
+# A claimed nonce is sent (and counted by the node) within moments; a floor above the chain's
+# count that hasn't moved for this long is left over from a crash, not a live reservation
+NONCE_CLAIM_HOLD = 30.0
+# Past checkpoints whose block hashes are kept, so a reorg can be traced back to the last block
+# both chains share; a reorg deeper than all of them rescans the contract from its start block
+INDEXER_HASH_HISTORY = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS wallet_audits (wallet TEXT PRIMARY KEY, audited_at TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS wallet_usage (wallet TEXT NOT NULL, used_at TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS wallet_usage_used_at ON wallet_usage (used_at);
+CREATE TABLE IF NOT EXISTS nonces (address TEXT PRIMARY KEY, next_nonce INTEGER NOT NULL, claimed_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS token_buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS slots (
+    name TEXT NOT NULL, holder TEXT NOT NULL, pid INTEGER NOT NULL, expires_at REAL NOT NULL,
+    PRIMARY KEY (name, holder)
+);
+CREATE TABLE IF NOT EXISTS shared_values (name TEXT PRIMARY KEY, value TEXT NOT NULL, updated_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS nft_transfers (
+    contract TEXT NOT NULL, block_number INTEGER NOT NULL, log_index INTEGER NOT NULL, tx_hash TEXT NOT NULL,
+    token_id TEXT NOT NULL, from_address TEXT NOT NULL, to_address TEXT NOT NULL, reported INTEGER NOT NULL,
+    PRIMARY KEY (contract, block_number, log_index)
+);
+CREATE INDEX IF NOT EXISTS nft_transfers_token ON nft_transfers (contract, token_id, block_number, log_index);
+CREATE INDEX IF NOT EXISTS nft_transfers_unreported ON nft_transfers (contract, block_number) WHERE reported = 0;
+CREATE TABLE IF NOT EXISTS nft_owners (
+    contract TEXT NOT NULL, token_id TEXT NOT NULL, owner TEXT NOT NULL,
+    minted_block INTEGER, updated_block INTEGER NOT NULL, PRIMARY KEY (contract, token_id)
+);
+CREATE INDEX IF NOT EXISTS nft_owners_owner ON nft_owners (contract, owner);
+CREATE TABLE IF NOT EXISTS indexer_checkpoints (
+    contract TEXT PRIMARY KEY, block_number INTEGER NOT NULL, block_hash TEXT, updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS indexer_block_hashes (
+    contract TEXT NOT NULL, block_number INTEGER NOT NULL, block_hash TEXT NOT NULL,
+    PRIMARY KEY (contract, block_number)
+);
+"""
+
+_worker_processes = 1       # set by app.serve before it forks
+_local = threading.local()
+_schema_ready_pid = None
+_schema_lock = threading.Lock()
+
+
+def _connection() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+    Path(SHARED_STATE_DB).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(SHARED_STATE_DB, timeout=SHARED_STATE_BUSY_TIMEOUT, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    _local.conn, _local.pid = conn, os.getpid()
+    _ensure_schema(conn)
+    return conn
+
+
+def _ensure_schema(conn: sqlite3.Connection):
+    global _schema_ready_pid
+    with _schema_lock:
+        if _schema_ready_pid == os.getpid():
+            return
+        conn.executescript(SCHEMA)
+        _import_legacy_wallets(conn)
+        _schema_ready_pid = os.getpid()
+
+
+def _import_legacy_wallets(conn: sqlite3.Connection):
+    if not LEGACY_WALLET_FILE.exists() or conn.execute("SELECT 1 FROM wallet_audits LIMIT 1").fetchone():
+        return
+    try:
+        with open(LEGACY_WALLET_FILE, "r") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Could not import {LEGACY_WALLET_FILE}: {e}")
+        return
+    now = datetime.utcnow().isoformat()
+    with transaction(conn):
+        for wallet, audited_at in data.get("wallet_audit_registry", {}).items():
+            conn.execute("INSERT OR IGNORE INTO wallet_audits VALUES (?, ?)",
+                         (wallet, audited_at if isinstance(audited_at, str) else now))
+        for entry in data.get("wallet_usage_log", []):
+            conn.execute("INSERT INTO wallet_usage VALUES (?, ?)", (entry["wallet"], entry["timestamp"]))
+    logger.info(f"Imported wallet registry from {LEGACY_WALLET_FILE}")
+
+
+def set_worker_processes(count: int):
+    global _worker_processes
+    _worker_processes = max(1, count)
+
+
+def multi_process() -> bool:
+    """True in the workers of a multi-process ``app.serve``: limits must then be shared."""
+    return _worker_processes > 1
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection = None) -> Iterator[sqlite3.Connection]:
+    """Write transaction that takes the database lock up front, so read-modify-write is atomic."""
+    conn = conn or _connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def close():
+    """Close this thread's connection (e.g. in the parent before forking workers)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+# --- Free-audit wallet registry ---
+
+def claim_wallet_audit(wallet: str, whitelisted: bool, daily_limit: int = 100) -> Tuple[bool, str, int]:
+    """
+    Check and register a free audit for ``wallet`` in one step:
+    (allowed, reason, remaining wallet slots in the last 24 hours).
+    A wallet gets one free audit; at most ``daily_limit`` distinct wallets
+    per 24 hours. Whitelisted wallets are neither limited nor recorded.
+    """
+    now = datetime.utcnow()
+    with transaction() as conn:
+        conn.execute("DELETE FROM wallet_usage WHERE used_at < ?", ((now - WALLET_WINDOW).isoformat(),))
+        unique_wallets = conn.execute("SELECT COUNT(DISTINCT wallet) FROM wallet_usage").fetchone()[0]
+        remaining = daily_limit - unique_wallets
+        if whitelisted:
+            return True, "Wallet is whitelisted.", remaining
+        if conn.execute("SELECT 1 FROM wallet_audits WHERE wallet = ?", (wallet,)).fetchone():
+            return False, "Your free audit trial exceeded.", remaining
+        if unique_wallets >= daily_limit:
+            return False, "Daily wallet limit reached. Please try again in 24 hours.", remaining
+        conn.execute("INSERT INTO wallet_audits VALUES (?, ?)", (wallet, now.isoformat()))
+        conn.execute("INSERT INTO wallet_usage VALUES (?, ?)", (wallet, now.isoformat()))
+        return True, "Audit allowed.", remaining
+
+
+def wallet_summary() -> Dict:
+    cutoff = (datetime.utcnow() - WALLET_WINDOW).isoformat()
+    conn = _connection()
+    usage = conn.execute("SELECT wallet, used_at FROM wallet_usage WHERE used_at >= ? ORDER BY used_at",
+                         (cutoff,)).fetchall()
+    return {
+        "audited_wallets": [row[0] for row in conn.execute("SELECT wallet FROM wallet_audits ORDER BY audited_at")],
+        "wallet_usage_log": [{"wallet": wallet, "timestamp": used_at} for wallet, used_at in usage],
+        "unique_wallets_last_24_hours": len({wallet for wallet, _ in usage}),
+    }
+
+
+# --- Nonce floor shared by all workers signing with the same account ---
+
+def claim_nonce(address: str, nonce: int) -> int:
+    """Reserve the lowest nonce >= ``nonce`` that no worker has claimed yet."""
+    address = address.lower()
+    with transaction() as conn:
+        row = conn.execute("SELECT next_nonce FROM nonces WHERE address = ?", (address,)).fetchone()
+        claimed = max(nonce, row[0]) if row else nonce
+        conn.execute("INSERT OR REPLACE INTO nonces VALUES (?, ?, ?)", (address, claimed + 1, time.time()))
+        return claimed
+
+
+def release_nonce(address: str, nonce: int):
+    """Give ``nonce`` back if it is still the most recent claim."""
+    with transaction() as conn:
+        conn.execute("UPDATE nonces SET next_nonce = ? WHERE address = ? AND next_nonce = ?",
+                     (nonce, address.lower(), nonce + 1))
+
+
+def sync_nonce(address: str, chain_nonce: int, reset: bool = False):
+    """
+    Align the shared floor with the chain's pending count. Normally it only
+    moves up (other workers may hold reservations above the chain count);
+    ``reset`` lowers it too, closing gaps left by dropped or released nonces.
+    """
+    address = address.lower()
+    now = time.time()
+    with transaction() as conn:
+        row = conn.execute("SELECT next_nonce, claimed_at FROM nonces WHERE address = ?", (address,)).fetchone()
+        if reset or not row or now - row[1] > NONCE_CLAIM_HOLD:
+            floor, claimed_at = chain_nonce, now
+        else:
+            floor, claimed_at = max(chain_nonce, row[0]), row[1]
+        conn.execute("INSERT OR REPLACE INTO nonces VALUES (?, ?, ?)", (address, floor, claimed_at))
+
+
+# --- Rate limiting shared across workers ---
+
+def take_token(name: str, rate: float, capacity: float) -> float:
+    """Take one token from bucket ``name``; 0 on success, else seconds until one is available."""
+    now = time.time()
+    with transaction() as conn:
+        row = conn.execute("SELECT tokens, updated_at FROM token_buckets WHERE name = ?", (name,)).fetchone()
+        tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+        wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+        if wait == 0.0:
+            tokens -= 1
+        conn.execute("INSERT OR REPLACE INTO token_buckets VALUES (?, ?, ?)", (name, tokens, now))
+        return wait
+
+
+# --- Leases: one worker runs a singleton background job, another takes over if it stops renewing ---
+
+def acquire_lease(name: str, holder: str, ttl: float) -> bool:
+    """Take or renew lease ``name`` for ``ttl`` seconds; False while another holder's lease is live."""
+    with transaction() as conn:
+        return _hold_lease(conn, name, holder, ttl)
+
+
+def _hold_lease(conn: sqlite3.Connection, name: str, holder: str, ttl: float) -> bool:
+    now = time.time()
+    row = conn.execute("SELECT holder, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+    if row and row[0] != holder and row[1] > now:
+        return False
+    conn.execute("INSERT OR REPLACE INTO leases VALUES (?, ?, ?)", (name, holder, now + ttl))
+    return True
+
+
+def release_lease(name: str, holder: str):
+    with transaction() as conn:
+        conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+
+# --- Concurrency slots: a counting semaphore across workers ---
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def acquire_slot(name: str, holder: str, limit: int, ttl: float) -> bool:
+    """
+    Take one of ``limit`` slots of ``name`` for ``holder``; False if all are
+    held. Slots of processes that are gone, or older than ``ttl`` seconds,
+    are reclaimed first.
+    """
+    now = time.time()
+    with transaction() as conn:
+        conn.execute("DELETE FROM slots WHERE name = ? AND expires_at < ?", (name, now))
+        for (pid,) in conn.execute("SELECT DISTINCT pid FROM slots WHERE name = ?", (name,)).fetchall():
+            if not _process_alive(pid):
+                conn.execute("DELETE FROM slots WHERE name = ? AND pid = ?", (name, pid))
+        in_use = conn.execute("SELECT COUNT(*) FROM slots WHERE name = ?", (name,)).fetchone()[0]
+        if in_use >= limit:
+            return False
+        conn.execute("INSERT OR REPLACE INTO slots VALUES (?, ?, ?, ?)", (name, holder, os.getpid(), now + ttl))
+        return True
+
+
+def release_slot(name: str, holder: str):
+    with transaction() as conn:
+        conn.execute("DELETE FROM slots WHERE name = ? AND holder = ?", (name, holder))
+
+
+class SharedSemaphore:
+    """
+    ``asyncio.Semaphore`` whose count holds across all worker processes.
+    Waiters in this process queue on a local lock and only the head of the
+    queue polls the database, backing off up to ``max_poll_interval``; a
+    release in this process wakes it at once. ``limit`` may be a callable,
+    evaluated (in a worker thread) before each attempt, for limits that
+    change at run time. In a single process a plain ``asyncio.Semaphore``
+    (of ``limit``, which must then be an int) is used instead.
+    """
+    _holder_ids = itertools.count(1)
+
+    def __init__(self, name: str, limit: Union[int, Callable[[], int]], ttl: float,
+                 poll_interval: float = 0.05, max_poll_interval: float = 0.5):
+        self.name = name
+        self.limit = limit
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.held = 0
+        self.stats = {"acquired": 0, "queued": 0}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._released: Optional[asyncio.Event] = None
+        self._local: Optional[asyncio.Semaphore] = None
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._lock, self._released, self._loop = asyncio.Lock(), asyncio.Event(), loop
+            self._local = asyncio.Semaphore(self.limit) if isinstance(self.limit, int) else None
+
+    def _try_acquire(self, holder: str) -> bool:
+        limit = self.limit() if callable(self.limit) else self.limit
+        return acquire_slot(self.name, holder, limit, self.ttl)
+
+    async def acquire(self) -> str:
+        """Wait for a slot; returns the holder id to pass to ``release``."""
+        self._bind_loop()
+        if not multi_process():
+            if self._local.locked():
+                self.stats["queued"] += 1
+            await self._local.acquire()
+            self.held += 1
+            self.stats["acquired"] += 1
+            return ""
+        holder = f"{os.getpid()}-{next(self._holder_ids)}"
+        delay = self.poll_interval
+        queued = False
+        async with self._lock:
+            while True:
+                # Slots freed in this process from here on wake the waiter; other workers' releases are polled for
+                self._released.clear()
+                try:
+                    acquired = await asyncio.to_thread(self._try_acquire, holder)
+                except asyncio.CancelledError:
+                    # The thread may still take the slot; give it back once it has
+                    asyncio.get_running_loop().run_in_executor(None, release_slot, self.name, holder)
+                    raise
+                if acquired:
+                    self.held += 1
+                    self.stats["acquired"] += 1
+                    return holder
+                if not queued:
+                    queued = True
+                    self.stats["queued"] += 1
+                try:
+                    await asyncio.wait_for(self._released.wait(), delay)
+                except asyncio.TimeoutError:
+                    delay = min(self.max_poll_interval, delay * 2)
+
+    async def release(self, holder: str):
+        self.held -= 1
+        if not multi_process():
+            self._local.release()
+            return
+        await asyncio.to_thread(release_slot, self.name, holder)
+        if self._released is not None:
+            self._released.set()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[str]:
+        holder = await self.acquire()
+        try:
+            yield holder
+        finally:
+            await self.release(holder)
+
+    def snapshot(self) -> Dict:
+        return {"held_by_this_worker": self.held, **self.stats}
+
+
+# --- Small JSON values updated atomically by every worker (adaptive limits, circuit breakers) ---
+
+def read_value(name: str) -> Optional[Dict]:
+    row = _connection().execute("SELECT value FROM shared_values WHERE name = ?", (name,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def update_value(name: str, step: Callable[[Optional[Dict]], Dict]) -> Dict:
+    """
+    Replace value ``name`` with ``step(current)`` (``current`` is None if
+    unset) in one transaction and return it. If ``step`` raises, the value
+    is left unchanged and the exception propagates.
+    """
+    with transaction() as conn:
+        row = conn.execute("SELECT value FROM shared_values WHERE name = ?", (name,)).fetchone()
+        value = step(json.loads(row[0]) if row else None)
+        conn.execute("INSERT OR REPLACE INTO shared_values VALUES (?, ?, ?)", (name, json.dumps(value), time.time()))
+        return value
+
+
+# --- NFT Transfer-event index (written by app.transfer_indexer) ---
+# Addresses are stored lowercase and token ids as decimal strings (uint256 doesn't fit an INTEGER).
+
+ZERO_ADDRESS = "0x" + "0" * 40
+
+
+def indexer_checkpoint(contract: str) -> Optional[Tuple[int, Optional[str]]]:
+    """(last indexed block, its hash) for ``contract``, or None if it was never indexed."""
+    row = _connection().execute("SELECT block_number, block_hash FROM indexer_checkpoints WHERE contract = ?",
+                                (contract.lower(),)).fetchone()
+    return (row[0], row[1]) if row else None
+
+
+def _set_checkpoint(conn: sqlite3.Connection, contract: str, block_number: int, block_hash: Optional[str]):
+    conn.execute("INSERT OR REPLACE INTO indexer_checkpoints VALUES (?, ?, ?, ?)",
+                 (contract, block_number, block_hash, time.time()))
+    if block_hash is None:
+        return
+    conn.execute("INSERT OR REPLACE INTO indexer_block_hashes VALUES (?, ?, ?)", (contract, block_number, block_hash))
+    conn.execute(
+        "DELETE FROM indexer_block_hashes WHERE contract = ? AND block_number < (SELECT block_number "
+        "FROM indexer_block_hashes WHERE contract = ? ORDER BY block_number DESC LIMIT 1 OFFSET ?)",
+        (contract, contract, INDEXER_HASH_HISTORY - 1))
+
+
+def indexer_block_hashes(contract: str, before_block: int) -> List[Tuple[int, str]]:
+    """Recorded (block number, hash) of earlier checkpoints below ``before_block``, newest first."""
+    return _connection().execute(
+        "SELECT block_number, block_hash FROM indexer_block_hashes WHERE contract = ? AND block_number < ? "
+        "ORDER BY block_number DESC", (contract.lower(), before_block)).fetchall()
+
+
+def _refresh_owner(conn: sqlite3.Connection, contract: str, token_id: str):
+    """Recompute one token's owner row from its remaining transfers."""
+    last = conn.execute(
+        "SELECT to_address, block_number FROM nft_transfers WHERE contract = ? AND token_id = ? "
+        "ORDER BY block_number DESC, log_index DESC LIMIT 1", (contract, token_id)).fetchone()
+    if last is None or last[0] == ZERO_ADDRESS:
+        conn.execute("DELETE FROM nft_owners WHERE contract = ? AND token_id = ?", (contract, token_id))
+        return
+    minted = conn.execute(
+        "SELECT MAX(block_number) FROM nft_transfers WHERE contract = ? AND token_id = ? AND from_address = ?",
+        (contract, token_id, ZERO_ADDRESS)).fetchone()[0]
+    conn.execute("INSERT OR REPLACE INTO nft_owners VALUES (?, ?, ?, ?, ?)",
+                 (contract, token_id, last[0], minted, last[1]))
+
+
+def apply_transfers(contract: str, transfers: List[Dict], block_number: int, block_hash: Optional[str],
+                    lease: Optional[Tuple[str, str, float]] = None) -> Optional[int]:
+    """
+    Record ``transfers`` (in block/log order) and advance the checkpoint to
+    ``block_number`` in one transaction; returns how many were new. Mints
+    are queued for the minting-report feed (``reported = 0``). A ``lease``
+    (name, holder, ttl) is renewed in the same transaction; if another
+    holder has taken it over, nothing is written and None is returned.
+    """
+    contract = contract.lower()
+    added = 0
+    with transaction() as conn:
+        if lease and not _hold_lease(conn, *lease):
+            return None
+        for t in transfers:
+            is_mint = t["from"] == ZERO_ADDRESS
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO nft_transfers VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (contract, t["block_number"], t["log_index"], t["tx_hash"], t["token_id"],
+                 t["from"], t["to"], 0 if is_mint else 1))
+            if not cursor.rowcount:
+                continue
+            added += 1
+            if t["to"] == ZERO_ADDRESS:
+                conn.execute("DELETE FROM nft_owners WHERE contract = ? AND token_id = ?", (contract, t["token_id"]))
+            elif is_mint:
+                conn.execute("INSERT OR REPLACE INTO nft_owners VALUES (?, ?, ?, ?, ?)",
+                             (contract, t["token_id"], t["to"], t["block_number"], t["block_number"]))
+            else:
+                conn.execute(
+                    "INSERT INTO nft_owners VALUES (?, ?, ?, NULL, ?) ON CONFLICT (contract, token_id) "
+                    "DO UPDATE SET owner = excluded.owner, updated_block = excluded.updated_block",
+                    (contract, t["token_id"], t["to"], t["block_number"]))
+        _set_checkpoint(conn, contract, block_number, block_hash)
+    return added
+
+
+def reported_mints_after(contract: str, block_number: int) -> List[Tuple[str, str]]:
+    """(transaction hash, token id) of mints after ``block_number`` already written to the minting reports."""
+    return _connection().execute(
+        "SELECT tx_hash, token_id FROM nft_transfers WHERE contract = ? AND block_number > ? "
+        "AND from_address = ? AND reported = 1", (contract.lower(), block_number, ZERO_ADDRESS)).fetchall()
+
+
+def rewind_transfers(contract: str, block_number: int, block_hash: Optional[str]) -> int:
+    """Forget transfers after ``block_number`` (a reorg replaced them) and rebuild the owners they touched."""
+    contract = contract.lower()
+    with transaction() as conn:
+        conn.execute("DELETE FROM indexer_block_hashes WHERE contract = ? AND block_number > ?",
+                     (contract, block_number))
+        tokens = [row[0] for row in conn.execute(
+            "SELECT DISTINCT token_id FROM nft_transfers WHERE contract = ? AND block_number > ?",
+            (contract, block_number))]
+        removed = conn.execute("DELETE FROM nft_transfers WHERE contract = ? AND block_number > ?",
+                               (contract, block_number)).rowcount
+        for token_id in tokens:
+            _refresh_owner(conn, contract, token_id)
+        _set_checkpoint(conn, contract, block_number, block_hash)
+    return removed
+
+
+def token_owner(contract: str, token_id: int) -> Optional[Dict]:
+    row = _connection().execute(
+        "SELECT owner, minted_block, updated_block FROM nft_owners WHERE contract = ? AND token_id = ?",
+        (contract.lower(), str(token_id))).fetchone()
+    if row is None:
+        return None
+    return {"token_id": int(token_id), "owner": row[0], "minted_block": row[1], "updated_block": row[2]}
+
+
+def owner_tokens(contract: str, owner: str) -> List[int]:
+    rows = _connection().execute("SELECT token_id FROM nft_owners WHERE contract = ? AND owner = ?",
+                                 (contract.lower(), owner.lower())).fetchall()
+    return sorted(int(row[0]) for row in rows)
+
+
+def unreported_mints(contract: str, limit: int) -> List[Dict]:
+    rows = _connection().execute(
+        "SELECT block_number, log_index, tx_hash, token_id, to_address FROM nft_transfers "
+        "WHERE contract = ? AND reported = 0 ORDER BY block_number, log_index LIMIT ?",
+        (contract.lower(), limit)).fetchall()
+    return [{"block_number": r[0], "log_index": r[1], "tx_hash": r[2], "token_id": r[3], "recipient": r[4]}
+            for r in rows]
+
+
+def mark_reported(contract: str, keys: List[Tuple[int, int]]):
+    """Mark mints, given as (block number, log index), as stored in the minting-reports collection."""
+    with transaction() as conn:
+        conn.executemany("UPDATE nft_transfers SET reported = 1 WHERE contract = ? AND block_number = ? AND log_index = ?",
+                         [(contract.lower(), block, index) for block, index in keys])
+
+
+def index_summary(contract: str) -> Dict:
+    conn = _connection()
+    contract = contract.lower()
+    return {
+        "transfers": conn.execute("SELECT COUNT(*) FROM nft_transfers WHERE contract = ?", (contract,)).fetchone()[0],
+        "tokens": conn.execute("SELECT COUNT(*) FROM nft_owners WHERE contract = ?", (contract,)).fetchone()[0],
+        "unreported_mints": conn.execute("SELECT COUNT(*) FROM nft_transfers WHERE contract = ? AND reported = 0",
+                                         (contract,)).fetchone()[0],
+    }
@@ -1,7 +1,40 @@
+"""
+Slither static analysis with named detector profiles and a compact result model.
+
+Profiles trade coverage for runtime: ``quick`` runs only the high-impact
+detectors, ``standard`` every detector except the informational and
+optimization ones, ``full`` all of them. Each profile's findings are a
+subset of the next one's, so a cached (or running) broader run also serves
+narrower requests by filtering.
+
+Slither writes its JSON to a file rather than stdout, and the report is
+parsed straight into ``SlitherFinding`` objects: one per detector result
+with the line range of every element it points at. The raw JSON (full
+source mappings, markdown, nested parents) is dropped as soon as it is
+parsed, and only the compact objects are cached.
+
+Runs happen in ``app.sandbox`` worker processes, so JSON parsing and any
+runaway Slither or solc process stay out of the web server. A run that
+exceeds ``SLITHER_TIMEOUT`` or a resource limit yields a structured error
+result (``timed_out`` / ``resource_limit``) that the audit carries on with.
+"""
 import subprocess
 import json
 import os
 import re
+import sys
+import asyncio
+import hashlib
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from app.config import SLITHER_CACHE_SIZE, SLITHER_CONCURRENCY, SLITHER_DEFAULT_PROFILE, SLITHER_TIMEOUT
+from app.etherscan import source_digest
+from app.sandbox import SandboxCrash, SandboxJobError, SandboxTimeout, analysis_crashed, analysis_timeout
+from app.sandbox import run_sandboxed
 
 def extract_solidity_version(contract_path: str) -> str:
     # Extract Solidity version from contract
@@ -13,47 +46,339 @@ def extract_solidity_version(contract_path: str) -> str:
                     return match.group(1)
     return None
 
-def run_slither(contract_path: str):
+
+# High-impact detectors, plus the Medium ones that lose funds directly. Only names that every
+# Slither release since 0.9 knows: ``--detect`` rejects unknown detectors.
+HIGH_IMPACT_DETECTORS = (
+    "abiencoderv2-array", "arbitrary-send-erc20", "arbitrary-send-erc20-permit", "arbitrary-send-eth",
+    "array-by-reference", "controlled-array-length", "controlled-delegatecall", "delegatecall-loop",
+    "incorrect-shift", "locked-ether", "msg-value-loop", "multiple-constructors", "name-reused",
+    "public-mappings-nested", "reentrancy-eth", "reentrancy-no-eth", "rtlo", "shadowing-state",
+    "storage-array", "suicidal", "tx-origin", "unchecked-lowlevel", "unchecked-send", "unchecked-transfer",
+    "uninitialized-state", "uninitialized-storage", "unprotected-upgrade", "weak-prng",
+)
+
+
+@dataclass(frozen=True)
+class SlitherProfile:
+    name: str
+    args: Tuple[str, ...] = ()
+    detectors: Optional[FrozenSet[str]] = None      # None: every detector
+    excluded_impacts: FrozenSet[str] = frozenset()
+
+    def includes(self, finding: "SlitherFinding") -> bool:
+        """True if a run with this profile would have reported ``finding``."""
+        if self.detectors is not None and finding.check not in self.detectors:
+            return False
+        return finding.impact not in self.excluded_impacts
+
+
+# Narrowest first; each profile's findings are a subset of every later one's
+SLITHER_PROFILES: Dict[str, SlitherProfile] = {
+    "quick": SlitherProfile("quick", ("--detect", ",".join(HIGH_IMPACT_DETECTORS)),
+                            detectors=frozenset(HIGH_IMPACT_DETECTORS)),
+    "standard": SlitherProfile("standard", ("--exclude-informational", "--exclude-optimization"),
+                               excluded_impacts=frozenset({"Informational", "Optimization"})),
+    "full": SlitherProfile("full"),
+}
+_PROFILE_ORDER = list(SLITHER_PROFILES)
+
+
+def resolve_profile(name: Optional[str] = None) -> str:
+    """Profile name to use for ``name`` (``SLITHER_DEFAULT_PROFILE`` if empty); ValueError if unknown."""
+    name = (name or SLITHER_DEFAULT_PROFILE).strip().lower()
+    if name not in SLITHER_PROFILES:
+        raise ValueError(f"Unknown Slither profile '{name}' (choose from {', '.join(_PROFILE_ORDER)})")
+    return name
+
+
+def _covering_profiles(name: str) -> List[str]:
+    """``name`` followed by the broader profiles whose results contain its findings."""
+    return _PROFILE_ORDER[_PROFILE_ORDER.index(name):]
+
+
+class SourceRange(NamedTuple):
+    kind: str                   # "function", "node", "variable", "contract", "pragma", ...
+    name: str
+    contract: Optional[str]
+    file: Optional[str]
+    start_line: Optional[int]
+    end_line: Optional[int]
+
+
+@dataclass(frozen=True, slots=True)
+class SlitherFinding:
+    check: str
+    impact: str
+    confidence: str
+    description: str
+    elements: Tuple[SourceRange, ...]
+
+    @property
+    def primary(self) -> Optional[SourceRange]:
+        """First element with a source location."""
+        return next((e for e in self.elements if e.start_line is not None), None)
+
+    def to_dict(self) -> Dict:
+        """The finding in the API's shape; ``line``/``contract`` of the first located element, as before."""
+        primary = self.primary
+        return {
+            "vulnerability": self.check,
+            "description": self.description,
+            "impact": self.impact,
+            "confidence": self.confidence,
+            "severity": self.impact or "Medium",
+            "recommendation": "",
+            "line": primary.start_line if primary else None,
+            "lines": [primary.start_line, primary.end_line] if primary else None,
+            "contract": (primary.contract if primary else None) or "Unknown",
+            "elements": [{"type": e.kind, "name": e.name, "contract": e.contract, "file": e.file,
+                          "lines": [e.start_line, e.end_line] if e.start_line is not None else None}
+                         for e in self.elements],
+        }
+
+
+def _intern(value) -> Optional[str]:
+    # Detector, impact, contract and file names repeat across findings and cached runs
+    return sys.intern(str(value)) if value is not None else None
+
+
+def _element_contract(element: Dict) -> Optional[str]:
+    node = element
+    while isinstance(node, dict):
+        if node.get("type") == "contract":
+            return node.get("name")
+        node = (node.get("type_specific_fields") or {}).get("parent")
+    return None
+
+
+def _source_range(element: Dict) -> SourceRange:
+    mapping = element.get("source_mapping") or {}
+    lines = mapping.get("lines") or []
+    return SourceRange(
+        kind=_intern(element.get("type", "")),
+        name=str(element.get("name", "")),
+        contract=_intern(_element_contract(element)),
+        file=_intern(mapping.get("filename_short") or mapping.get("filename_relative")),
+        start_line=min(lines) if lines else None,
+        end_line=max(lines) if lines else None,
+    )
+
+
+def parse_slither_output(data: Dict) -> Tuple[SlitherFinding, ...]:
+    """Compact findings of a Slither JSON report (``results.detectors``)."""
+    return tuple(
+        SlitherFinding(
+            check=_intern(issue.get("check", "")),
+            impact=_intern(issue.get("impact", "")),
+            confidence=_intern(issue.get("confidence", "")),
+            description=str(issue.get("description", "")).strip(),
+            elements=tuple(_source_range(e) for e in issue.get("elements") or ()),
+        )
+        for issue in (data.get("results") or {}).get("detectors") or ()
+    )
+
+
+def _log_tail(path: str, limit: int = 2000) -> str:
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - limit))
+        return f.read().decode("utf-8", errors="replace").strip()
+
+
+def run_slither(contract_path: str, cwd: str = None, extra_args: list = None, profile: str = "full"):
+    """
+    Run Slither with the detectors of ``profile`` and return a tuple of
+    ``SlitherFinding``, or ``{"error", "details"}``. The JSON report and the
+    console log go to temporary files, so neither is held in memory whole.
+    """
     try:
         # Set environment to use UTF-8
         env = os.environ.copy()
         env['PYTHONIOENCODING'] = 'utf-8'
 
-        result = subprocess.run(
-            ["slither", contract_path, "--json", "-"],  # "-" makes slither print JSON to stdout
-            capture_output=True,
-            text=True,
-            encoding="utf-8",
-            errors="replace",
-            env=env
-        )
+        with tempfile.TemporaryDirectory() as out_dir:
+            json_path = os.path.join(out_dir, "slither.json")
+            log_path = os.path.join(out_dir, "slither.log")
+            with open(log_path, "wb") as log:
+                try:
+                    result = subprocess.run(
+                        ["slither", contract_path, "--json", json_path, "--json-types", "detectors",
+                         *SLITHER_PROFILES[profile].args, *(extra_args or [])],
+                        cwd=cwd,
+                        stdin=subprocess.DEVNULL,
+                        stdout=subprocess.DEVNULL,
+                        stderr=log,
+                        env=env,
+                        timeout=SLITHER_TIMEOUT
+                    )
+                except subprocess.TimeoutExpired:
+                    return analysis_timeout("Slither", SLITHER_TIMEOUT)
+
+            if not os.path.exists(json_path):
+                return {"error": "Slither execution failed",
+                        "details": _log_tail(log_path) or f"exit status {result.returncode}"}
+            try:
+                with open(json_path, "rb") as f:
+                    data = json.load(f)
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                return {"error": "Failed to parse Slither JSON output", "details": str(e)}
+
+        # Slither exits non-zero when it reports findings, so success comes from the report itself
+        if not data.get("success", False):
+            return {"error": "Slither execution failed", "details": str(data.get("error") or "")[:2000]}
+        return parse_slither_output(data)
 
-        if result.returncode != 0:
-            return {"error": "Slither execution failed", "details": result.stderr.strip()}
-
-        # Parse JSON directly from stdout
-        try:
-            data = json.loads(result.stdout)
-        except json.JSONDecodeError:
-            return {"error": "Failed to parse Slither JSON output", "details": result.stdout[:1000]}
-
-        raw_issues = data.get("results", {}).get("detectors", [])
-        parsed_issues = []
-        for issue in raw_issues:
-            parsed_issues.append({
-                "vulnerability": issue.get("check"),
-                "description": issue.get("description"),
-                "impact": issue.get("impact"),
-                "confidence": issue.get("confidence"),
-                "severity": issue.get("impact", "Medium"),
-                "recommendation": issue.get("recommendation", ""),
-                "line": issue.get("elements", [{}])[0].get("source_mapping", {}).get("lines", [None])[0],
-                "contract": issue.get("elements", [{}])[0].get("contract", "Unknown"),
-            })
-
-        return parsed_issues
-
-    except UnicodeDecodeError as e:
-        return {"error": "Unicode encoding error", "details": f"Failed to decode output: {str(e)}"}
     except Exception as e:
         return {"error": "Exception occurred", "details": str(e)}
+
+
+# Successful Slither runs keyed by (source hash, profile); concurrent runs on the same source are shared
+_slither_results = OrderedDict()
+_slither_in_flight = {}
+_slither_semaphore = None
+_slither_semaphore_loop = None
+slither_stats = {"runs": 0, "cache_hits": 0, "filtered_hits": 0, "joined_in_flight": 0,
+                 "timeouts": 0, "aborted": 0, "run_seconds": 0.0, "profile_runs": {name: 0 for name in SLITHER_PROFILES}}
+
+
+def _get_slither_semaphore():
+    global _slither_semaphore, _slither_semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _slither_semaphore is None or _slither_semaphore_loop is not loop:
+        _slither_semaphore, _slither_semaphore_loop = asyncio.Semaphore(SLITHER_CONCURRENCY), loop
+    return _slither_semaphore
+
+
+def _remember_result(key, result):
+    # Errors (missing solc, timeouts) may be transient, so only real results are kept
+    if not (isinstance(result, dict) and "error" in result):
+        _slither_results[key] = result
+        while len(_slither_results) > SLITHER_CACHE_SIZE:
+            _slither_results.popitem(last=False)
+    return result
+
+
+async def _timed_run(profile: str, *args):
+    slither_stats["runs"] += 1
+    slither_stats["profile_runs"][profile] += 1
+    started = time.perf_counter()
+    try:
+        # A few seconds past Slither's own timeout: the worker is only killed if that didn't work
+        result = await run_sandboxed(run_slither, *args, profile=profile, timeout=SLITHER_TIMEOUT + 10)
+    except SandboxTimeout:
+        result = analysis_timeout("Slither", SLITHER_TIMEOUT)
+    except SandboxCrash as e:
+        result = analysis_crashed("Slither", str(e))
+    except SandboxJobError as e:
+        result = {"error": "Exception occurred", "details": str(e)}
+    finally:
+        slither_stats["run_seconds"] += time.perf_counter() - started
+    if isinstance(result, dict):
+        slither_stats["timeouts"] += bool(result.get("timed_out"))
+        slither_stats["aborted"] += bool(result.get("resource_limit"))
+    return result
+
+
+async def _run_slither_uncached(source: str, key: str, profile: str):
+    async with _get_slither_semaphore():
+        with tempfile.TemporaryDirectory() as root:
+            with open(os.path.join(root, "contract.sol"), "w", encoding="utf-8") as f:
+                f.write(source)
+            # A fixed relative name keeps descriptions free of random temp paths
+            result = await _timed_run(profile, "contract.sol", root)
+    return _remember_result((key, profile), result)
+
+
+def _write_project(project, root: str):
+    for name, content in project.sources.items():
+        path = os.path.normpath(os.path.join(root, name))
+        if not path.startswith(os.path.join(root, "")):
+            raise ValueError(f"Source path escapes the project directory: {name}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+
+async def _run_slither_on_project_uncached(project, key: str, profile: str):
+    async with _get_slither_semaphore():
+        with tempfile.TemporaryDirectory() as root:
+            _write_project(project, root)
+            # solc resolves source unit names like "@openzeppelin/..." against the working directory
+            extra_args = ["--solc-remaps", " ".join(project.remappings)] if project.remappings else []
+            result = await _timed_run(profile, project.main_file, root, extra_args)
+    return _remember_result((key, profile), result)
+
+
+def _finish_slither(key, task):
+    _slither_in_flight.pop(key, None)
+    if not task.cancelled():
+        task.exception()
+
+
+def _findings_for(result, profile: str):
+    """API dicts of the cached ``result`` that ``profile`` would report (errors pass through)."""
+    if isinstance(result, dict):
+        return result
+    selected = SLITHER_PROFILES[profile]
+    return [finding.to_dict() for finding in result if selected.includes(finding)]
+
+
+async def _cached_run(key, profile, start):
+    # A finished or running broader profile already has every finding this one would report
+    for candidate in _covering_profiles(profile):
+        if (key, candidate) in _slither_results:
+            slither_stats["cache_hits" if candidate == profile else "filtered_hits"] += 1
+            _slither_results.move_to_end((key, candidate))
+            return _findings_for(_slither_results[(key, candidate)], profile)
+    for candidate in _covering_profiles(profile):
+        task = _slither_in_flight.get((key, candidate))
+        if task is not None:
+            slither_stats["joined_in_flight"] += 1
+            return _findings_for(await asyncio.shield(task), profile)
+    task = _slither_in_flight[(key, profile)] = asyncio.ensure_future(start())
+    task.add_done_callback(lambda t: _finish_slither((key, profile), t))
+    return _findings_for(await asyncio.shield(task), profile)
+
+
+async def run_slither_on_source(source: str, profile: Optional[str] = None):
+    """Slither findings for ``source`` (a list of dicts, or an error dict like ``run_slither``)."""
+    profile = resolve_profile(profile)
+    key = hashlib.sha256(source.encode("utf-8")).hexdigest()
+    return await _cached_run(key, profile, lambda: _run_slither_uncached(source, key, profile))
+
+
+async def run_slither_on_project(project, profile: Optional[str] = None):
+    """Slither findings for a multi-file ``SourceProject``, laid out on disk as verified."""
+    profile = resolve_profile(profile)
+    key = "project:" + source_digest(project)
+    return await _cached_run(key, profile, lambda: _run_slither_on_project_uncached(project, key, profile))
+
+
+def slither_status(slither_result) -> str:
+    """``complete``, ``timed_out``, ``resource_limit`` or ``failed``."""
+    if isinstance(slither_result, list):
+        return "complete"
+    if isinstance(slither_result, dict):
+        for status in ("timed_out", "resource_limit"):
+            if slither_result.get(status):
+                return status
+    return "failed"
+
+
+def count_findings(slither_result):
+    """Number of Slither findings, or None if Slither failed."""
+    if isinstance(slither_result, list):
+        return len(slither_result)
+    return None
+
+
+def get_slither_stats() -> Dict:
+    return {
+        **slither_stats,
+        "run_seconds": round(slither_stats["run_seconds"], 2),
+        "profile_runs": dict(slither_stats["profile_runs"]),
+        "default_profile": SLITHER_DEFAULT_PROFILE,
+        "cached_results": len(_slither_results),
+        "cached_findings": sum(len(r) for r in _slither_results.values()),
+    }
@@ -0,0 +1,91 @@
+"""
+Cold-start import profiler (``python -m app.main --profile-startup``).
+
+Imports ``app.main`` in a fresh interpreter under ``-X importtime`` and
+reports where the time goes: total, per top-level package and the slowest
+individual modules. Exits non-zero when the total exceeds
+``STARTUP_IMPORT_BUDGET_MS``, so it can gate CI. Heavy dependencies
+(web3, pymongo) are imported lazily; they show up here if something
+starts importing them at module level again.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.config import STARTUP_IMPORT_BUDGET_MS
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+# Imports that should never happen at startup
+LAZY_PACKAGES = ("web3", "eth_account", "pymongo", "bson")
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def profile_imports(target: str = "app.main") -> List[Dict]:
+    """Per-module import times (microseconds) of importing ``target`` in a new interpreter."""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(BACKEND_DIR), os.getenv("PYTHONPATH")]))}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {target} failed:\n{proc.stderr[-2000:]}")
+    modules = []
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            modules.append({
+                "module": match.group(4),
+                "self_us": int(match.group(1)),
+                "cumulative_us": int(match.group(2)),
+                "depth": len(match.group(3)) // 2,
+            })
+    return modules
+
+
+def summarize(modules: List[Dict], target: str = "app.main", top: int = 15) -> Dict:
+    by_package: Dict[str, int] = defaultdict(int)
+    for m in modules:
+        by_package[m["module"].split(".")[0]] += m["self_us"]
+    total = next((m["cumulative_us"] for m in modules if m["module"] == target), sum(by_package.values()))
+    return {
+        "total_ms": total / 1000,
+        "modules": len(modules),
+        "packages": sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[:top],
+        "slowest_modules": sorted(modules, key=lambda m: m["self_us"], reverse=True)[:top],
+        "eager_heavy_imports": sorted({m["module"].split(".")[0] for m in modules} & set(LAZY_PACKAGES)),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Report per-module import time of the API at startup")
+    parser.add_argument("--profile-startup", action="store_true", help="(accepted for the app.main entry point)")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_IMPORT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--target", default="app.main")
+    args = parser.parse_args(argv)
+
+    summary = summarize(profile_imports(args.target), args.target, args.top)
+    print(f"Import of {args.target}: {summary['total_ms']:.0f} ms across {summary['modules']} modules "
+          f"(budget {args.budget_ms:.0f} ms)")
+    print("\nBy package (self time):")
+    for package, us in summary["packages"]:
+        print(f"  {package:<28} {us / 1000:8.1f} ms")
+    print("\nSlowest modules (self time):")
+    for m in summary["slowest_modules"]:
+        print(f"  {m['module']:<48} {m['self_us'] / 1000:8.1f} ms")
+    if summary["eager_heavy_imports"]:
+        print(f"\nWARNING: imported at startup but meant to be lazy: {', '.join(summary['eager_heavy_imports'])}")
+
+    if summary["total_ms"] > args.budget_ms:
+        print(f"\nOVER BUDGET by {summary['total_ms'] - args.budget_ms:.0f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+"""
+Background indexer of the certificate contract's ERC-721 Transfer events.
+
+Scans ``eth_getLogs`` for ``NFT_CONTRACT_ADDRESS`` in block ranges of
+``INDEXER_BLOCK_RANGE`` (halved when the node rejects a range, grown back
+afterwards), only up to ``INDEXER_CONFIRMATIONS`` blocks behind the head.
+Each range is applied to the token-to-owner and owner-to-tokens tables in
+``app.shared_state`` together with the checkpoint, so a restart resumes
+where it stopped. The checkpoint's block hash is re-checked every cycle;
+if a reorg deeper than the confirmation depth replaced it, the indexer
+walks back through the hashes of earlier checkpoints to the last one that
+is still canonical, rewinds the index to it and rescans. New mints are
+written to the minting-reports collection, so minting history no longer
+depends on clients POSTing ``/minting-report``. Reports of mints in
+blocks a reorg dropped are kept but flagged ``orphaned``; the flag is
+cleared if the transaction is mined again.
+
+With several workers, a lease in the shared store lets one of them run
+the scan. It is renewed with every range applied, and a worker that finds
+it taken over stops scanning, so a long catch-up can't run in two workers
+at once. Ownership queries read the tables directly, without RPC.
+"""
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from web3 import Web3
+
+from app import shared_state
+from app.chain import get_contract, get_web3
+from app.config import (
+    INDEXER_BLOCK_RANGE,
+    INDEXER_CONFIRMATIONS,
+    INDEXER_POLL_INTERVAL,
+    INDEXER_REPORT_BATCH,
+    INDEXER_START_BLOCK,
+    NFT_CONTRACT_ADDRESS,
+)
+from app.mint_queue import TRANSFER_TOPIC
+from reports.minting_reports import insert_reports, run_db, set_orphaned
+
+logger = logging.getLogger(__name__)
+
+TOKEN_URI_ABI = [{
+    "name": "tokenURI", "type": "function", "stateMutability": "view",
+    "inputs": [{"name": "tokenId", "type": "uint256"}],
+    "outputs": [{"name": "", "type": "string"}],
+}]
+
+
+def decode_transfer(log) -> Optional[Dict]:
+    """Transfer fields of an ERC-721 Transfer log (all three arguments indexed), else None."""
+    topics = [bytes(t) for t in log["topics"]]
+    if len(topics) != 4 or topics[0] != TRANSFER_TOPIC:
+        return None     # ERC-20 Transfer events carry the amount in data, not a token id topic
+    return {
+        "block_number": log["blockNumber"],
+        "log_index": log["logIndex"],
+        "tx_hash": Web3.to_hex(log["transactionHash"]),
+        "token_id": str(int.from_bytes(topics[3], "big")),
+        "from": "0x" + topics[1][-20:].hex(),
+        "to": "0x" + topics[2][-20:].hex(),
+    }
+
+
+class TransferIndexer:
+    """Keeps the Transfer-event index of one contract up to date from a background task."""
+
+    def __init__(self, contract_address: str, start_block: int = INDEXER_START_BLOCK,
+                 confirmations: int = INDEXER_CONFIRMATIONS, block_range: int = INDEXER_BLOCK_RANGE,
+                 poll_interval: float = INDEXER_POLL_INTERVAL):
+        self.contract_address = Web3.to_checksum_address(contract_address)
+        self.start_block = start_block
+        self.confirmations = confirmations
+        self.block_range = block_range
+        self.poll_interval = poll_interval
+        self._range = block_range
+        self._task: Optional[asyncio.Task] = None
+        self._holder = f"{socket.gethostname()}:{os.getpid()}"
+        self._lease = f"transfer_indexer:{self.contract_address.lower()}"
+        self._lease_ttl = max(30.0, 3 * poll_interval)
+        self.indexed_block: Optional[int] = None
+        self.head_block: Optional[int] = None
+        self.last_error: Optional[str] = None
+        self.stats = {"cycles": 0, "standby_cycles": 0, "ranges": 0, "range_splits": 0, "logs": 0,
+                      "transfers_added": 0, "reorgs": 0, "reorg_depth_max": 0, "transfers_rewound": 0,
+                      "reports_orphaned": 0, "reports_restored": 0, "reports_inserted": 0, "reports_duplicate": 0, "report_errors": 0, "leases_lost": 0, "errors": 0}
+
+    def start(self):
+        if self._task is None or self._task.done() or self._task.get_loop() is not asyncio.get_running_loop():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        try:
+            await asyncio.to_thread(shared_state.release_lease, self._lease, self._holder)
+        except Exception as e:
+            logger.warning(f"Could not release the indexer lease: {e}")
+
+    async def _run(self):
+        while True:
+            self.stats["cycles"] += 1
+            try:
+                if await asyncio.to_thread(shared_state.acquire_lease, self._lease, self._holder, self._lease_ttl):
+                    if await self.sync():
+                        await self.report_mints()
+                    self.last_error = None
+                else:
+                    self.stats["standby_cycles"] += 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                self.last_error = str(e)
+                logger.warning(f"Transfer indexer cycle failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _check_reorg(self, checkpoint) -> Optional[int]:
+        """Last block that is still canonical: the checkpoint, or an earlier block after a rewind."""
+        block_number, block_hash = checkpoint
+        if block_hash is None:
+            return block_number
+        w3 = get_web3()
+        if Web3.to_hex((await w3.eth.get_block(block_number))["hash"]) == block_hash:
+            return block_number
+        # The reorg may go deeper than the confirmation depth: find the newest earlier checkpoint
+        # both chains share, or rescan from the start block if it predates the recorded hashes
+        target, target_hash = self.start_block - 1, None
+        for number, stored_hash in await asyncio.to_thread(shared_state.indexer_block_hashes,
+                                                           self.contract_address, block_number):
+            if number < self.start_block:
+                break
+            if Web3.to_hex((await w3.eth.get_block(number))["hash"]) == stored_hash:
+                target, target_hash = number, stored_hash
+                break
+        # Flag first: if MongoDB is unavailable the cycle fails and the rewind is retried next time
+        orphaned = await asyncio.to_thread(shared_state.reported_mints_after, self.contract_address, target)
+        if orphaned:
+            self.stats["reports_orphaned"] += await run_db(set_orphaned, orphaned)
+        removed = await asyncio.to_thread(shared_state.rewind_transfers, self.contract_address, target, target_hash)
+        self.stats["reorgs"] += 1
+        self.stats["reorg_depth_max"] = max(self.stats["reorg_depth_max"], block_number - target)
+        self.stats["transfers_rewound"] += removed
+        logger.warning(f"Block {block_number} was reorganized away; rewound the index to block {target} "
+                       f"({removed} transfers dropped, {len(orphaned)} reported mints flagged as orphaned)")
+        return target
+
+    async def sync(self) -> bool:
+        """Index every confirmed block after the checkpoint; False if another worker took the lease over."""
+        w3 = get_web3()
+        checkpoint = await asyncio.to_thread(shared_state.indexer_checkpoint, self.contract_address)
+        last = await self._check_reorg(checkpoint) if checkpoint else self.start_block - 1
+        self.head_block = await w3.eth.block_number
+        safe_block = self.head_block - self.confirmations
+        self.indexed_block = last
+        while last < safe_block:
+            from_block = last + 1
+            to_block = min(last + self._range, safe_block)
+            try:
+                # One round trip with the batching provider
+                logs, block = await asyncio.gather(
+                    w3.eth.get_logs({"address": self.contract_address, "topics": [TRANSFER_TOPIC],
+                                     "fromBlock": from_block, "toBlock": to_block}),
+                    w3.eth.get_block(to_block))
+            except Exception:
+                if self._range == 1:
+                    raise
+                # Typically "too many results" or a response-size limit: retry with a smaller range
+                self._range = max(1, self._range // 2)
+                self.stats["range_splits"] += 1
+                continue
+            transfers = sorted(filter(None, map(decode_transfer, logs)),
+                               key=lambda t: (t["block_number"], t["log_index"]))
+            added = await asyncio.to_thread(shared_state.apply_transfers, self.contract_address, transfers,
+                                            to_block, Web3.to_hex(block["hash"]),
+                                            (self._lease, self._holder, self._lease_ttl))
+            if added is None:
+                self.stats["leases_lost"] += 1
+                logger.warning(f"Indexer lease expired during the scan and was taken over; stopping at block {last}")
+                return False
+            self.stats["ranges"] += 1
+            self.stats["logs"] += len(logs)
+            self.stats["transfers_added"] += added
+            last = self.indexed_block = to_block
+            self._range = min(self.block_range, self._range * 2)
+        return True
+
+    async def _report_details(self, mints: List[Dict]):
+        """Gas used, block timestamps and token URIs for ``mints``, fetched concurrently (one batch)."""
+        w3 = get_web3()
+        contract = get_contract(self.contract_address, TOKEN_URI_ABI)
+        tx_hashes = sorted({m["tx_hash"] for m in mints})
+        blocks = sorted({m["block_number"] for m in mints})
+
+        async def token_uri(token_id: str) -> str:
+            try:
+                return await contract.functions.tokenURI(int(token_id)).call()
+            except Exception:
+                return ""       # burned since, or the contract has no tokenURI
+
+        receipts, block_data, uris = await asyncio.gather(
+            asyncio.gather(*(w3.eth.get_transaction_receipt(h) for h in tx_hashes)),
+            asyncio.gather(*(w3.eth.get_block(b) for b in blocks)),
+            asyncio.gather(*(token_uri(m["token_id"]) for m in mints)))
+        gas_used = {h: r["gasUsed"] for h, r in zip(tx_hashes, receipts)}
+        timestamps = {b: datetime.utcfromtimestamp(d["timestamp"]) for b, d in zip(blocks, block_data)}
+        return gas_used, timestamps, uris
+
+    async def report_mints(self):
+        """Write indexed mints that aren't in the minting-reports collection yet."""
+        mints = await asyncio.to_thread(shared_state.unreported_mints, self.contract_address, INDEXER_REPORT_BATCH)
+        if not mints:
+            return
+        gas_used, timestamps, uris = await self._report_details(mints)
+        reports = [{
+            "metadata": {"source": "transfer_indexer"},
+            "token_id": m["token_id"],
+            "token_uri": uri,
+            "nft_contract": self.contract_address,
+            "transaction_hash": m["tx_hash"],
+            "block_number": m["block_number"],
+            "gas_used": gas_used[m["tx_hash"]],
+            "recipient": Web3.to_checksum_address(m["recipient"]),
+            "created_at": timestamps[m["block_number"]],
+        } for m, uri in zip(mints, uris)]
+        result = await run_db(insert_reports, reports)
+        failed = {err["index"] for err in result["errors"]}
+        if result["duplicates"]:
+            # A mint that was orphaned by a reorg and then included again in the new chain
+            self.stats["reports_restored"] += await run_db(
+                set_orphaned, [(m["tx_hash"], m["token_id"]) for i, m in enumerate(mints) if i not in failed], False)
+        self.stats["reports_inserted"] += result["inserted"]
+        self.stats["reports_duplicate"] += result["duplicates"]
+        self.stats["report_errors"] += len(failed)
+        await asyncio.to_thread(shared_state.mark_reported, self.contract_address,
+                                [(m["block_number"], m["log_index"]) for i, m in enumerate(mints) if i not in failed])
+
+    def snapshot(self) -> Dict:
+        return {
+            **self.stats,
+            "contract": self.contract_address,
+            "running": self._task is not None and not self._task.done(),
+            "indexed_block": self.indexed_block,
+            "head_block": self.head_block,
+            "block_range": self._range,
+            "confirmations": self.confirmations,
+            "last_error": self.last_error,
+        }
+
+
+_indexer: Optional[TransferIndexer] = None
+
+
+def get_indexer() -> Optional[TransferIndexer]:
+    return _indexer
+
+
+def start_indexer(contract_address: Optional[str] = None) -> Optional[TransferIndexer]:
+    """Start indexing ``contract_address`` (default ``NFT_CONTRACT_ADDRESS``) in the background."""
+    global _indexer
+    contract_address = contract_address or NFT_CONTRACT_ADDRESS
+    if not contract_address:
+        logger.warning("Transfer indexer not started: NFT_CONTRACT_ADDRESS is not set")
+        return None
+    if _indexer is None or _indexer.contract_address != Web3.to_checksum_address(contract_address):
+        _indexer = TransferIndexer(contract_address)
+    _indexer.start()
+    logger.info(f"Transfer indexer started for {_indexer.contract_address}")
+    return _indexer
+
+
+async def stop_indexer():
+    if _indexer is not None:
+        await _indexer.stop()
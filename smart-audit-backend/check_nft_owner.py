@@ -1,19 +1,34 @@
+import asyncio
+
 from web3 import Web3
 
-# L1X RPC URL
-rpc_url = "https://v2-mainnet-rpc.l1x.foundation/"
-w3 = Web3(Web3.HTTPProvider(rpc_url))
+from app.chain import close_web3, get_contract
+
+# Minimal ERC-721 ABI: ownerOf only
+erc721_abi = [{
+    "inputs": [{"internalType": "uint256", "name": "tokenId", "type": "uint256"}],
+    "name": "ownerOf",
+    "outputs": [{"internalType": "address", "name": "", "type": "address"}],
+    "stateMutability": "view",
+    "type": "function"
+}]
 
-# NFT contract address and ABI
+# NFT contract address on the L1X chain configured by L1X_RPC_URL
 nft_contract_address = Web3.to_checksum_address("0x6439BbbE6619aDEbe0f74C70757Fd5842d651a24")
-nft_contract = w3.eth.contract(address=nft_contract_address, abi=erc721_abi)
 
 # Token ID to check
 token_id = 4
 
-# Check ownership
-try:
-    owner = nft_contract.functions.ownerOf(token_id).call()
-    print(f"✅ Token ID {token_id} is owned by: {owner}")
-except Exception as e:
-    print(f"❌ Error fetching owner for Token ID {token_id}: {e}")
+
+async def main():
+    nft_contract = get_contract(nft_contract_address, erc721_abi)
+    # Check ownership
+    try:
+        owner = await nft_contract.functions.ownerOf(token_id).call()
+        print(f"✅ Token ID {token_id} is owned by: {owner}")
+    except Exception as e:
+        print(f"❌ Error fetching owner for Token ID {token_id}: {e}")
+    await close_web3()
+
+
+asyncio.run(main())
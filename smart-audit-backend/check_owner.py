@@ -1,27 +1,47 @@
-from web3 import Web3
+import asyncio
 import json
 
+from web3 import Web3
+
+from app import shared_state
+from app.chain import close_web3, get_contract
+
 # Load contract ABI
 with open("D:/AuditSmart/L1XEVMERC20/artifacts/contracts/MyNFT.sol/MyNFT.json") as f:
     contract_data = json.load(f)
 abi = contract_data['abi']
 
-# Connect to L1X testnet
-w3 = Web3(Web3.HTTPProvider("https://v2-mainnet-rpc.l1x.foundation/"))
+# Contract on the L1X chain configured by L1X_RPC_URL
 contract_address = Web3.to_checksum_address("0x3d3DcCB39c37d80c93Fde207c36b9a402Fc57746")
-contract = w3.eth.contract(address=contract_address, abi=abi)
 
 # Your wallet address
 owner_address = "0xB97fcDcd02fe2B50D8014b80080c904845e027F1"
 
-# Check token balance
-balance = contract.functions.balanceOf(owner_address).call()
-print(f"NFTs owned: {balance}")
-
-# Try querying all token IDs (works if your contract has tokenOfOwnerByIndex or similar)
-for i in range(balance):
-    try:
-        token_id = contract.functions.tokenOfOwnerByIndex(owner_address, i).call()
-        print(f"Token ID {i}: {token_id}")
-    except Exception as e:
-        print(f"Could not get token ID at index {i}: {e}")
+
+async def main():
+    # Served by the Transfer-event index (app.transfer_indexer) when it covers this contract
+    checkpoint = shared_state.indexer_checkpoint(contract_address)
+    if checkpoint:
+        token_ids = shared_state.owner_tokens(contract_address, owner_address)
+        print(f"NFTs owned (indexed up to block {checkpoint[0]}): {len(token_ids)}")
+        for i, token_id in enumerate(token_ids):
+            print(f"Token ID {i}: {token_id}")
+        return
+
+    contract = get_contract(contract_address, abi)
+
+    # Check token balance
+    balance = await contract.functions.balanceOf(owner_address).call()
+    print(f"NFTs owned: {balance}")
+
+    # Try querying all token IDs (works if your contract has tokenOfOwnerByIndex or similar)
+    for i in range(balance):
+        try:
+            token_id = await contract.functions.tokenOfOwnerByIndex(owner_address, i).call()
+            print(f"Token ID {i}: {token_id}")
+        except Exception as e:
+            print(f"Could not get token ID at index {i}: {e}")
+    await close_web3()
+
+
+asyncio.run(main())
@@ -0,0 +1,335 @@
+"""
+Local stand-ins for the paid services the audit API talks to.
+
+Each fake is a small threaded HTTP server with a configurable latency,
+jitter and error rate. Responses come from the recordings in
+``loadtest/recordings`` so the API sees realistic payloads without
+touching OpenRouter, Pinata, Etherscan or the L1X RPC.
+"""
+import abc
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+RECORDINGS_DIR = Path(__file__).parent / "recordings"
+
+
+@dataclass
+class ServiceProfile:
+    """Latency and failure behaviour of a fake service."""
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 500
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "ServiceProfile":
+        return cls(**(data or {}))
+
+    def delay(self):
+        latency = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            time.sleep(latency / 1000.0)
+
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+def load_recording(name: str, recordings_dir: Path = RECORDINGS_DIR):
+    with open(recordings_dir / name, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    """Base handler: applies the service profile, then dispatches to the service."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug("%s %s", self.server.service.name, format % args)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, body, content_type: str = "application/json"):
+        payload = body if isinstance(body, bytes) else (
+            body.encode("utf-8") if isinstance(body, str) else json.dumps(body).encode("utf-8")
+        )
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _dispatch(self, method: str):
+        service = self.server.service
+        body = self._read_body()
+        service.profile.delay()
+        service.record_request()
+        if service.profile.should_fail():
+            status = service.profile.error_status
+            self._send(status, {"error": f"injected {status} from fake {service.name}"})
+            return
+        try:
+            status, response, content_type = service.handle(method, self.path, body, self.headers)
+        except Exception as e:
+            logger.exception("Fake %s failed to handle %s %s", service.name, method, self.path)
+            status, response, content_type = 500, {"error": str(e)}, "application/json"
+        self._send(status, response, content_type)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+
+class FakeService(abc.ABC):
+    """A fake HTTP service running on an ephemeral localhost port."""
+    name = "fake"
+
+    def __init__(self, profile: Optional[ServiceProfile] = None):
+        self.profile = profile or ServiceProfile()
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record_request(self):
+        with self._count_lock:
+            self.request_count += 1
+
+    @abc.abstractmethod
+    def handle(self, method: str, path: str, body: bytes, headers):
+        """Return ``(status, response, content_type)`` for one request."""
+
+    def start(self) -> "FakeService":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), FakeHandler)
+        self._server.daemon_threads = True
+        self._server.service = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f"fake-{self.name}", daemon=True)
+        self._thread.start()
+        logger.info(f"Fake {self.name} listening on {self.url}")
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class FakeOpenRouter(FakeService):
+    """
+    Chat-completions stand-in. The first recording whose ``match`` string
+    occurs in the user prompt supplies the assistant message.
+    """
+    name = "openrouter"
+
+    def __init__(self, profile: Optional[ServiceProfile] = None, recordings: Optional[List[Dict]] = None):
+        super().__init__(profile)
+        self.recordings = recordings if recordings is not None else load_recording("openrouter.json")
+
+    def handle(self, method, path, body, headers):
+        request = json.loads(body or b"{}")
+        prompt = "\n".join(m.get("content", "") for m in request.get("messages", []))
+        content = next(
+            (r["content"] for r in self.recordings if r.get("match", "") in prompt),
+            "No recorded response."
+        )
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        return 200, {
+            "id": f"gen-{hashlib.sha1(body).hexdigest()[:12]}",
+            "model": request.get("model"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }, "application/json"
+
+
+class FakePinata(FakeService):
+    """Pinning API and gateway in one server; pinned content is kept in memory."""
+    name = "pinata"
+
+    def __init__(self, profile: Optional[ServiceProfile] = None):
+        super().__init__(profile)
+        self.pins: Dict[str, bytes] = {}
+        self._pins_lock = threading.Lock()
+
+    def pin(self, content: bytes) -> str:
+        cid = "bafkfake" + hashlib.sha256(content).hexdigest()[:40]
+        with self._pins_lock:
+            self.pins[cid] = content
+        return cid
+
+    def handle(self, method, path, body, headers):
+        route = urlparse(path).path
+        if method == "POST" and route.endswith("/pinning/pinJSONToIPFS"):
+            return 200, {"IpfsHash": self.pin(body), "PinSize": len(body)}, "application/json"
+        if method == "POST" and route.endswith("/pinning/pinFileToIPFS"):
+            # The multipart body is pinned whole; only the CID matters to the API.
+            return 200, {"IpfsHash": self.pin(body), "PinSize": len(body)}, "application/json"
+        if method == "GET" and route.startswith("/ipfs/"):
+            content = self.pins.get(route[len("/ipfs/"):])
+            if content is None:
+                return 404, {"error": "not pinned"}, "application/json"
+            return 200, content, "application/octet-stream"
+        if method == "GET" and route.endswith("/data/pinList"):
+            return 200, {"count": len(self.pins), "rows": []}, "application/json"
+        if method == "DELETE" and "/pinning/unpin/" in route:
+            return 200, "OK", "text/plain"
+        return 404, {"error": f"unknown route {route}"}, "application/json"
+
+
+class FakeEtherscan(FakeService):
+    """``module=contract&action=getsourcecode`` backed by recorded verified sources."""
+    name = "etherscan"
+
+    def __init__(self, profile: Optional[ServiceProfile] = None, sources: Optional[Dict[str, Dict]] = None):
+        super().__init__(profile)
+        self.sources = sources if sources is not None else load_recording("etherscan.json")
+
+    def handle(self, method, path, body, headers):
+        query = {k: v[0] for k, v in parse_qs(urlparse(path).query).items()}
+        if query.get("module") != "contract" or query.get("action") != "getsourcecode":
+            return 200, {"status": "0", "message": "NOTOK", "result": "Unsupported action"}, "application/json"
+        address = query.get("address", "").lower()
+        entry = self.sources.get(address) or self.sources.get("default")
+        if not entry:
+            return 200, {"status": "1", "message": "OK", "result": [{"SourceCode": "", "ContractName": ""}]}, "application/json"
+        return 200, {"status": "1", "message": "OK", "result": [entry]}, "application/json"
+
+
+def _camel_case_keys(value):
+    if isinstance(value, list):
+        return [_camel_case_keys(item) for item in value]
+    if isinstance(value, dict):
+        return {
+            re.sub(r'_([a-z])', lambda m: m.group(1).upper(), key): _camel_case_keys(item)
+            for key, item in value.items()
+        }
+    return value
+
+
+class FakeRPC(FakeService):
+    """
+    JSON-RPC endpoint backed by an in-process EVM (``EthereumTesterProvider``),
+    standing in for the L1X RPC. Batch requests are supported. Like a node's
+    mempool, raw transactions that arrive ahead of their sender's nonce are
+    held until the gap is filled; other EVM rejections become JSON-RPC errors.
+    """
+    name = "rpc"
+
+    def __init__(self, profile: Optional[ServiceProfile] = None):
+        super().__init__(profile)
+        from web3 import EthereumTesterProvider, Web3
+
+        self.provider = EthereumTesterProvider()
+        self.w3 = Web3(self.provider)
+        # eth-tester is not thread-safe; the HTTP server is.
+        self._evm_lock = threading.Lock()
+        self._queued: Dict[str, Dict[int, str]] = {}    # sender -> nonce -> raw tx
+
+    def fund_new_account(self, value_wei: int = 10**21) -> str:
+        """Create and fund an account for the API's service key; returns its private key."""
+        account = self.w3.eth.account.create()
+        with self._evm_lock:
+            tx_hash = self.w3.eth.send_transaction({
+                "from": self.w3.eth.accounts[0],
+                "to": account.address,
+                "value": value_wei
+            })
+            self.w3.eth.wait_for_transaction_receipt(tx_hash)
+        return account.key.hex()
+
+    def _send_raw(self, raw_tx: str) -> Dict:
+        """``eth_sendRawTransaction`` with future nonces queued per sender; caller holds the EVM lock."""
+        from eth_account import Account
+        from eth_account.typed_transactions import TypedTransaction
+        from eth_account._utils.legacy_transactions import Transaction
+        from web3 import Web3
+
+        raw = Web3.to_bytes(hexstr=raw_tx)
+        decoded = TypedTransaction.from_bytes(raw).as_dict() if raw[0] < 0x80 else Transaction.from_bytes(raw).as_dict()
+        sender = Account.recover_transaction(raw)
+        expected = self.w3.eth.get_transaction_count(sender)
+        if decoded["nonce"] > expected:
+            self._queued.setdefault(sender, {})[decoded["nonce"]] = raw_tx
+            return {"result": Web3.to_hex(Web3.keccak(raw))}
+        response = self.provider.make_request("eth_sendRawTransaction", [raw_tx])
+        queued = self._queued.get(sender, {})
+        while "error" not in response and self.w3.eth.get_transaction_count(sender) in queued:
+            self.provider.make_request("eth_sendRawTransaction", [queued.pop(self.w3.eth.get_transaction_count(sender))])
+        return response
+
+    def _call(self, request: Dict) -> Dict:
+        method, params = request.get("method"), request.get("params", [])
+        with self._evm_lock:
+            try:
+                if method == "eth_sendRawTransaction":
+                    response = self._send_raw(params[0])
+                elif method == "eth_getLogs":
+                    # eth-tester's filter takes snake_case keys and int block numbers; nodes camelCase and hex
+                    log_filter = {re.sub(r'([A-Z])', lambda m: "_" + m.group(1).lower(), key): value
+                                  for key, value in params[0].items()}
+                    for key in ("from_block", "to_block"):
+                        if isinstance(log_filter.get(key), str) and log_filter[key].startswith("0x"):
+                            log_filter[key] = int(log_filter[key], 16)
+                    response = self.provider.make_request(method, [log_filter])
+                elif method == "eth_getBlockByNumber" and str(params[0]).startswith("0x"):
+                    response = self.provider.make_request(method, [int(params[0], 16), *params[1:]])
+                else:
+                    response = self.provider.make_request(method, params)
+            except Exception as e:
+                response = {"error": {"code": -32000, "message": str(e)}}
+        # eth-tester answers with HexBytes/AttributeDict and snake_case keys; encode them the way a node would
+        response = _camel_case_keys(json.loads(self.w3.to_json(response)))
+        return {**response, "jsonrpc": "2.0", "id": request.get("id")}
+
+    def handle(self, method, path, body, headers):
+        payload = json.loads(body or b"{}")
+        if isinstance(payload, list):
+            return 200, [self._call(item) for item in payload], "application/json"
+        return 200, self._call(payload), "application/json"
+
+
+def start_fakes(profiles: Dict[str, Dict[str, Any]], with_rpc: bool = True) -> Dict[str, FakeService]:
+    """Start every fake service with its profile and return them by name."""
+    fakes: Dict[str, FakeService] = {
+        "openrouter": FakeOpenRouter(ServiceProfile.from_dict(profiles.get("openrouter"))),
+        "pinata": FakePinata(ServiceProfile.from_dict(profiles.get("pinata"))),
+        "etherscan": FakeEtherscan(ServiceProfile.from_dict(profiles.get("etherscan"))),
+    }
+    if with_rpc:
+        fakes["rpc"] = FakeRPC(ServiceProfile.from_dict(profiles.get("rpc")))
+    for fake in fakes.values():
+        fake.start()
+    return fakes
+
+
+def stop_fakes(fakes: Dict[str, FakeService]):
+    for fake in fakes.values():
+        fake.stop()
@@ -0,0 +1,266 @@
+"""
+Load-test driver for the audit API.
+
+Starts the local fakes (see ``loadtest/fakes.py``), launches the API in a
+subprocess pointed at them through its environment, then drives one
+endpoint at a fixed concurrency and reports throughput, latency
+percentiles and an error breakdown.
+
+Usage (from ``smart-audit-backend``):
+
+    python -m loadtest.run --endpoint audit-only --concurrency 16 --requests 200
+    python -m loadtest.run --endpoint audit-deployed-contract --profile loadtest/profiles/instant.json
+    python -m loadtest.run --target http://localhost:8000 --endpoint comprehensive-audit
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from loadtest.fakes import start_fakes, stop_fakes
+
+logger = logging.getLogger("loadtest")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_PROFILE = Path(__file__).parent / "profiles" / "default.json"
+DEFAULT_CONTRACTS_DIR = BACKEND_DIR / "deployments"
+ENDPOINTS = ("audit-only", "comprehensive-audit", "audit-deployed-contract")
+# First whitelisted wallet: bypasses the one-audit-per-wallet restriction.
+DEFAULT_WALLET = "0xb97fcdcd02fe2b50d8014b80080c904845e027f1"
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def load_contracts(contracts_dir: Path) -> List[Dict[str, str]]:
+    contracts = [
+        {"filename": path.name, "source": path.read_text(encoding="utf-8")}
+        for path in sorted(contracts_dir.glob("*.sol"))
+        if not path.stem.endswith("_fixed")
+    ]
+    if not contracts:
+        raise SystemExit(f"No .sol files found in {contracts_dir}")
+    return contracts
+
+
+def app_environment(fakes) -> Dict[str, str]:
+    """Environment that points every external integration of the API at the fakes."""
+    env = os.environ.copy()
+    env.update({
+        "OPENROUTER_API_KEY": "loadtest",
+        "OPENROUTER_URL": f"{fakes['openrouter'].url}/api/v1/chat/completions",
+        "PINATA_API_KEY": "loadtest",
+        "PINATA_API_SECRET": "loadtest",
+        "PINATA_API_URL": fakes["pinata"].url,
+        "PINATA_GATEWAY_URL": fakes["pinata"].url,
+        "ETHERSCAN_API_KEY": "loadtest",
+        "ETHERSCAN_API_URL": f"{fakes['etherscan'].url}/api",
+        "MONGO_URI": env.get("LOADTEST_MONGO_URI", "mongodb://127.0.0.1:27017"),
+        "DB_NAME": env.get("LOADTEST_DB_NAME", "auditsmart_loadtest"),
+        "PYTHONPATH": str(BACKEND_DIR),
+    })
+    if "rpc" in fakes:
+        env["L1X_RPC_URL"] = fakes["rpc"].url
+        env["PRIVATE_KEY"] = fakes["rpc"].fund_new_account()
+    return env
+
+
+def start_app(env: Dict[str, str], port: int, workdir: str, workers: Optional[int] = None) -> subprocess.Popen:
+    """
+    Run the API in a scratch directory so it can't touch tracked files:
+    plain uvicorn, or the pre-fork server (``app.serve``) with ``workers``.
+    """
+    if workers:
+        command = [sys.executable, "-m", "app.serve", "--host", "127.0.0.1", "--port", str(port),
+                   "--workers", str(workers), "--log-level", "warning"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "app.main:app", "--app-dir", str(BACKEND_DIR),
+                   "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    return subprocess.Popen(command, cwd=workdir, env=env)
+
+
+async def wait_until_ready(base_url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.25)
+    raise TimeoutError(f"API at {base_url} did not become ready within {timeout}s")
+
+
+def build_request(endpoint: str, contract: Dict[str, str], wallet: str, address: str) -> Dict:
+    if endpoint == "audit-deployed-contract":
+        return {"json": {"address": address}}
+    request = {"files": {"file": (contract["filename"], contract["source"].encode("utf-8"), "text/plain")}}
+    if endpoint == "audit-only":
+        request["headers"] = {"wallet-address": wallet}
+    return request
+
+
+async def drive(base_url: str, endpoint: str, concurrency: int, total_requests: int,
+                duration: Optional[float], contracts: List[Dict[str, str]], wallet: str,
+                address: str, timeout: float) -> Dict:
+    """Closed-loop load: ``concurrency`` workers issue requests back to back."""
+    url = f"{base_url}/api/v1/{endpoint}/"
+    latencies: List[float] = []
+    outcomes: Counter = Counter()
+    issued = 0
+    deadline = time.monotonic() + duration if duration else None
+
+    def next_slot() -> bool:
+        nonlocal issued
+        if deadline is not None:
+            return time.monotonic() < deadline
+        if issued >= total_requests:
+            return False
+        issued += 1
+        return True
+
+    async def worker(client: httpx.AsyncClient):
+        while next_slot():
+            request = build_request(endpoint, random.choice(contracts), wallet, address)
+            started = time.perf_counter()
+            try:
+                response = await client.post(url, **request)
+                outcome = "ok" if response.status_code == 200 else f"http_{response.status_code}"
+            except httpx.TimeoutException:
+                outcome = "timeout"
+            except httpx.TransportError as e:
+                outcome = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            outcomes[outcome] += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    completed = len(latencies)
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": completed,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(completed / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "max": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        },
+        "success": outcomes.get("ok", 0),
+        "errors": {k: v for k, v in outcomes.items() if k != "ok"},
+    }
+
+
+def print_report(report: Dict, fakes=None):
+    print(f"\nEndpoint:     /api/v1/{report['endpoint']}/")
+    print(f"Concurrency:  {report['concurrency']}")
+    print(f"Requests:     {report['requests']} in {report['elapsed_s']}s")
+    print(f"Throughput:   {report['throughput_rps']} req/s")
+    latency = report["latency_ms"]
+    print(f"Latency (ms): p50={latency['p50']}  p95={latency['p95']}  p99={latency['p99']}  max={latency['max']}")
+    print(f"Success:      {report['success']}")
+    if report["errors"]:
+        print("Errors:")
+        for kind, count in sorted(report["errors"].items(), key=lambda item: -item[1]):
+            print(f"  {kind:<24} {count}")
+    if fakes:
+        print("Upstream calls:")
+        for name, fake in fakes.items():
+            print(f"  {name:<24} {fake.request_count}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the audit API against local fakes.")
+    parser.add_argument("--endpoint", choices=ENDPOINTS, default="audit-only")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="Total requests (ignored with --duration)")
+    parser.add_argument("--duration", type=float, help="Run for this many seconds instead of a fixed count")
+    parser.add_argument("--profile", type=Path, default=DEFAULT_PROFILE,
+                        help="JSON file with latency/error settings per fake service")
+    parser.add_argument("--contracts-dir", type=Path, default=DEFAULT_CONTRACTS_DIR)
+    parser.add_argument("--wallet", default=DEFAULT_WALLET, help="wallet-address header for /audit-only/")
+    parser.add_argument("--address", default="0x0000000000000000000000000000000000000001",
+                        help="Contract address for /audit-deployed-contract/")
+    parser.add_argument("--target", help="Drive an already running API instead of starting one (fakes are not used)")
+    parser.add_argument("--no-rpc", action="store_true", help="Don't start the in-process EVM")
+    parser.add_argument("--workers", type=int, help="Serve with app.serve and this many worker processes")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request client timeout in seconds")
+    parser.add_argument("--json", dest="json_out", type=Path, help="Also write the report as JSON to this path")
+    return parser.parse_args(argv)
+
+
+async def main_async(args) -> Dict:
+    contracts = load_contracts(args.contracts_dir)
+    if args.target:
+        report = await drive(args.target.rstrip("/"), args.endpoint, args.concurrency, args.requests,
+                             args.duration, contracts, args.wallet, args.address, args.timeout)
+        print_report(report)
+        return report
+
+    with open(args.profile, "r", encoding="utf-8") as f:
+        profiles = json.load(f)
+    fakes = start_fakes(profiles, with_rpc=not args.no_rpc)
+    app_process = None
+    try:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        with tempfile.TemporaryDirectory(prefix="auditsmart-loadtest-") as workdir:
+            app_process = start_app(app_environment(fakes), port, workdir, args.workers)
+            await wait_until_ready(base_url)
+            for fake in fakes.values():
+                fake.request_count = 0
+            report = await drive(base_url, args.endpoint, args.concurrency, args.requests,
+                                 args.duration, contracts, args.wallet, args.address, args.timeout)
+            report["upstream_requests"] = {name: fake.request_count for name, fake in fakes.items()}
+            print_report(report, fakes)
+            app_process.terminate()
+            app_process.wait(timeout=30)
+            return report
+    finally:
+        if app_process and app_process.poll() is None:
+            app_process.kill()
+        stop_fakes(fakes)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    args = parse_args(argv)
+    report = asyncio.run(main_async(args))
+    if args.json_out:
+        args.json_out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Multi-process scaling benchmark.
+
+Runs the same closed-loop load (see ``loadtest/run.py``) against the
+pre-fork server (``app.serve``) once per worker count and reports
+throughput, speedup over one worker and parallel efficiency. Concurrency
+scales with the worker count by default so every worker has requests in
+flight.
+
+Usage (from ``smart-audit-backend``):
+
+    python -m loadtest.scaling --workers 1 2 4 --profile loadtest/profiles/instant.json
+    python -m loadtest.scaling --workers 1 2 4 8 --endpoint comprehensive-audit --duration 30
+
+The fakes and the load generator run in this process, so on a machine
+with few cores they compete with the workers for CPU; leave at least one
+core free to measure the server rather than the driver.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List
+
+from loadtest.run import DEFAULT_PROFILE, ENDPOINTS, main_async, parse_args
+
+
+def print_table(results: List[Dict]):
+    base = results[0]["throughput_rps"] or 1e-9
+    print(f"\nCPU cores: {os.cpu_count()}")
+    print(f"{'workers':>8} {'concurrency':>12} {'req/s':>10} {'speedup':>9} {'efficiency':>11} {'p95 ms':>9} {'errors':>7}")
+    for r in results:
+        speedup = r["throughput_rps"] / base
+        print(f"{r['workers']:>8} {r['concurrency']:>12} {r['throughput_rps']:>10.2f} {speedup:>8.2f}x "
+              f"{speedup / r['workers'] * results[0]['workers']:>10.0%} {r['latency_ms']['p95']:>9.1f} "
+              f"{sum(r['errors'].values()):>7}")
+
+
+async def run_scaling(args) -> List[Dict]:
+    results = []
+    for workers in args.workers:
+        concurrency = args.concurrency_per_worker * workers if not args.fixed_concurrency else args.concurrency_per_worker
+        run_args = parse_args([
+            "--endpoint", args.endpoint,
+            "--concurrency", str(concurrency),
+            "--requests", str(args.requests_per_worker * workers),
+            "--profile", str(args.profile),
+            "--workers", str(workers),
+            "--no-rpc",
+        ] + (["--duration", str(args.duration)] if args.duration else []))
+        report = await main_async(run_args)
+        report["workers"] = workers
+        results.append(report)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure API throughput against the number of worker processes.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--endpoint", choices=ENDPOINTS, default="audit-only")
+    parser.add_argument("--concurrency-per-worker", type=int, default=8)
+    parser.add_argument("--fixed-concurrency", action="store_true",
+                        help="Use --concurrency-per-worker as the total for every run")
+    parser.add_argument("--requests-per-worker", type=int, default=100)
+    parser.add_argument("--duration", type=float, help="Seconds per run instead of a request count")
+    parser.add_argument("--profile", type=Path, default=DEFAULT_PROFILE)
+    parser.add_argument("--json", dest="json_out", type=Path, help="Also write the results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    results = asyncio.run(run_scaling(args))
+    print_table(results)
+    if args.json_out:
+        args.json_out.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
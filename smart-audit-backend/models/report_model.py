@@ -1,5 +1,5 @@
 # In your report_model.py or equivalent
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any
 from datetime import datetime
 
@@ -12,4 +12,4 @@ class MintingReport(BaseModel):
     block_number: int
     gas_used: int
     recipient: str
-    created_at: datetime = datetime.utcnow()
\ No newline at end of file
+    created_at: datetime = Field(default_factory=datetime.utcnow)     # per record, not per import
\ No newline at end of file
@@ -0,0 +1,243 @@
+"""
+Persistent, searchable history of audit results.
+
+Every completed audit is stored in the ``audits`` collection as one
+compact document: the query fields (wallet, source hash, contract name,
+severities, date), the de-duplicated findings (``app.findings``) with
+their text trimmed to ``AUDIT_HISTORY_TEXT_LIMIT`` characters, the stage
+timings, and the full API response as zlib-compressed JSON. Writes are
+scheduled in the background after the response is built, so a slow or
+unavailable MongoDB never delays an audit.
+
+Lookups by wallet, source hash, contract name, severity and date are
+served by compound indexes ending in ``(created_at, _id)``, keyset
+paginated like the minting reports; ``q`` searches finding titles and
+descriptions through a text index.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from app.config import AUDIT_HISTORY_ENABLED, AUDIT_HISTORY_TEXT_LIMIT, REPORTS_MAX_PAGE_SIZE
+from reports.minting_reports import ASCENDING, DESCENDING, decode_cursor, encode_cursor, run_db
+from utils.connect_db import get_db
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "audits"
+SEVERITIES = ("critical", "high", "medium", "low", "informational", "optimization")
+SUMMARY_FIELDS = ("created_at", "endpoint", "wallet", "contract_name", "contract_address", "source_hash",
+                  "max_severity", "severities", "finding_count", "risk_score", "llm_status", "slither_status", "uris",
+                  "timings_ms", "report_bytes")
+
+_pending: Set[asyncio.Task] = set()
+history_stats = {"scheduled": 0, "stored": 0, "failed": 0, "compressed_bytes": 0, "raw_bytes": 0}
+
+
+def audits_collection():
+    return get_db()[COLLECTION]
+
+
+def ensure_indexes():
+    collection = audits_collection()
+    newest = [("created_at", DESCENDING), ("_id", DESCENDING)]
+    collection.create_index(newest, name="created_at")
+    for field in ("wallet", "source_hash", "contract_name", "severities"):
+        collection.create_index([(field, ASCENDING)] + newest, name=f"{field}_created_at")
+    collection.create_index(
+        [("findings.title", "text"), ("findings.description", "text")],
+        weights={"findings.title": 5, "findings.description": 1},
+        default_language="none",        # keep Solidity identifiers and terms as written
+        name="findings_text"
+    )
+
+
+def source_hash(source: str) -> str:
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def _severity(value: Any) -> str:
+    value = str(value or "").strip().lower()
+    return value if value in SEVERITIES else "informational"
+
+
+def _trim(value: Any) -> str:
+    text = str(value or "")
+    return text if len(text) <= AUDIT_HISTORY_TEXT_LIMIT else text[:AUDIT_HISTORY_TEXT_LIMIT] + "…"
+
+
+def structured_findings(result: Dict) -> List[Dict]:
+    """Findings of an audit result in one compact, uniform shape: the de-duplicated set when present."""
+    normalized = result.get("findings")
+    if isinstance(normalized, dict) and normalized.get("vulnerabilities") is not None:
+        return [{
+            "source": "+".join(f.get("sources") or []),
+            "title": _trim(f.get("title")),
+            "severity": _severity(f.get("severity")),
+            "category": f.get("category"),
+            "swc": f.get("swc"),
+            "description": _trim(f.get("description")),
+            "location": _trim(f.get("location")),
+        } for f in normalized["vulnerabilities"]]
+    findings = []
+    slither = result.get("slither_vulnerabilities")
+    for issue in slither if isinstance(slither, list) else []:
+        findings.append({
+            "source": "slither",
+            "title": issue.get("vulnerability") or "",
+            "severity": _severity(issue.get("severity") or issue.get("impact")),
+            "description": _trim(issue.get("description")),
+            "location": f"line {issue['line']}" if issue.get("line") is not None else "",
+        })
+    for vuln in (result.get("llm_vulnerabilities") or {}).get("vulnerabilities", []) or []:
+        findings.append({
+            "source": "llm",
+            "title": _trim(vuln.get("title")),
+            "severity": _severity(vuln.get("severity")),
+            "description": _trim(vuln.get("description")),
+            "location": _trim(vuln.get("location")),
+        })
+    return findings
+
+
+def audit_document(endpoint: str, source: str, result: Dict, wallet: Optional[str] = None,
+                   contract_address: Optional[str] = None) -> Dict:
+    from bson import Binary
+    findings = structured_findings(result)
+    severities = sorted({f["severity"] for f in findings}, key=SEVERITIES.index)
+    llm = result.get("llm_vulnerabilities") or {}
+    raw = json.dumps(result, default=str, separators=(",", ":")).encode("utf-8")
+    compressed = zlib.compress(raw, 6)
+    history_stats["raw_bytes"] += len(raw)
+    history_stats["compressed_bytes"] += len(compressed)
+    return {
+        "created_at": datetime.utcnow(),
+        "endpoint": endpoint,
+        "wallet": wallet.lower() if wallet else None,
+        "contract_name": result.get("contract_name"),
+        "contract_address": contract_address.lower() if contract_address else None,
+        "source_hash": source_hash(source),
+        "max_severity": severities[0] if severities else None,
+        "severities": severities,
+        "finding_count": len(findings),
+        "risk_score": llm.get("overall_risk_score"),
+        "llm_status": llm.get("analysis_status", "complete") if llm else "skipped",
+        "slither_status": (result.get("analysis_summary") or {}).get("slither_status"),
+        "findings": findings,
+        "uris": {key: result.get(key) for key in ("original_uri", "fixed_uri", "report_uri")},
+        "timings_ms": result.get("stage_timings_ms", {}),
+        "report_bytes": len(raw),
+        "report": Binary(compressed),
+    }
+
+
+def insert_audit(doc: Dict) -> str:
+    return str(audits_collection().insert_one(doc).inserted_id)
+
+
+async def _store(endpoint: str, source: str, result: Dict, wallet: Optional[str], contract_address: Optional[str]):
+    try:
+        doc = await asyncio.to_thread(audit_document, endpoint, source, result, wallet, contract_address)
+        await run_db(insert_audit, doc)
+        history_stats["stored"] += 1
+    except Exception as e:
+        history_stats["failed"] += 1
+        logger.error(f"Could not store audit of {result.get('contract_name')} in the history: {e}")
+
+
+def record_audit(endpoint: str, source: str, result: Dict, wallet: Optional[str] = None,
+                 contract_address: Optional[str] = None):
+    """Store an audit result in the background; returns immediately."""
+    if not AUDIT_HISTORY_ENABLED:
+        return
+    history_stats["scheduled"] += 1
+    task = asyncio.ensure_future(_store(endpoint, source, result, wallet, contract_address))
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+def find_audits(wallet: Optional[str] = None, source_hash: Optional[str] = None,
+                contract_name: Optional[str] = None, severity: Optional[str] = None,
+                since: Optional[datetime] = None, until: Optional[datetime] = None,
+                q: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None) -> Dict:
+    """
+    One page of audit summaries (newest first) matching every given filter;
+    pass the returned ``next_cursor`` to get the following page. ``q`` is a
+    text search over finding titles and descriptions.
+    """
+    limit = max(1, min(limit, REPORTS_MAX_PAGE_SIZE))
+    query: Dict[str, Any] = {}
+    if wallet:
+        query["wallet"] = wallet.lower()
+    if source_hash:
+        query["source_hash"] = source_hash.lower()
+    if contract_name:
+        query["contract_name"] = contract_name
+    if severity:
+        if severity.lower() not in SEVERITIES:
+            raise ValueError(f"Unknown severity: {severity}")
+        query["severities"] = severity.lower()
+    if since or until:
+        query["created_at"] = {**({"$gte": since} if since else {}), **({"$lt": until} if until else {})}
+    if q:
+        query["$text"] = {"$search": q}
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": last_id}},
+        ]
+    projection = {field: 1 for field in SUMMARY_FIELDS}
+    projection["findings"] = 1
+
+    docs = list(
+        audits_collection()
+        .find(query, projection)
+        .sort([("created_at", DESCENDING), ("_id", DESCENDING)])
+        .limit(limit + 1)
+    )
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    next_cursor = encode_cursor(docs[-1]) if has_more else None
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+    return {"audits": docs, "next_cursor": next_cursor, "has_more": has_more}
+
+
+def get_audit(audit_id: str, include_report: bool = True) -> Optional[Dict]:
+    """One stored audit, with the compressed response expanded under ``report``."""
+    from bson import ObjectId
+    from bson.errors import InvalidId
+    try:
+        oid = ObjectId(audit_id)
+    except (InvalidId, TypeError):
+        raise ValueError("Invalid audit id")
+    doc = audits_collection().find_one({"_id": oid}, None if include_report else {"report": 0})
+    if doc is None:
+        return None
+    doc["_id"] = str(doc["_id"])
+    if include_report and doc.get("report") is not None:
+        doc["report"] = json.loads(zlib.decompress(doc["report"]))
+    return doc
+
+
+def get_history_stats() -> Dict:
+    raw = history_stats["raw_bytes"]
+    return {
+        **history_stats,
+        "pending": len(_pending),
+        "compression_ratio": round(history_stats["compressed_bytes"] / raw, 3) if raw else None,
+    }
+
+
+async def prepare_indexes():
+    """Startup hook: create the indexes without holding up startup if MongoDB is slow or down."""
+    try:
+        await run_db(ensure_indexes)
+        logger.info("Audit history indexes ready")
+    except Exception as e:
+        logger.error(f"Could not create audit history indexes: {e}")
@@ -0,0 +1,175 @@
+"""
+Data access for minting reports.
+
+All queries run on a small dedicated thread pool (``run_db``) so the
+synchronous pymongo driver never blocks the event loop. Indexes are
+created once, at startup (``ensure_indexes``), instead of on every insert.
+Listing by recipient is keyset-paginated on ``(created_at, _id)`` and
+served by the ``recipient_created_at`` index, so a recipient with many
+certificates costs one bounded page per request.
+"""
+import asyncio
+import base64
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import REPORTS_DB_WORKERS, REPORTS_MAX_PAGE_SIZE
+from utils.connect_db import get_db
+
+logger = logging.getLogger(__name__)
+
+# pymongo/bson are imported inside the functions that use them, so importing this module
+# (and the app) doesn't load the driver
+ASCENDING, DESCENDING = 1, -1
+COLLECTION = "reports"
+REPORT_FIELDS = ("metadata", "token_id", "token_uri", "nft_contract", "transaction_hash",
+                 "block_number", "gas_used", "recipient", "created_at", "orphaned")
+
+DUPLICATE_KEY_ERROR = 11000
+
+_executor = ThreadPoolExecutor(max_workers=REPORTS_DB_WORKERS, thread_name_prefix="reports-db")
+
+
+async def run_db(fn: Callable, *args, **kwargs):
+    """Run a blocking pymongo call on the reports thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, lambda: fn(*args, **kwargs))
+
+
+def reports_collection():
+    return get_db()[COLLECTION]
+
+
+def ensure_indexes():
+    collection = reports_collection()
+    collection.create_index(
+        [("transaction_hash", ASCENDING), ("token_id", ASCENDING)],
+        unique=True,
+        name="tx_hash_token_id_unique"
+    )
+    collection.create_index(
+        [("recipient", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+        name="recipient_created_at"
+    )
+
+
+def report_document(report: Dict) -> Dict:
+    """Stored form of a minting report: known fields only, recipient lowercased."""
+    doc = {field: report.get(field) for field in REPORT_FIELDS}
+    doc["recipient"] = doc["recipient"].lower()
+    doc["created_at"] = doc["created_at"] or datetime.utcnow()
+    doc["orphaned"] = False     # only set by the Transfer indexer, when a reorg drops the mint's block
+    return doc
+
+
+def insert_report(report: Dict) -> Tuple[str, bool]:
+    """Insert one report; returns (id, is_duplicate), relying on the unique index for duplicates."""
+    from pymongo.errors import DuplicateKeyError
+    collection = reports_collection()
+    doc = report_document(report)
+    try:
+        return str(collection.insert_one(doc).inserted_id), False
+    except DuplicateKeyError:
+        existing = collection.find_one(
+            {"transaction_hash": doc["transaction_hash"], "token_id": doc["token_id"]}, {"_id": 1})
+        return str(existing["_id"]), True
+
+
+def insert_reports(reports: List[Dict]) -> Dict:
+    """
+    Unordered bulk insert. Records already stored (same transaction hash and
+    token id) are rejected by the unique index and counted as duplicates,
+    without stopping the rest of the batch.
+    """
+    from pymongo.errors import BulkWriteError
+    if not reports:
+        return {"inserted": 0, "duplicates": 0, "errors": []}
+    try:
+        result = reports_collection().insert_many([report_document(r) for r in reports], ordered=False)
+        return {"inserted": len(result.inserted_ids), "duplicates": 0, "errors": []}
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        duplicates = sum(1 for err in write_errors if err.get("code") == DUPLICATE_KEY_ERROR)
+        errors = [{"index": err.get("index"), "error": err.get("errmsg")}
+                  for err in write_errors if err.get("code") != DUPLICATE_KEY_ERROR]
+        return {"inserted": e.details.get("nInserted", 0), "duplicates": duplicates, "errors": errors}
+
+
+def set_orphaned(keys: List[Tuple[str, str]], orphaned: bool = True) -> int:
+    """
+    Flag the reports of the given (transaction hash, token id) mints as
+    orphaned (their block was reorganized away), or clear the flag once the
+    transaction is mined again. Returns the number of reports changed.
+    """
+    if not keys:
+        return 0
+    # Token ids are decimal strings from the indexer but may be integers in reports POSTed by clients
+    query = {"$or": [{"transaction_hash": tx_hash, "token_id": {"$in": [token_id, int(token_id)]}}
+                     for tx_hash, token_id in keys],
+             "orphaned": {"$ne": True} if orphaned else True}
+    return reports_collection().update_many(query, {"$set": {"orphaned": orphaned}}).modified_count
+
+
+def encode_cursor(doc: Dict) -> str:
+    payload = json.dumps({"created_at": doc["created_at"].isoformat(), "id": str(doc["_id"])})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, Any]:
+    from bson import ObjectId
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(payload["created_at"]), ObjectId(payload["id"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def find_reports_by_recipient(recipient: str, limit: int = 50, cursor: Optional[str] = None,
+                              fields: Optional[List[str]] = None, newest_first: bool = True) -> Dict:
+    """
+    One page of ``recipient``'s reports in ``created_at`` order.
+    ``fields`` limits the returned fields (``_id`` and ``created_at`` are
+    always included, as the cursor needs them); pass the returned
+    ``next_cursor`` to get the following page.
+    """
+    limit = max(1, min(limit, REPORTS_MAX_PAGE_SIZE))
+    unknown = set(fields or []) - set(REPORT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown report fields: {', '.join(sorted(unknown))}")
+
+    query: Dict[str, Any] = {"recipient": recipient.lower()}
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        op = "$lt" if newest_first else "$gt"
+        query["$or"] = [
+            {"created_at": {op: created_at}},
+            {"created_at": created_at, "_id": {op: last_id}},
+        ]
+    projection = {field: 1 for field in (fields or REPORT_FIELDS)}
+    projection["created_at"] = 1
+    direction = DESCENDING if newest_first else ASCENDING
+
+    docs = list(
+        reports_collection()
+        .find(query, projection)
+        .sort([("created_at", direction), ("_id", direction)])
+        .limit(limit + 1)
+    )
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    next_cursor = encode_cursor(docs[-1]) if has_more else None
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+    return {"reports": docs, "next_cursor": next_cursor, "has_more": has_more}
+
+
+async def prepare_indexes():
+    """Startup hook: create the indexes without holding up startup if MongoDB is slow or down."""
+    try:
+        await run_db(ensure_indexes)
+        logger.info("Minting report indexes ready")
+    except Exception as e:
+        logger.error(f"Could not create minting report indexes: {e}")
@@ -0,0 +1,175 @@
+from app.config import FINDINGS_MERGE_SLACK
+from app.findings import (
+    IntervalIndex,
+    NormalizedFinding,
+    findings_prompt,
+    issues_within,
+    llm_category,
+    merge_findings,
+    normalize_findings,
+)
+
+SOURCE = """pragma solidity ^0.8.0;
+
+contract Vault {
+    mapping(address => uint256) balances;
+
+    function deposit() external payable {
+        balances[msg.sender] += msg.value;
+    }
+
+    function withdraw(uint256 amount) external {
+        require(balances[msg.sender] >= amount);
+        (bool ok, ) = msg.sender.call{value: amount}("");
+        require(ok);
+        balances[msg.sender] -= amount;
+    }
+}
+"""
+
+
+def finding(category, scope=None, severity="medium", title=None, source="slither", **kwargs):
+    return NormalizedFinding(category=category, severity=severity, title=title or category, lines=scope,
+                             scope=scope, sources=[source], **kwargs)
+
+
+def test_overlapping_scopes_of_one_category_merge():
+    merged = merge_findings([finding("reentrancy", (10, 15)), finding("reentrancy", (12, 12), source="llm")])
+    assert len(merged) == 1
+    assert merged[0].scope == (10, 15)
+    assert merged[0].sources == ["llm", "slither"]
+    assert merged[0].merged == 2
+
+
+def test_merge_slack_boundary():
+    slack = 2
+    within = merge_findings([finding("reentrancy", (10, 12)), finding("reentrancy", (12 + slack, 16))], slack=slack)
+    beyond = merge_findings([finding("reentrancy", (10, 12)), finding("reentrancy", (13 + slack, 16))], slack=slack)
+    assert len(within) == 1
+    assert within[0].scope == (10, 16)
+    assert len(beyond) == 2
+
+
+def test_default_slack_is_configured_slack():
+    gap = FINDINGS_MERGE_SLACK
+    assert len(merge_findings([finding("tx-origin", (20, 20)), finding("tx-origin", (20 + gap, 20 + gap))])) == 1
+    assert len(merge_findings([finding("tx-origin", (20, 20)), finding("tx-origin", (21 + gap, 21 + gap))])) == 2
+
+
+def test_zero_slack_merges_only_overlaps():
+    assert len(merge_findings([finding("reentrancy", (10, 12)), finding("reentrancy", (12, 14))], slack=0)) == 1
+    assert len(merge_findings([finding("reentrancy", (10, 12)), finding("reentrancy", (13, 14))], slack=0)) == 2
+
+
+def test_different_categories_on_the_same_lines_stay_apart():
+    merged = merge_findings([finding("reentrancy", (10, 15)), finding("unchecked-call", (10, 15))])
+    assert sorted(f.category for f in merged) == ["reentrancy", "unchecked-call"]
+
+
+def test_contract_wide_categories_merge_regardless_of_location():
+    merged = merge_findings([
+        finding("floating-pragma", (1, 1)),
+        finding("floating-pragma", None, title="Floating Pragma", source="llm"),
+        finding("floating-pragma", (40, 40)),
+        finding("outdated-compiler", (1, 1)),
+        finding("outdated-compiler", None, source="llm"),
+    ])
+    by_category = {f.category: f for f in merged}
+    assert len(merged) == 2
+    assert by_category["floating-pragma"].merged == 3
+    assert by_category["outdated-compiler"].merged == 2
+
+
+def test_unlocated_findings_merge_only_on_category_and_title():
+    merged = merge_findings([
+        finding("access-control", None, title="Missing access control", source="llm"),
+        finding("access-control", None, title="Missing Access Control!", source="llm"),
+        finding("access-control", None, title="Unprotected initializer", source="llm"),
+        finding("access-control", (10, 15)),
+    ])
+    assert sorted(f.merged for f in merged) == [1, 1, 2]
+
+
+def test_merged_finding_keeps_highest_severity_and_llm_wording():
+    merged = merge_findings([
+        finding("reentrancy", (10, 15), severity="medium", description="slither text"),
+        finding("reentrancy", (12, 12), severity="high", title="Reentrancy in withdraw", source="llm",
+                description="llm text"),
+    ])
+    assert len(merged) == 1
+    assert merged[0].severity == "high"
+    assert merged[0].title == "Reentrancy in withdraw"
+    assert merged[0].description == "llm text"
+
+
+def test_interval_index_overlap_query():
+    index = IntervalIndex()
+    index.add(1, 50, 0)
+    index.add(60, 61, 1)
+    index.add(70, 80, 2)
+    assert sorted(index.overlapping(40, 60)) == [0, 1]
+    assert index.overlapping(62, 69) == []
+    index.remove(1, 50, 0)
+    assert index.overlapping(40, 60) == [1]
+
+
+def test_llm_category_uses_first_matching_pattern():
+    assert llm_category("Reentrancy via external call") == "reentrancy"
+    assert llm_category("Integer overflow in deposit") == "integer-overflow"
+    assert llm_category("Weird issue", "Classic reentrancy in the payout path") == "reentrancy"
+    # The title is matched before the description
+    assert llm_category("Anyone can withdraw", "Classic reentrancy in the payout path") == "unprotected-withdrawal"
+    assert llm_category("Something new") == "other:something-new"
+
+
+def test_normalize_findings_merges_slither_and_llm_reports_of_one_issue():
+    slither = [
+        {"check": "reentrancy-eth", "impact": "High", "confidence": "Medium", "line": 12},
+        {"check": "pragma", "impact": "Informational", "line": 1},
+    ]
+    llm = {"vulnerabilities": [
+        {"title": "Reentrancy in withdraw", "severity": "Critical", "location": "withdraw()",
+         "description": "State is updated after the external call."},
+        {"title": "Floating pragma", "severity": "Low", "location": ""},
+    ]}
+    result = normalize_findings(SOURCE, slither, llm, "Vault")
+    assert result["total_vulnerabilities"] == 2
+    assert result["source_counts"] == {"slither": 2, "llm": 2, "merged": 2, "found_by_both": 2}
+    reentrancy = result["vulnerabilities"][0]
+    assert reentrancy["category"] == "reentrancy"
+    assert reentrancy["swc"] == "SWC-107"
+    assert reentrancy["severity"] == "Critical"
+    assert reentrancy["function"] == "withdraw"
+    assert reentrancy["lines"] == [10, 15]
+    assert reentrancy["confidence"] == "High"
+
+
+def test_normalize_findings_ignores_a_slither_error():
+    result = normalize_findings(SOURCE, {"error": "Slither timed out"}, None, "Vault")
+    assert result["total_vulnerabilities"] == 0
+    assert result["source_counts"]["slither"] == 0
+
+
+def test_findings_prompt_lists_actionable_findings_only():
+    findings = normalize_findings(SOURCE, [
+        {"check": "reentrancy-eth", "impact": "High", "line": 12},
+        {"check": "naming-convention", "impact": "Informational", "line": 4},
+    ], None)
+    assert findings_prompt(findings) == "- [SWC-107 High] Reentrancy at line 12"
+
+
+def test_issues_within_keeps_overlapping_and_unlocated_issues():
+    issues = "\n".join([
+        "- [SWC-107 High] Reentrancy at lines 20-25",
+        "- [SWC-115 High] Authorization through tx.origin at line 40",
+        "- [Medium] Centralization Risk",
+    ])
+    assert issues_within(issues, [(10, 21)]) == (
+        "- [SWC-107 High] Reentrancy at lines 20-25\n- [Medium] Centralization Risk")
+
+
+def test_issues_within_renumbers_to_chunk_lines():
+    issues = "- [SWC-107 High] Reentrancy at lines 20-22\n- [Low] Missing Event Emission at line 30"
+    # Chunk lines 1-3 show the contract header, 4-7 a member at original lines 19-22
+    line_map = [3, 4, 19, 19, 20, 21, 22, 50]
+    assert issues_within(issues, [(19, 22)], line_map) == "- [SWC-107 High] Reentrancy at lines 5-7"
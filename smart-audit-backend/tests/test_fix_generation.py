@@ -0,0 +1,74 @@
+import asyncio
+
+from app import llm_rewriter
+
+SOURCE = """pragma solidity ^0.8.0;
+
+contract Vault {
+    mapping(address => uint256) balances;
+
+    function deposit() external payable {
+        balances[msg.sender] += msg.value;
+    }
+
+    function withdraw(uint256 amount) external {
+        (bool ok, ) = msg.sender.call{value: amount}("");
+        require(ok);
+        balances[msg.sender] -= amount;
+    }
+}
+"""
+
+
+def test_chunked_fix_prompts_carry_the_findings_of_their_members(monkeypatch):
+    prompts = []
+
+    async def query(prompt, validator=None, **kwargs):
+        prompts.append(prompt)
+        member = "deposit" if "members: deposit" in prompt else "withdraw"
+        return f"```solidity\ncontract Vault {{\n    function {member}() external {{}}\n}}\n```"
+
+    monkeypatch.setattr(llm_rewriter, "LLM_FIX_CHUNK_TOKENS", 60)
+    monkeypatch.setattr(llm_rewriter, "query_openrouter", query)
+    known_issues = "- [SWC-107 High] Reentrancy at lines 10-14\n- [Medium] Centralization Risk"
+
+    asyncio.run(llm_rewriter.generate_fixed_contract(SOURCE, known_issues))
+
+    by_member = {("withdraw" if "members: withdraw" in p else "deposit"): p for p in prompts}
+    assert set(by_member) == {"deposit", "withdraw"}
+    assert "Reentrancy" in by_member["withdraw"]
+    assert "Reentrancy" not in by_member["deposit"]
+    assert all("Centralization Risk" in p for p in prompts)
+
+
+def speculate(result, monkeypatch):
+    monkeypatch.setattr(llm_rewriter, "speculation_stats", dict.fromkeys(llm_rewriter.speculation_stats, 0))
+
+    async def fix():
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def run(usable):
+        speculative = llm_rewriter.SpeculativeFix(fix())
+        try:
+            return await speculative.take(usable)
+        finally:
+            speculative.cancel()
+
+    return run
+
+
+def test_speculative_fix_counts_a_hit_only_when_used(monkeypatch):
+    run = speculate({"accepted": True}, monkeypatch)
+    assert asyncio.run(run(lambda r: r["accepted"])) == {"accepted": True}
+    stats = llm_rewriter.get_speculation_stats()
+    assert (stats["hits"], stats["rejected"]) == (1, 0)
+
+
+def test_rejected_or_failed_speculative_fix_is_not_a_hit(monkeypatch):
+    for result, usable in (({"accepted": False}, lambda r: r["accepted"]), (ValueError("no candidate compiled"), None)):
+        run = speculate(result, monkeypatch)
+        assert asyncio.run(run(usable)) is None
+        stats = llm_rewriter.get_speculation_stats()
+        assert (stats["hits"], stats["rejected"], stats["critical_path_saved_s"]) == (0, 1, 0)
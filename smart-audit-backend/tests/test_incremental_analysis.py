@@ -0,0 +1,109 @@
+import asyncio
+import re
+
+import pytest
+
+from app import llm_rewriter
+from app.finding_cache import FindingCache
+
+TOKEN = """pragma solidity ^0.8.0;
+
+contract Token {
+    mapping(address => uint256) balances;
+
+    function transfer(address to, uint256 amount) external {
+        balances[msg.sender] -= amount;
+        balances[to] += amount;
+    }
+}
+"""
+
+VAULT = """
+contract Vault {
+    uint256 total;
+
+    function withdraw(uint256 amount) external {
+        (bool ok, ) = msg.sender.call{value: amount}("");
+        total -= amount;
+    }
+}
+"""
+
+VAULT_EDITED = VAULT.replace("uint256 total;", "uint256 total;\n    address owner;")
+
+LOCKER = """
+contract Locker {
+    uint256 unlockAt;
+
+    function unlock() external {
+        require(block.timestamp > unlockAt);
+    }
+}
+"""
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    """Fake LLM analysis: one finding per function in scope; records which functions each prompt covered."""
+    calls = []
+
+    async def analyze(solidity_code, contract_name, scope_note=""):
+        scope = re.search(r"in scope: ([\w, ]+)\.", scope_note)
+        names = scope.group(1).split(", ") if scope else re.findall(r"function (\w+)\(", solidity_code)
+        calls.append(sorted(names))
+        return {
+            "contract_name": contract_name,
+            "vulnerabilities": [
+                {"title": f"Issue in {name}", "severity": "High", "location": f"{name}()"} for name in names
+            ],
+            "overall_risk_score": 7,
+            "summary": "fake analysis",
+        }
+
+    monkeypatch.setattr(llm_rewriter, "finding_cache", FindingCache())
+    monkeypatch.setattr(llm_rewriter, "_analyze_vulnerabilities", analyze)
+    return calls
+
+
+def run(source):
+    return asyncio.run(llm_rewriter._find_vulnerabilities_incremental(source, "Vault"))
+
+
+def statuses(result):
+    return {v["title"]: v["cache_status"] for v in result["vulnerabilities"]}
+
+
+def test_edited_contract_state_is_reanalyzed_while_other_contract_is_reused(analyzer):
+    run(TOKEN + VAULT)
+    analyzer.clear()
+
+    result = run(TOKEN + VAULT_EDITED)
+
+    assert "analysis_status" not in result
+    assert analyzer == [["withdraw"]]
+    assert statuses(result) == {"Issue in transfer": "reused", "Issue in withdraw": "fresh"}
+    assert result["incremental_analysis"]["units_reused"] == 1
+    assert result["incremental_analysis"]["units_analyzed"] == 1
+
+
+def test_added_contract_is_analyzed_while_existing_ones_are_reused(analyzer):
+    run(TOKEN + VAULT)
+    analyzer.clear()
+
+    result = run(TOKEN + VAULT + LOCKER)
+
+    assert "analysis_status" not in result
+    assert analyzer == [["unlock"]]
+    assert statuses(result) == {"Issue in transfer": "reused", "Issue in withdraw": "reused",
+                                "Issue in unlock": "fresh"}
+
+
+def test_reanalyzed_contract_is_cached_again(analyzer):
+    run(TOKEN + VAULT)
+    run(TOKEN + VAULT_EDITED)
+    analyzer.clear()
+
+    result = run(TOKEN + VAULT_EDITED)
+
+    assert analyzer == []
+    assert set(statuses(result).values()) == {"reused"}
@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import pytest
+
+from app import shared_state
+from app.llm_resilience import AdaptiveConcurrencyLimiter, CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def no_database(monkeypatch):
+    def connection():
+        raise AssertionError("single-process limits must not touch the shared database")
+
+    monkeypatch.setattr(shared_state, "_connection", connection)
+
+
+@pytest.fixture
+def multi_process(monkeypatch, tmp_path):
+    monkeypatch.setattr(shared_state, "SHARED_STATE_DB", str(tmp_path / "shared_state.sqlite3"))
+    monkeypatch.setattr(shared_state, "_schema_ready_pid", None)
+    monkeypatch.setattr(shared_state, "_worker_processes", 2)
+    yield
+    shared_state.close()
+
+
+def test_single_process_limiter_hands_slots_over_without_the_database(no_database):
+    limiter = AdaptiveConcurrencyLimiter(initial=1, shared_name="openrouter_concurrency")
+
+    async def scenario():
+        first = await limiter.acquire()
+        second = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert not second.done()
+        await limiter.release(first, latency=1.0)
+        await asyncio.wait_for(second, 1)
+        await limiter.release(second.result(), latency=1.0)
+
+    asyncio.run(scenario())
+    assert limiter.snapshot()["queued"] == 1
+    assert "shared" not in limiter.snapshot()
+
+
+def test_single_process_breaker_opens_without_the_database(no_database):
+    breaker = CircuitBreaker(failure_threshold=2, shared_name="openrouter_breaker:test")
+
+    async def scenario():
+        for _ in range(2):
+            await breaker.before_request()
+            await breaker.record_failure()
+        with pytest.raises(CircuitOpenError):
+            await breaker.before_request()
+
+    asyncio.run(scenario())
+    assert breaker.is_open
+
+
+def test_shared_semaphore_wakes_a_local_waiter_on_release(multi_process):
+    # Long enough that only the release, not the poll, can hand the slot over in time
+    slots = shared_state.SharedSemaphore("test_slots", 1, ttl=60, poll_interval=5, max_poll_interval=5)
+
+    async def scenario():
+        first = await slots.acquire()
+        second = asyncio.ensure_future(slots.acquire())
+        await asyncio.sleep(0.2)
+        assert not second.done()
+        started = time.monotonic()
+        await slots.release(first)
+        await asyncio.wait_for(second, 2)
+        await slots.release(second.result())
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) < 2
+    assert slots.stats == {"acquired": 2, "queued": 1}
@@ -0,0 +1,65 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app import nonce_manager as nonce_module
+from app.nonce_manager import NonceManager
+
+ADDRESS = "0x00000000000000000000000000000000000000aa"
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    """Fake node whose pending count is ``chain.nonce``; counts the ``get_transaction_count`` calls."""
+    chain = SimpleNamespace(nonce=7, reads=0)
+
+    async def get_transaction_count(address, block):
+        chain.reads += 1
+        await asyncio.sleep(0.01)
+        return chain.nonce
+
+    floors = {}
+
+    def claim_nonce(address, nonce):
+        floors[address] = max(nonce, floors.get(address, nonce))
+        floors[address] += 1
+        return floors[address] - 1
+
+    def sync_nonce(address, chain_nonce, reset=False):
+        floors[address] = chain_nonce if reset else max(chain_nonce, floors.get(address, chain_nonce))
+
+    monkeypatch.setattr(nonce_module, "get_web3",
+                        lambda: SimpleNamespace(eth=SimpleNamespace(get_transaction_count=get_transaction_count)))
+    monkeypatch.setattr(nonce_module.shared_state, "claim_nonce", claim_nonce)
+    monkeypatch.setattr(nonce_module.shared_state, "sync_nonce", sync_nonce)
+    monkeypatch.setattr(nonce_module.shared_state, "release_nonce", lambda address, nonce: None)
+    return chain
+
+
+def test_concurrent_preflights_share_one_resync(chain):
+    manager = NonceManager()
+
+    async def mint():
+        await manager.prepare(ADDRESS)
+        return await manager.reserve(ADDRESS)
+
+    async def scenario():
+        return await asyncio.gather(*(mint() for _ in range(24)))
+
+    assert sorted(asyncio.run(scenario())) == list(range(7, 31))
+    assert chain.reads == 1
+
+
+def test_idle_account_resyncs_once_its_reservations_are_done(chain):
+    manager = NonceManager()
+
+    async def scenario():
+        first = await manager.reserve(ADDRESS)
+        await manager.release(ADDRESS, first)
+        chain.nonce = 9      # sent from elsewhere meanwhile
+        await manager.prepare(ADDRESS)
+        return await manager.reserve(ADDRESS)
+
+    assert asyncio.run(scenario()) == 9
+    assert chain.reads == 2
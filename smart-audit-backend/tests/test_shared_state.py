@@ -0,0 +1,30 @@
+import pytest
+
+from app import shared_state
+
+CONTRACT = "0x00000000000000000000000000000000000000cc"
+LEASE = "transfer_indexer:" + CONTRACT
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setattr(shared_state, "SHARED_STATE_DB", str(tmp_path / "shared_state.sqlite3"))
+    monkeypatch.setattr(shared_state, "_schema_ready_pid", None)
+    shared_state.close()
+    yield
+    shared_state.close()
+
+
+def test_apply_transfers_renews_the_lease_with_the_checkpoint(store):
+    assert shared_state.acquire_lease(LEASE, "worker-a", 30)
+    assert shared_state.apply_transfers(CONTRACT, [], 100, "0x01", (LEASE, "worker-a", 30)) == 0
+    assert shared_state.indexer_checkpoint(CONTRACT) == (100, "0x01")
+    assert not shared_state.acquire_lease(LEASE, "worker-b", 30)
+
+
+def test_apply_transfers_writes_nothing_once_the_lease_was_taken_over(store):
+    assert shared_state.acquire_lease(LEASE, "worker-a", 30)
+    assert shared_state.apply_transfers(CONTRACT, [], 500, "0x05", (LEASE, "worker-a", 30)) == 0
+    # worker-b's lease expired mid-scan and worker-a took over and moved ahead
+    assert shared_state.apply_transfers(CONTRACT, [], 200, "0x02", (LEASE, "worker-b", 30)) is None
+    assert shared_state.indexer_checkpoint(CONTRACT) == (500, "0x05")
@@ -1,4 +1,3 @@
-from pymongo import MongoClient
 from dotenv import load_dotenv
 import os
 
@@ -9,12 +8,26 @@ load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = os.getenv("DB_NAME")
 
-# Connect to MongoDB Atlas
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
+# The MongoDB Atlas client is created on first use, not at import: the app (and
+# anything importing this module) starts without MongoDB, and the driver isn't
+# loaded until a request needs it
+_client = None
 
 
+def get_client():
+    global _client
+    if _client is None:
+        from pymongo import MongoClient
+        _client = MongoClient(MONGO_URI)
+    return _client
 
 
 def get_db():
-    return db
+    return get_client()[DB_NAME]
+
+
+def close_db():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None